@@ -1,6 +1,9 @@
 import asyncio
+from typing import List
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from paddleocr import PaddleOCR
+import cv2
+import numpy as np
 import logging
 import tempfile
 import os
@@ -18,6 +21,12 @@ app = FastAPI(
     version="2.0.0",
 )
 
+# --- Batch Settings ---
+# Number of images passed to the model in one predict() call.
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "8"))
+# Upper bound on images accepted by a single /ocr/batch request.
+OCR_MAX_BATCH_FILES = int(os.getenv("OCR_MAX_BATCH_FILES", "64"))
+
 # --- Model Loading ---
 try:
     logger.info("Initializing PaddleOCR...")
@@ -40,6 +49,46 @@ def health_check():
         raise HTTPException(status_code=500, detail="OCR model could not be loaded.")
     return {"status": "ok", "model_ready": True}
 
+# The model is not safe to call from several threads at once.
+model_lock = asyncio.Lock()
+
+
+def _extract_text(page_result) -> str:
+    """
+    Joins the recognized lines of one image's OCR result.
+    Handles both the PaddleOCR 3.x result object (with 'rec_texts') and the
+    2.x list of lines, e.g. [[[box], ('text', score)], ...].
+    """
+    if not page_result:
+        return ""
+    try:
+        rec_texts = page_result["rec_texts"]
+    except (KeyError, TypeError, IndexError):
+        rec_texts = [line[1][0] for line in page_result]
+    return "\n".join(rec_texts)
+
+
+def _decode_image(contents: bytes):
+    """Decodes raw image bytes into a BGR array, the input format the model expects."""
+    image = cv2.imdecode(np.frombuffer(contents, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Could not decode image data.")
+    return image
+
+
+def _run_batch(images: list) -> List[str]:
+    """Runs a list of decoded images through the model, OCR_BATCH_SIZE at a time."""
+    texts = []
+    for start in range(0, len(images), OCR_BATCH_SIZE):
+        batch = images[start:start + OCR_BATCH_SIZE]
+        if hasattr(ocr_model, "predict"):
+            results = ocr_model.predict(batch)
+        else:
+            results = [(ocr_model.ocr(image) or [None])[0] for image in batch]
+        texts.extend(_extract_text(result) for result in results)
+    return texts
+
+
 @app.post("/ocr", summary="Perform OCR on a single image")
 async def perform_ocr(file: UploadFile = File(...)):
     """
@@ -65,15 +114,11 @@ async def perform_ocr(file: UploadFile = File(...)):
         # The ocr method takes image bytes directly
         # The `use_angle_cls=True` in the constructor is sufficient.
         # The `ocr` method itself does not take a `cls` argument.
-        result = ocr_model.ocr(contents)
+        async with model_lock:
+            result = await asyncio.to_thread(ocr_model.ocr, contents)
         logger.info("OCR prediction completed.")
 
-        # The result is a list of lists of lines.
-        # e.g., [[[[box], ('text', score)], [[box], ('text', score)]]]
-        # We need to extract and join all text parts.
-        lines = result[0] if result else []
-        text_lines = [line[1][0] for line in lines]
-        full_text = "\n".join(text_lines)
+        full_text = _extract_text(result[0] if result else None)
         
         logger.info("Successfully extracted text from image.")
         
@@ -86,6 +131,43 @@ async def perform_ocr(file: UploadFile = File(...)):
         logger.error(f"An error occurred during OCR processing: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error during OCR processing.")
 
+@app.post("/ocr/batch", summary="Perform OCR on many images in one request")
+async def perform_ocr_batch(files: List[UploadFile] = File(...)):
+    """
+    Receives several images as one multipart request and returns their text in the
+    same order. Images are run through the model in batches of OCR_BATCH_SIZE.
+    An image that cannot be decoded gets an "error" entry instead of failing the request.
+    """
+    if ocr_model is None:
+        raise HTTPException(status_code=503, detail="Service Unavailable: OCR model is not loaded.")
+    if len(files) > OCR_MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f"Too many files in one batch (max {OCR_MAX_BATCH_FILES}).")
+
+    logger.info(f"Received batch of {len(files)} files.")
+
+    results = [{"index": i, "filename": f.filename, "text": "", "error": None} for i, f in enumerate(files)]
+    images, positions = [], []
+    for i, file in enumerate(files):
+        try:
+            images.append(_decode_image(await file.read()))
+            positions.append(i)
+        except Exception as e:
+            logger.warning(f"Skipping undecodable file {file.filename}: {e}")
+            results[i]["error"] = "Could not decode image."
+
+    if images:
+        try:
+            async with model_lock:
+                texts = await asyncio.to_thread(_run_batch, images)
+        except Exception as e:
+            logger.error(f"An error occurred during batch OCR processing: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail="Internal server error during OCR processing.")
+        for position, text in zip(positions, texts):
+            results[position]["text"] = text
+
+    logger.info(f"Batch OCR completed for {len(images)}/{len(files)} images.")
+    return {"results": results}
+
 if __name__ == "__main__":
     import uvicorn
     # This block is for local debugging and won't be used in the Docker container
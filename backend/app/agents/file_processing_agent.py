@@ -20,6 +20,8 @@ from app.modules.minio_module import store_document_in_minio, generate_presigned
 from app.tools.word import extract_word_content_from_url
 from app.tools.exlsx import download_and_parse_xlsx
 from app.tools.deal_document import process_image # For image processing
+from app.services import extraction_cache
+from app.services.extraction_cache import content_hash, get_extraction_cache
 
 class FileProcessingAgent(BaseAgent):
     """
@@ -81,6 +83,8 @@ class FileProcessingAgent(BaseAgent):
 
         processed_files_info = []
         # No longer need a temporary directory as files are processed directly from BytesIO
+        # Extractions and answers are shared by content hash, so a file processed before is not parsed again
+        shared_cache = get_extraction_cache()
 
         for file_info in files:
             filename = file_info.get("filename", "unknown_file")
@@ -129,7 +133,14 @@ class FileProcessingAgent(BaseAgent):
                 thoughts.append(f"Generated presigned URL for {filename}: {presigned_url}")
 
                 # 3. Process content based on file type using URL
-                if content_type == "application/pdf":
+                digest = content_hash(file_bytes)
+                is_image = content_type.startswith("image/")
+                extraction_kind = f"{extraction_cache.AGENT_TEXT}:{content_type}"
+                cached_content = None if is_image else await shared_cache.get(extraction_kind, digest)
+                if cached_content is not None:
+                    file_content = cached_content
+                    thoughts.append(f"Reused the cached extraction of {filename}.")
+                elif content_type == "application/pdf":
                     # Retain PyPDF2 processing, but ensure file is uploaded to MinIO first
                     try:
                         # PyPDF2 reads directly from a BytesIO stream, so we re-wrap the bytes
@@ -187,6 +198,9 @@ class FileProcessingAgent(BaseAgent):
                     
                     thoughts.append(f"Extracted content preview for {filename}: {file_content[:200]}...")
 
+                if cached_content is None and not is_image:
+                    await shared_cache.put(extraction_kind, digest, file_content)
+
                 prompt = f"""
                 You are a File Processing AI (DeepSeek). Your task is to extract and summarize key information
                 from the provided file content based on the user's instruction.
@@ -209,7 +223,17 @@ class FileProcessingAgent(BaseAgent):
                 }}
                 """
 
-                deepseek_file_response_str = await llm_ollama_deepseek_ainvoke(prompt)
+                # The image prompt carries the upload's own URL, so only other files' answers are reusable
+                answer_question = None if is_image else f"{task}\n{filename}\n{content_type}"
+                deepseek_file_response_str = None
+                if answer_question is not None:
+                    deepseek_file_response_str = await shared_cache.get(extraction_cache.AGENT_ANSWER, digest, answer_question)
+                if deepseek_file_response_str is not None:
+                    thoughts.append(f"Reused the cached DeepSeek result for {filename} and this task.")
+                else:
+                    deepseek_file_response_str = await llm_ollama_deepseek_ainvoke(prompt)
+                    if answer_question is not None and not deepseek_file_response_str.startswith("Error generating response"):
+                        await shared_cache.put(extraction_cache.AGENT_ANSWER, digest, deepseek_file_response_str, answer_question)
                 thoughts.append(f"DeepSeek file processing raw response for {filename}: {deepseek_file_response_str}")
 
                 try:
@@ -28,6 +28,11 @@ class Settings(BaseSettings):
     MONGO_URI: str = ""
     MONGO_DB_NAME: str = ""
     MONGO_AI_CHAT_HISTORY_COLLECTION: str = ""
+    MONGO_MAX_POOL_SIZE: int = 50  # Connections of the shared async client used for chat persistence
+    MONGO_MIN_POOL_SIZE: int = 2
+    MONGO_MAX_IDLE_TIME_MS: int = 300000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGO_CONNECT_TIMEOUT_MS: int = 5000
 
     # Ollama settings
     OLLAMA_EMBEDDING_URL: str = ""
@@ -43,6 +48,11 @@ class Settings(BaseSettings):
     OLLAMA_DEVICE: str = ""
     OLLAMA_QWEN_VL_MAX_LATEST: str = "qwen-vl-max"  # Default model for Qwen VL Max
 
+    # GOT-OCR model for images embedded in markdown documents
+    GOT_OCR_MODEL: str = "stepfun-ai/GOT-OCR-2.0-hf"
+    GOT_OCR_DEVICE: str = ""  # Falls back to OLLAMA_DEVICE, then "cpu"
+    GOT_OCR_IDLE_UNLOAD_SECONDS: int = 600  # Unload the model after this long without use; 0 keeps it loaded
+
     VECTOR_DIM: int = 1024
 
     # Embedding settings
@@ -79,6 +89,27 @@ class Settings(BaseSettings):
     MINERU_FORCE_MODE: str = ""  # sglang, local-vlm, pipeline, or empty for auto
     
     PADDLEOCR_API_URL: str = ""
+    PADDLEOCR_BATCH_SIZE: int = 16  # Images per /ocr/batch request
+
+    # Figure OCR during PDF embedding
+    FIGURE_OCR_CONCURRENCY: int = 4  # Concurrent OCR requests per document and stage
+    FIGURE_OCR_MIN_BYTES: int = 512  # Smaller images are skipped
+    FIGURE_OCR_MIN_SIDE_PX: int = 16  # Images with a shorter side are skipped
+    FIGURE_OCR_MIN_ENTROPY: float = 0.5  # Grayscale entropy (bits) below which an image is considered blank
+
+    # Shared HTTP clients for the OCR and parsing microservices and Ollama
+    HTTP_CLIENT_MAX_CONNECTIONS: int = 50  # Total connections across all hosts (aiohttp)
+    HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST: int = 10
+    HTTP_CLIENT_KEEPALIVE_SECONDS: float = 60.0
+    HTTP_CLIENT_HTTP2: bool = True  # Only used when the 'h2' package is installed
+    OLLAMA_MAX_CONNECTIONS_PER_MODEL: int = 8  # Pooled connections to Ollama per model (chat, embedding, reranker)
+    OLLAMA_MODEL_MAX_CONNECTIONS: str = ""  # Per-model overrides, e.g. "qwen3:32b=2,bge-m3=16"
+    OLLAMA_TIMEOUT_SECONDS: float = 300.0  # Default for pooled Ollama clients; calls may pass shorter timeouts
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 10.0
+    HTTP_HEALTH_TIMEOUT_SECONDS: float = 10.0
+    PADDLEOCR_TIMEOUT_SECONDS: float = 300.0
+    LATEXOCR_TIMEOUT_SECONDS: float = 60.0
+    MINERU_PARSE_TIMEOUT_SECONDS: float = 600.0
 
     # MinIO settings
     CUSTOMER_MINIO_ENDPOINT: str = ""
@@ -91,6 +122,15 @@ class Settings(BaseSettings):
     MINIO_BUCKET_NAME: str = ""
     MINIO_CHAT_BUCKET_NAME: str = ""
     MINIO_AVATAR_BUCKET_NAME: str = "avatars"  # Default bucket for avatars
+    MINIO_POOL_MAXSIZE: int = 32  # urllib3 connections kept per MinIO host; should be >= MINIO_EXECUTOR_WORKERS
+    MINIO_EXECUTOR_WORKERS: int = 16  # Threads for blocking MinIO calls made from async code
+    MINIO_CONNECT_TIMEOUT_SECONDS: float = 10.0
+    MINIO_READ_TIMEOUT_SECONDS: float = 300.0
+    MINIO_REGION: str = ""  # Set (e.g. "us-east-1") to skip the one-time bucket-location lookup before signing URLs
+    PRESIGNED_URL_CACHE_FRACTION: float = 0.5  # Reuse a presigned URL for this fraction of its expiry
+    PRESIGNED_URL_CACHE_MAX_ENTRIES: int = 50000
+    MINIO_DOWNLOAD_CHUNK_KB: int = 1024  # Chunk size when streaming objects to HTTP clients
+    MINIO_UPLOAD_PART_SIZE_MB: int = 16  # Multipart part size for streamed uploads (MinIO minimum is 5); bounds upload memory
 
     # MinIO Sync Task Settings
     MINIO_SYNC_ENABLED: bool = False
@@ -99,6 +139,40 @@ class Settings(BaseSettings):
     MINIO_SYNC_CRON_MINUTE: str = "0"    # Minute of the hour to run the job
     MINIO_SYNC_MAX_RETRIES: int = 3      # Default max retries for embedding
     MINIO_SYNC_FILES_PER_SUBDIR_LIMIT: int = 0 # 0 means no limit
+    MINIO_SYNC_MODE: str = "incremental"  # "incremental" (checkpointed paged listing + events) or "full" (list whole bucket each run)
+    MINIO_SYNC_LIST_PAGE_SIZE: int = 1000  # Objects listed, compared and checkpointed per page
+    MINIO_SYNC_RUN_BUDGET_SECONDS: int = 3300  # Stop a run before the next hourly cron fire; the next run resumes from the checkpoint
+    MINIO_SYNC_NOTIFICATIONS_ENABLED: bool = False  # Queue customer bucket events in Redis and sync them first
+    MINIO_SYNC_CONCURRENCY: int = 4  # Files processed in parallel (PDF parsing itself stays serialized by doc_processing_lock)
+    MINIO_SYNC_RETRY_BASE_SECONDS: float = 5.0  # Base delay of the exponential backoff between attempts
+    MINIO_SYNC_RETRY_MAX_SECONDS: float = 300.0  # Upper bound of the backoff delay
+
+    # Ingestion scheduling (bulk work runs at full parallelism during MINERU_NIGHTTIME_HOURS)
+    INGESTION_DAYTIME_CONCURRENCY: int = 1  # Bulk ingestion jobs allowed during business hours while chat is idle
+    INGESTION_CHAT_LATENCY_TARGET_SECONDS: float = 3.0  # p90 chat time-to-first-token at which daytime bulk work pauses
+    INGESTION_OLLAMA_QUEUE_LIMIT: int = 4  # Chat requests in flight to Ollama at which daytime bulk work pauses
+    INGESTION_LOAD_WINDOW_SECONDS: int = 120  # How far back chat latency samples are considered
+    INGESTION_MAX_WAIT_SECONDS: int = 900  # Longest a bulk job waits for a slot before running anyway
+    INGESTION_POLL_SECONDS: float = 2.0  # How often a waiting bulk job re-checks the load
+
+    # LLM dispatch (admission of calls to Ollama: interactive chat > agent steps > ingestion summaries)
+    LLM_MAX_CONCURRENCY: int = 8  # LLM calls and streams running at once; match Ollama's OLLAMA_NUM_PARALLEL
+    LLM_INGESTION_MAX_CONCURRENCY: int = 2  # Slots ingestion summaries may hold, keeping the rest free for chat
+    LLM_MAX_CONCURRENCY_PER_USER: int = 2  # 0 disables the cap
+    LLM_MAX_CONCURRENCY_PER_DEPARTMENT: int = 4  # 0 disables the cap
+    LLM_QUEUE_WAIT_LOG_SECONDS: float = 2.0  # Log calls that waited at least this long for a slot
+    LLM_METRICS_WINDOW_SECONDS: int = 300  # How far back queue times are kept for stats()
+
+    # Streaming responses
+    STREAM_DISCONNECT_POLL_SECONDS: float = 1.0  # How often streaming routes check whether the client is still there
+    SSE_FLUSH_INTERVAL_SECONDS: float = 0.05  # How long text deltas are collected into one SSE message
+    SSE_MAX_FRAME_CHARS: int = 4096  # An SSE message with this much text is sent without waiting
+    SSE_MAX_PENDING_CHARS: int = 262144  # Unsent text per stream before reading from the LLM pauses
+    SSE_HEARTBEAT_SECONDS: float = 15.0  # Idle time after which a ": ping" comment is sent
+
+    # Bulk purge
+    PURGE_RETRY_INTERVAL_MINUTES: int = 10  # How often failed store deletions from the retry log are replayed
+    PURGE_RETRY_MAX_ATTEMPTS: int = 20  # Replays of one deletion before it is dropped with a critical log
 
     # SMTP settings
     SMTP_SERVER: str = ""
@@ -178,8 +252,17 @@ class Settings(BaseSettings):
 
     # Conversation settings
     REMOVE_OLD_CONVERSATIONS_AFTER_DAYS: int = 30
+    CONVERSATION_CLEANUP_PAGE_SIZE: int = 500  # Expired conversations deleted per batch
+    CONVERSATION_CLEANUP_BUDGET_SECONDS: int = 1800  # Max runtime of one cleanup run; the rest is picked up next run
     MAX_CONVERSATION_HISTORY_MESSAGES: int = 10
+    CONVERSATION_STORAGE_LAYOUT: str = "split" # "split" (hash + message list, O(1) appends) or "blob" (one JSON string per conversation)
+    CONVERSATION_PROMPT_HISTORY_MESSAGES: int = 50 # Most recent messages loaded from Redis when building a prompt
     MAX_CONTEXT_TOKENS: int = 6000 # Max tokens for the context window, leaving space for the response
+    CHAT_ATTACHMENT_CONCURRENCY: int = 3 # Chat attachments downloaded and extracted at the same time
+    CHAT_EXTRACTION_CACHE_MAX_CHARS: int = 2000000 # Longer extractions are not kept for later turns of the conversation
+    EXTRACTION_CACHE_TTL_SECONDS: int = 7 * 24 * 60 * 60 # Shared cache of extractions and summaries by content hash; refreshed on every hit
+    EXTRACTION_CACHE_MAX_ENTRY_BYTES: int = 4 * 1024 * 1024 # Larger results are not cached
+    EXTRACTION_CACHE_MAX_BYTES: int = 512 * 1024 * 1024 # Least recently used entries are evicted above this total
     SCAN_DETECTION_THRESHOLD_DEFAULT: int = 20 # PDF scan detection character threshold, used when Redis is unavailable
     AI_TEMPLATE_SEGMENT_SPLIT_MAX_SIZE: int = 2000  # Default value, can be overridden in .env
 
@@ -188,6 +271,8 @@ class Settings(BaseSettings):
     TEXT_CHUNK_SIZE: int = 1500
     TEXT_CHUNK_OVERLAP: int = 100
     LONG_TEXT_THRESHOLD: int = 2500 # Threshold to trigger long text summarization
+    SUMMARY_MAP_CONCURRENCY: int = 4 # Parts of a long text summarized at the same time (the LLM dispatcher caps still apply)
+    SUMMARY_REDUCE_CONCURRENCY: int = 4 # Groups of part summaries combined at the same time per reduce level
       
     # Agentic configuration
     AGENTIC_RAG_ENABLE: bool = False
@@ -0,0 +1,269 @@
+"""
+Shared, lifespan-managed HTTP clients for the internal microservices
+(PaddleOCR, LatexOCR and the MinerU/SGLang parsing server).
+
+Creating an `httpx.AsyncClient` or `aiohttp.ClientSession` per call throws away
+the connection pool, so every figure of a PDF paid a fresh TCP (and TLS)
+handshake. The clients here are created once per service, keep connections
+alive between calls and are closed from the FastAPI lifespan handler.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 in httpx needs the optional 'h2' package. Fall back to HTTP/1.1 keep-alive without it.
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Service names used as registry keys. One client per upstream host keeps the
+# connection limits effectively per-host.
+PADDLEOCR = "paddleocr"
+LATEXOCR = "latexocr"
+MINERU = "mineru"
+OLLAMA = "ollama"  # Per-model clients use ollama_service_name(model)
+
+
+def get_timeout(operation: str) -> httpx.Timeout:
+    """Returns the httpx timeout configured for an operation type ('ocr', 'formula', 'parse', 'health')."""
+    total = {
+        "ocr": settings.PADDLEOCR_TIMEOUT_SECONDS,
+        "formula": settings.LATEXOCR_TIMEOUT_SECONDS,
+        "parse": settings.MINERU_PARSE_TIMEOUT_SECONDS,
+        "health": settings.HTTP_HEALTH_TIMEOUT_SECONDS,
+        "llm": settings.OLLAMA_TIMEOUT_SECONDS,
+    }.get(operation, settings.PADDLEOCR_TIMEOUT_SECONDS)
+    return httpx.Timeout(total, connect=min(total, settings.HTTP_CONNECT_TIMEOUT_SECONDS))
+
+
+def get_aiohttp_timeout(operation: str) -> aiohttp.ClientTimeout:
+    """aiohttp equivalent of get_timeout()."""
+    timeout = get_timeout(operation)
+    return aiohttp.ClientTimeout(total=timeout.read, sock_connect=timeout.connect)
+
+
+class ConnectionStats:
+    """
+    Counts requests, newly opened connections and the time spent opening them.
+    Used to report how much connection setup the shared pools save per document.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.connect_seconds = 0.0
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "connect_seconds": self.connect_seconds,
+        }
+
+    @staticmethod
+    def saved_since(before: Dict[str, float], after: Dict[str, float]) -> Dict[str, float]:
+        """
+        Compares two snapshots. Every request that did not open a connection reused one,
+        so the saving is estimated as reused requests times the average connect time.
+        """
+        requests = after["requests"] - before["requests"]
+        new_connections = after["new_connections"] - before["new_connections"]
+        connect_seconds = after["connect_seconds"] - before["connect_seconds"]
+        reused = max(requests - new_connections, 0)
+        avg_connect = (after["connect_seconds"] / after["new_connections"]) if after["new_connections"] else 0.0
+        return {
+            "requests": requests,
+            "new_connections": new_connections,
+            "reused_connections": reused,
+            "connect_seconds": connect_seconds,
+            "estimated_seconds_saved": reused * avg_connect,
+        }
+
+    def httpx_trace(self):
+        """Builds a per-request httpcore 'trace' callback timing the TCP connect and TLS handshake."""
+        started = {}
+
+        async def trace(event_name: str, info: dict):
+            for phase in ("connection.connect_tcp", "connection.start_tls"):
+                if event_name == f"{phase}.started":
+                    started[phase] = time.perf_counter()
+                elif event_name == f"{phase}.complete" and phase in started:
+                    self.connect_seconds += time.perf_counter() - started.pop(phase)
+                    if phase == "connection.connect_tcp":
+                        self.new_connections += 1
+
+        return trace
+
+    def aiohttp_trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_end(session, ctx, params):
+            self.requests += 1
+
+        async def on_connection_create_start(session, ctx, params):
+            ctx.connect_started = time.perf_counter()
+
+        async def on_connection_create_end(session, ctx, params):
+            self.new_connections += 1
+            self.connect_seconds += time.perf_counter() - getattr(ctx, "connect_started", time.perf_counter())
+
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_connection_create_start.append(on_connection_create_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        return trace_config
+
+
+# Process-wide counters shared by all pooled clients.
+connection_stats = ConnectionStats()
+
+# Clients are bound to the loop that created them, so the registries are keyed by
+# (service, loop id). The request loop and the background embedding loop thus each
+# keep their own pool, and scripts using asyncio.run() get fresh ones.
+_httpx_clients: Dict[Tuple[str, int], httpx.AsyncClient] = {}
+_aiohttp_sessions: Dict[Tuple[str, int], aiohttp.ClientSession] = {}
+_client_loops: Dict[Tuple[str, int], asyncio.AbstractEventLoop] = {}
+
+
+async def _trace_httpx_request(request: httpx.Request):
+    request.extensions["trace"] = connection_stats.httpx_trace()
+
+
+async def _count_httpx_response(response: httpx.Response):
+    connection_stats.requests += 1
+
+
+def _registry_key(service: str) -> Tuple[str, int]:
+    """Key of the current loop's client for a service; forgets clients of loops that were closed."""
+    for key, loop in list(_client_loops.items()):
+        if loop.is_closed():
+            _client_loops.pop(key, None)
+            _httpx_clients.pop(key, None)
+            _aiohttp_sessions.pop(key, None)
+    loop = asyncio.get_running_loop()
+    key = (service, id(loop))
+    if _client_loops.get(key) is not loop:
+        _httpx_clients.pop(key, None)
+        _aiohttp_sessions.pop(key, None)
+    return key
+
+
+def ollama_service_name(model: str) -> str:
+    return f"{OLLAMA}:{model}"
+
+
+def ollama_connection_limit(model: str) -> int:
+    """
+    Maximum connections to Ollama for one model: OLLAMA_MAX_CONNECTIONS_PER_MODEL,
+    or the model's entry in OLLAMA_MODEL_MAX_CONNECTIONS ("qwen3:32b=2,bge-m3=16").
+    """
+    for entry in settings.OLLAMA_MODEL_MAX_CONNECTIONS.split(","):
+        name, _, limit = entry.strip().rpartition("=")
+        if name == model:
+            try:
+                return max(int(limit), 1)
+            except ValueError:
+                logger.warning(f"Ignoring invalid OLLAMA_MODEL_MAX_CONNECTIONS entry '{entry}'.")
+    return settings.OLLAMA_MAX_CONNECTIONS_PER_MODEL
+
+
+def get_httpx_client(service: str, max_connections: Optional[int] = None, timeout: Optional[httpx.Timeout] = None) -> httpx.AsyncClient:
+    """
+    Returns the pooled httpx client for a service, creating it on first use.
+    `max_connections` and `timeout` only apply when the client is created and
+    default to HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST and the OCR timeout.
+    Callers must not close it; use close_http_clients() on shutdown.
+    """
+    key = _registry_key(service)
+    client = _httpx_clients.get(key)
+    if client is None or client.is_closed:
+        max_connections = max_connections or settings.HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_SECONDS,
+        )
+        client = httpx.AsyncClient(
+            limits=limits,
+            timeout=timeout or get_timeout("ocr"),
+            http2=settings.HTTP_CLIENT_HTTP2 and HTTP2_AVAILABLE,
+            event_hooks={"request": [_trace_httpx_request], "response": [_count_httpx_response]},
+        )
+        _httpx_clients[key] = client
+        _client_loops[key] = asyncio.get_running_loop()
+        logger.info(f"Created pooled HTTP client for '{service}' (max {max_connections} connections, http2={settings.HTTP_CLIENT_HTTP2 and HTTP2_AVAILABLE}).")
+    return client
+
+
+def get_ollama_client(model: str) -> httpx.AsyncClient:
+    """The pooled client for requests to Ollama for `model`, limited to ollama_connection_limit(model)."""
+    return get_httpx_client(ollama_service_name(model), ollama_connection_limit(model), get_timeout("llm"))
+
+
+def get_aiohttp_session(service: str) -> aiohttp.ClientSession:
+    """
+    Returns the pooled aiohttp session for a service, creating it on first use.
+    Callers must not close it; use close_http_clients() on shutdown.
+    """
+    key = _registry_key(service)
+    session = _aiohttp_sessions.get(key)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+            limit_per_host=settings.HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST,
+            keepalive_timeout=settings.HTTP_CLIENT_KEEPALIVE_SECONDS,
+            enable_cleanup_closed=True,
+        )
+        session = aiohttp.ClientSession(
+            timeout=get_aiohttp_timeout("parse"),
+            connector=connector,
+            headers={
+                "Content-Type": "application/json",
+                "User-Agent": "RostiAI-MinerU-VLM/1.0",
+                "Accept": "application/json",
+            },
+            trace_configs=[connection_stats.aiohttp_trace_config()],
+        )
+        _aiohttp_sessions[key] = session
+        _client_loops[key] = asyncio.get_running_loop()
+        logger.info(f"Created pooled aiohttp session for '{service}'.")
+    return session
+
+
+async def init_http_clients():
+    """Creates the pooled clients at application startup."""
+    get_httpx_client(PADDLEOCR)
+    get_httpx_client(LATEXOCR)
+    get_aiohttp_session(MINERU)
+    for model in {settings.OLLAMA_CHAT_MODEL, settings.OLLAMA_COT_MODEL} - {""}:
+        get_ollama_client(model)
+
+
+async def close_http_clients():
+    """
+    Closes the pooled clients of the current loop. Called from the application
+    shutdown handler; a loop running in another thread closes its own.
+    """
+    loop = asyncio.get_running_loop()
+    for key in [key for key, client_loop in _client_loops.items() if client_loop is loop]:
+        service = key[0]
+        client = _httpx_clients.pop(key, None)
+        session = _aiohttp_sessions.pop(key, None)
+        _client_loops.pop(key, None)
+        try:
+            if client is not None:
+                await client.aclose()
+            if session is not None:
+                await session.close()
+        except Exception as e:
+            logger.warning(f"Error closing HTTP client for '{service}': {e}")
@@ -0,0 +1,165 @@
+import asyncio
+import functools
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+import certifi
+import urllib3
+from minio import Minio
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_clients = {}
+_pool_managers = []
+_clients_lock = threading.Lock()
+
+# Buckets known to exist, keyed by (client id, bucket). Buckets are never dropped
+# by this application, so a positive answer stays valid for the process lifetime.
+_known_buckets = set()
+_buckets_lock = threading.Lock()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _split_endpoint(endpoint: str):
+    """Returns (host[:port], secure) for an endpoint given with or without a scheme."""
+    secure = endpoint.startswith("https://")
+    return endpoint.replace("https://", "").replace("http://", ""), secure
+
+
+def _build_http_client() -> urllib3.PoolManager:
+    # Same retry policy as the MinIO SDK default, but with a pool large enough for
+    # every executor thread to keep its own connection alive (urllib3 defaults to 10).
+    return urllib3.PoolManager(
+        num_pools=4,
+        maxsize=settings.MINIO_POOL_MAXSIZE,
+        block=False,
+        timeout=urllib3.Timeout(
+            connect=settings.MINIO_CONNECT_TIMEOUT_SECONDS,
+            read=settings.MINIO_READ_TIMEOUT_SECONDS,
+        ),
+        cert_reqs="CERT_REQUIRED",
+        ca_certs=certifi.where(),
+        retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+    )
+
+
+def get_client_for_endpoint(endpoint: str, access_key: str, secret_key: str) -> Minio:
+    """Returns a shared client for an arbitrary endpoint/credential pair, creating it on first use."""
+    host, secure = _split_endpoint(endpoint)
+    # The secret is part of the key (hashed), so a changed secret gets a new client instead of a stale one
+    key = (host, secure, access_key, hashlib.sha256(secret_key.encode("utf-8")).hexdigest())
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                http_client = _build_http_client()
+                client = Minio(
+                    host,
+                    access_key=access_key,
+                    secret_key=secret_key,
+                    secure=secure,
+                    region=settings.MINIO_REGION or None,
+                    http_client=http_client,
+                )
+                _pool_managers.append(http_client)
+                _clients[key] = client
+                logger.info(f"Created shared MinIO client for endpoint '{host}' (pool size {settings.MINIO_POOL_MAXSIZE}).")
+    return client
+
+
+def get_minio_client() -> Minio:
+    """Returns the process-wide client for the application's own MinIO instance."""
+    if not settings.MINIO_ENDPOINT:
+        raise ValueError("MinIO endpoint is not defined.")
+    return get_client_for_endpoint(settings.MINIO_ENDPOINT, settings.MINIO_ACCESS_KEY, settings.MINIO_SECRET_KEY)
+
+
+def get_customer_minio_client() -> Optional[Minio]:
+    """Returns the process-wide client for the customer's MinIO instance, or None if it is not configured."""
+    if not all([settings.CUSTOMER_MINIO_ENDPOINT, settings.CUSTOMER_MINIO_ACCESS_KEY, settings.CUSTOMER_MINIO_SECRET_KEY]):
+        return None
+    return get_client_for_endpoint(settings.CUSTOMER_MINIO_ENDPOINT, settings.CUSTOMER_MINIO_ACCESS_KEY, settings.CUSTOMER_MINIO_SECRET_KEY)
+
+
+def ensure_bucket(bucket_name: str, client: Optional[Minio] = None) -> None:
+    """
+    Makes sure a bucket exists, creating it if needed. The existence check hits
+    MinIO only the first time a bucket is seen; afterwards it is a set lookup.
+    """
+    client = client or get_minio_client()
+    key = (id(client), bucket_name)
+    if key in _known_buckets:
+        return
+    with _buckets_lock:
+        if key in _known_buckets:
+            return
+        if not client.bucket_exists(bucket_name):
+            client.make_bucket(bucket_name)
+            logger.info(f"Bucket '{bucket_name}' created.")
+        _known_buckets.add(key)
+
+
+def forget_bucket(bucket_name: str, client: Optional[Minio] = None) -> None:
+    """Drops a bucket from the existence cache, e.g. after a NoSuchBucket error."""
+    client = client or get_minio_client()
+    _known_buckets.discard((id(client), bucket_name))
+
+
+def get_minio_executor() -> ThreadPoolExecutor:
+    """Bounded executor for blocking MinIO calls, separate from the loop's default executor."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.MINIO_EXECUTOR_WORKERS, thread_name_prefix="minio")
+    return _executor
+
+
+async def run_minio(func: Callable[..., T], *args, **kwargs) -> T:
+    """Runs a blocking MinIO call on the MinIO executor, e.g. `await run_minio(client.stat_object, bucket, name)`."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_minio_executor(), functools.partial(func, *args, **kwargs))
+
+
+def init_minio_clients() -> None:
+    """
+    Creates the shared client and fills the bucket-existence cache for the
+    configured buckets. Called once at application startup; failures are logged
+    so that a MinIO outage does not prevent the API from starting.
+    """
+    if not settings.MINIO_ENDPOINT:
+        logger.warning("MINIO_ENDPOINT is not set. Skipping MinIO client initialization.")
+        return
+    get_minio_executor()
+    buckets = {settings.MINIO_BUCKET_NAME, settings.MINIO_CHAT_BUCKET_NAME, settings.MINIO_AVATAR_BUCKET_NAME}
+    for bucket_name in filter(None, buckets):
+        try:
+            ensure_bucket(bucket_name)
+        except Exception as e:
+            logger.error(f"Could not verify MinIO bucket '{bucket_name}' at startup: {e}")
+    logger.info(f"MinIO client ready; {len(_known_buckets)} bucket(s) cached.")
+
+
+def close_minio_clients() -> None:
+    """Shuts down the MinIO executor and closes pooled connections."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+    with _clients_lock:
+        for http_client in _pool_managers:
+            http_client.clear()
+        _pool_managers.clear()
+        _clients.clear()
+    _known_buckets.clear()
@@ -0,0 +1,80 @@
+"""
+Shared, lifespan-managed asynchronous MongoDB client for chat persistence.
+
+chat_data_service used to build a new synchronous MongoClient (plus a ping)
+for every call, never closed it and ran the blocking pymongo calls inside
+`async def` functions, so every conversation lookup stalled the event loop.
+The client here uses pymongo's native asyncio API (AsyncMongoClient), keeps
+one connection pool for the process and is closed from the FastAPI lifespan
+handler.
+"""
+
+import logging
+from typing import Optional
+
+from pymongo import AsyncMongoClient
+from pymongo.server_api import ServerApi
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+CHAT_CONVERSATIONS_COLLECTION = "chat_conversations"
+
+_client: Optional[AsyncMongoClient] = None
+
+
+def _build_client() -> AsyncMongoClient:
+    return AsyncMongoClient(
+        settings.MONGO_URI,
+        server_api=ServerApi('1'),
+        maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+        minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS,
+        serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=settings.MONGO_CONNECT_TIMEOUT_MS,
+    )
+
+
+async def init_mongo_client():
+    """Creates the shared client and checks the connection. Called once at startup."""
+    global _client
+    if not settings.MONGO_URI:
+        logger.warning("MONGO_URI is not set; chat persistence in MongoDB is unavailable.")
+        return
+    if _client is None:
+        _client = _build_client()
+    try:
+        await _client.admin.command('ping')
+        logger.info(f"Connected to MongoDB (pool size {settings.MONGO_MIN_POOL_SIZE}-{settings.MONGO_MAX_POOL_SIZE}).")
+    except Exception as e:
+        # The client reconnects on its own, so a MongoDB that comes up later is picked up.
+        logger.error(f"MongoDB is not reachable at startup: {e}")
+
+
+async def close_mongo_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+        logger.info("Closed the shared MongoDB client.")
+
+
+def get_async_mongo_client() -> Optional[AsyncMongoClient]:
+    """
+    Returns the shared client, creating it on first use outside the app
+    lifespan (scripts). The client is bound to the event loop it is first
+    used on. Returns None if MONGO_URI is not configured.
+    """
+    global _client
+    if _client is None and settings.MONGO_URI:
+        _client = _build_client()
+    return _client
+
+
+def get_chat_conversations_collection():
+    """The chat conversations collection on the shared client, or None if MongoDB is not configured."""
+    client = get_async_mongo_client()
+    if client is None:
+        return None
+    return client[settings.MONGO_DB_NAME][CHAT_CONVERSATIONS_COLLECTION]
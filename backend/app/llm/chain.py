@@ -4,6 +4,7 @@ from ..core.config import settings # Global import
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 from app.llm.llm import get_llm
+from app.services.llm_dispatcher import get_llm_dispatcher
 from pydantic import BaseModel, Field
 
 
@@ -55,7 +56,8 @@ prompt_summarize_doc_key_word = ChatPromptTemplate.from_messages(
 async def fn_async_summarize_doc(title,content):
     llm_instance = get_llm(show_think_process=False)
     chain = prompt_summarize_doc | llm_instance.with_structured_output(SummarizedDoc).with_retry(stop_after_attempt=3)
-    summarize_doc = await chain.ainvoke({"title": [("user", title)], "content": [("user", content)]},
+    async with get_llm_dispatcher().slot("chain_summarize_doc"):
+        summarize_doc = await chain.ainvoke({"title": [("user", title)], "content": [("user", content)]},
             config={"run_name": f"chain_summarize_doc_{title}"})
     return summarize_doc
 
@@ -69,7 +71,8 @@ def fn_summarize_doc(title,content):
 async def fn_async_summarize_doc_key_word(title,content):
     llm_instance = get_llm(show_think_process=False)
     chain = prompt_summarize_doc_key_word | llm_instance.with_structured_output(SummarizedDocKeyWord).with_retry(stop_after_attempt=3)
-    summarize_doc_key_word = await chain.ainvoke({"title": [("user", title)], "content": [("user", content)]},
+    async with get_llm_dispatcher().slot("chain_summarize_doc_key_word"):
+        summarize_doc_key_word = await chain.ainvoke({"title": [("user", title)], "content": [("user", content)]},
             config={"run_name": f"chain_summarize_doc_key_word_{title}"})
     return summarize_doc_key_word
 
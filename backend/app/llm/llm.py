@@ -1,10 +1,17 @@
 import os
 import base64
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Dict, Tuple
+import httpx
 from langchain_openai import ChatOpenAI
 from openai import OpenAI
 from langchain_ollama import ChatOllama
 from langchain_core.messages import HumanMessage
 from ..core.config import settings # Global import
+from app.services.llm_dispatcher import get_llm_dispatcher
 
 QW_API_KEY = settings.QW_API_KEY
 OLLAMA_QWEN_VL_MAX_LATEST = settings.OLLAMA_QWEN_VL_MAX_LATEST
@@ -15,10 +22,92 @@ OLLAMA_CHAT_MODEL = settings.OLLAMA_CHAT_MODEL # Use the chat model from COT_MOD
 OLLAMA_COT_MODEL = settings.OLLAMA_COT_MODEL # Corrected variable name
 OLLAMA_QWEN_MODEL = settings.OLLAMA_QWEN_MODEL # Added Qwen model for Ollama
 
+logger = logging.getLogger(__name__)
+
+# ChatOllama instances keep their own HTTP clients, so they are cached instead of being
+# built per call. Async clients belong to the event loop they were used on, so the cache
+# is kept per loop (request loop, background embedding loop); sync-only use shares one.
+LlmKey = Tuple[str, str, Tuple]
+_llms_by_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[LlmKey, ChatOllama]]" = weakref.WeakKeyDictionary()
+_llms_without_loop: Dict[LlmKey, ChatOllama] = {}
+_llms_lock = threading.Lock()
+
+
+def _clean_base_url(base_url: str) -> str:
+    # Robustly clean up the base URL to prevent issues with duplicate /api paths
+    cleaned_base_url = base_url.rstrip("/")
+    if cleaned_base_url.endswith("/api"):
+        cleaned_base_url = cleaned_base_url[:-4]
+    return cleaned_base_url.rstrip("/")
+
+
+def _build_ollama_llm(model: str, base_url: str, params: dict) -> ChatOllama:
+    from app.core.http_clients import ollama_connection_limit
+
+    kwargs = dict(params)
+    # Older langchain-ollama releases have no client_kwargs and use their default pool
+    if "client_kwargs" in getattr(ChatOllama, "model_fields", {}):
+        limit = ollama_connection_limit(model)
+        kwargs["client_kwargs"] = {
+            "limits": httpx.Limits(max_connections=limit, max_keepalive_connections=limit,
+                                   keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_SECONDS),
+        }
+    logger.info(f"Creating ChatOllama for model '{model}' with parameters {params}.")
+    return ChatOllama(model=model, base_url=base_url, **kwargs)
+
+
+def get_ollama_llm(model: str, base_url: str = None, **params) -> ChatOllama:
+    """
+    Returns the cached ChatOllama for a model, base URL and parameters
+    (temperature, num_predict, ...), creating it on first use. Its connections
+    to Ollama are limited per model (see ollama_connection_limit).
+    """
+    base_url = _clean_base_url(base_url or OLLAMA_URL)
+    key = (model, base_url, tuple(sorted(params.items())))
+    try:
+        registry = _llms_by_loop.setdefault(asyncio.get_running_loop(), {})
+    except RuntimeError:
+        registry = _llms_without_loop
+    llm = registry.get(key)
+    if llm is None:
+        with _llms_lock:
+            llm = registry.get(key)
+            if llm is None:
+                llm = registry[key] = _build_ollama_llm(model, base_url, params)
+    return llm
+
+
+def init_llms():
+    """Creates the chat and chain-of-thought LLMs at startup."""
+    if not OLLAMA_URL:
+        logger.warning("OLLAMA_SERVING_URL is not set; LLMs are not preloaded.")
+        return
+    for model in {OLLAMA_CHAT_MODEL, OLLAMA_COT_MODEL} - {""}:
+        get_ollama_llm(model)
+
+
+async def close_llms():
+    """Closes the HTTP clients of the cached LLMs of the current loop and the sync-only ones."""
+    registry = _llms_by_loop.pop(asyncio.get_running_loop(), {})
+    for llm in list(registry.values()) + list(_llms_without_loop.values()):
+        # The ollama clients wrap an httpx client; ChatOllama exposes neither publicly
+        for attr, closer in (("_async_client", "aclose"), ("_client", "close")):
+            http_client = getattr(getattr(llm, attr, None), "_client", None)
+            if http_client is None:
+                continue
+            try:
+                result = getattr(http_client, closer)()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.warning(f"Error closing the HTTP client of LLM '{llm.model}': {e}")
+    _llms_without_loop.clear()
+
+
 def get_llm(show_think_process: bool = False) -> ChatOllama:
     """
     LLM factory function.
-    Returns a ChatOllama instance based on the 'show_think_process' flag.
+    Returns the cached ChatOllama instance based on the 'show_think_process' flag.
     - If True, uses the Chain-of-Thought model (OLLAMA_COT_MODEL).
     - If False, uses the standard chat model (OLLAMA_CHAT_MODEL).
     """
@@ -32,14 +121,8 @@ def get_llm(show_think_process: bool = False) -> ChatOllama:
     else:
         model_name = OLLAMA_CHAT_MODEL
         # logger.info(f"Using Chat model: {model_name} at {OLLAMA_URL}")
-    
-    # Robustly clean up the base URL to prevent issues with duplicate /api paths
-    cleaned_base_url = OLLAMA_URL.rstrip("/")
-    if cleaned_base_url.endswith("/api"):
-        cleaned_base_url = cleaned_base_url[:-4]
-    cleaned_base_url = cleaned_base_url.rstrip("/")
 
-    return ChatOllama(model=model_name, base_url=cleaned_base_url)
+    return get_ollama_llm(model_name)
 
 # The global llm instance is now deprecated. Code should use the get_llm() factory.
 # llm = ChatOpenAI(...)
@@ -96,16 +179,12 @@ async def llm_ollama_deepseek_ainvoke(message: str, model: str = OLLAMA_COT_MODE
         #     api_key='ollama',
         #     model=model
         # )
-        # Robustly clean up the base URL to prevent issues with duplicate /api paths
-        cleaned_base_url = base_url.rstrip("/")
-        if cleaned_base_url.endswith("/api"):
-            cleaned_base_url = cleaned_base_url[:-4]
-        cleaned_base_url = cleaned_base_url.rstrip("/")
-        ollama_llm = ChatOllama(model=model, base_url=cleaned_base_url)
+        ollama_llm = get_ollama_llm(model, base_url)
         # response = await client.chat.completions.create(
         #     messages=message
         #     )
-        response = await ollama_llm.ainvoke(message)
+        async with get_llm_dispatcher().slot(model):
+            response = await ollama_llm.ainvoke(message)
         return response.content
     except Exception as e:
         print(f"Error calling Ollama model {model}: {e}")
@@ -124,15 +203,11 @@ async def llm_ollama_qwen_ainvoke(message: str, model: str = OLLAMA_QWEN_MODEL,
         生成的文本响应
     """
     try:
-        # Robustly clean up the base URL to prevent issues with duplicate /api paths
-        cleaned_base_url = base_url.rstrip("/")
-        if cleaned_base_url.endswith("/api"):
-            cleaned_base_url = cleaned_base_url[:-4]
-        cleaned_base_url = cleaned_base_url.rstrip("/")
-        ollama_llm = ChatOllama(model=model, base_url=cleaned_base_url)
+        ollama_llm = get_ollama_llm(model, base_url)
         # For function calling, you would typically pass tools to the LLM
         # For now, we'll just return content, and the agent will handle parsing.
-        response = await ollama_llm.ainvoke(message)
+        async with get_llm_dispatcher().slot(model):
+            response = await ollama_llm.ainvoke(message)
         return response.content
     except Exception as e:
         print(f"Error calling Ollama Qwen model {model}: {e}")
@@ -156,12 +231,7 @@ async def llm_ollama_vision_ainvoke(question: str, image_bytes: bytes, model: st
         image_url = f"data:image/jpeg;base64,{base64_image}"
 
         # 获取Ollama实例
-        cleaned_base_url = settings.OLLAMA_SERVING_URL.rstrip("/")
-        if cleaned_base_url.endswith("/api"):
-            cleaned_base_url = cleaned_base_url[:-4]
-        cleaned_base_url = cleaned_base_url.rstrip("/")
-        
-        llm = ChatOllama(model=model, base_url=cleaned_base_url)
+        llm = get_ollama_llm(model)
 
         # 构建多模态消息
         message = HumanMessage(
@@ -178,7 +248,8 @@ async def llm_ollama_vision_ainvoke(question: str, image_bytes: bytes, model: st
         )
 
         # 调用模型并获取响应
-        response = await llm.ainvoke([message])
+        async with get_llm_dispatcher().slot(model):
+            response = await llm.ainvoke([message])
         return response.content
 
     except Exception as e:
@@ -4,6 +4,7 @@
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
+import asyncio
 import logging
 from fastapi import FastAPI
 import os
@@ -14,8 +15,13 @@ from contextlib import asynccontextmanager
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from app.services.inactive_user_cleaner import remove_expired_unactivated_users
 from app.services.conversation_cleaner import remove_old_conversations
+from app.services.bulk_purge_service import retry_failed_purges
 from app.initial_data import initialize_data
-from app.services.minio_sync_service import sync_minio_bucket # Import the new sync service
+from app.services.minio_sync_service import sync_minio_bucket, start_bucket_event_listener, stop_bucket_event_listener # Import the new sync service
+from app.core.http_clients import init_http_clients, close_http_clients
+from app.core.minio_client import init_minio_clients, close_minio_clients
+from app.core.mongo_client import init_mongo_client, close_mongo_client
+from app.llm.llm import init_llms, close_llms
 
 # Import routers
 from app.routers import captcha
@@ -55,11 +61,16 @@ async def lifespan(app: FastAPI):
         await initialize_data(db)
     
     await connect_to_milvus() # Keep Milvus connection logic
+    await init_http_clients() # Pooled clients for PaddleOCR, LatexOCR, MinerU and Ollama
+    init_llms() # Cached ChatOllama instances for the chat and chain-of-thought models
+    await asyncio.to_thread(init_minio_clients) # Shared MinIO client and bucket-existence cache
+    await init_mongo_client() # Shared async MongoDB client for chat persistence
     
     logger.info("Application startup: Starting scheduler and adding cleanup jobs.")
     scheduler.start()
     scheduler.add_job(remove_expired_unactivated_users, 'interval', days=1, id='user_cleanup_job')
     scheduler.add_job(remove_old_conversations, 'interval', days=1, id='conversation_cleanup_job')
+    scheduler.add_job(retry_failed_purges, 'interval', minutes=settings.PURGE_RETRY_INTERVAL_MINUTES, id='purge_retry_job')
     
     # Configure and add the new MinIO sync job if it's enabled
     if settings.MINIO_SYNC_ENABLED:
@@ -82,6 +93,7 @@ async def lifespan(app: FastAPI):
             minute=minute,
             id='minio_sync_job'
         )
+        start_bucket_event_listener() # No-op unless MINIO_SYNC_NOTIFICATIONS_ENABLED
     else:
         logger.info("MinIO sync is disabled. Skipping job scheduling.")
     
@@ -93,6 +105,11 @@ async def lifespan(app: FastAPI):
     logger.info("Application shutdown: Shutting down scheduler.")
     scheduler.shutdown()
     print("Scheduler shut down.")
+    await close_http_clients()
+    await close_llms()
+    stop_bucket_event_listener()
+    close_minio_clients()
+    await close_mongo_client()
 
 app = FastAPI(lifespan=lifespan) # Pass the lifespan context manager
 
@@ -1,13 +1,17 @@
 import logging
 import json
 import io
-from minio import Minio
+import hashlib
+from dataclasses import dataclass
+from minio.commonconfig import ComposeSource
+from minio.deleteobjects import DeleteObject
 from minio.error import S3Error
-import asyncio
+from fastapi import UploadFile
 import os
-from typing import Optional
+from typing import BinaryIO, List, Optional
 from datetime import timedelta
 from ..core.config import settings # Global import
+from ..core.minio_client import get_minio_client, get_client_for_endpoint, ensure_bucket, run_minio
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -42,20 +46,10 @@ def store_document_in_minio(file_path: str, object_name: str, bucket_name: str,
         raise ValueError("MinIO endpoint is not defined.")
 
     try:
-        minio_client = Minio(
-            actual_minio_endpoint,
-            access_key=MINIO_ACCESS_KEY,
-            secret_key=MINIO_SECRET_KEY,
-            secure=False  # Disable SSL for local development
-        )
+        minio_client = get_client_for_endpoint(actual_minio_endpoint, MINIO_ACCESS_KEY, MINIO_SECRET_KEY)
 
-        # Check if bucket exists
-        found = minio_client.bucket_exists(bucket_name)
-        if not found:
-            minio_client.make_bucket(bucket_name)
-            logger.info(f"Bucket '{bucket_name}' created.")
-        else:
-            logger.info(f"Bucket '{bucket_name}' already exists.")
+        # Check if bucket exists (cached after the first check)
+        ensure_bucket(bucket_name, minio_client)
 
         # Upload the file
         minio_client.fput_object(
@@ -84,13 +78,8 @@ def generate_presigned_url(bucket_name: str, object_name: str, expires_in_second
         The presigned URL, or None if an error occurs.
     """
     try:
-        minio_client = Minio(
-            MINIO_ENDPOINT, # Use the environment endpoint for generating presigned URLs
-            access_key=MINIO_ACCESS_KEY,
-            secret_key=MINIO_SECRET_KEY,
-            secure=False
-        )
-        
+        minio_client = get_minio_client()
+
         # Get a presigned URL for the object
         url = minio_client.presigned_get_object(
             bucket_name,
@@ -118,12 +107,7 @@ def get_document_from_minio(object_name: str, bucket_name: str, dest_path: str):
         The local path where the file was saved.
     """
     try:
-        minio_client = Minio(
-            MINIO_ENDPOINT, # Use the environment endpoint
-            access_key=MINIO_ACCESS_KEY,
-            secret_key=MINIO_SECRET_KEY,
-            secure=False  # Disable SSL for local development
-        )
+        minio_client = get_minio_client()
 
         minio_client.fget_object(
             bucket_name,
@@ -146,12 +130,7 @@ def delete_document_from_minio(object_name: str, bucket_name: str):
         bucket_name: The name of the bucket to delete from.
     """
     try:
-        minio_client = Minio(
-            MINIO_ENDPOINT, # Use the environment endpoint
-            access_key=MINIO_ACCESS_KEY,
-            secret_key=MINIO_SECRET_KEY,
-            secure=False  # Disable SSL for local development
-        )
+        minio_client = get_minio_client()
 
         minio_client.remove_object(
             bucket_name,
@@ -163,10 +142,30 @@ def delete_document_from_minio(object_name: str, bucket_name: str):
         logger.error(f"Error occurred while deleting '{object_name}' from bucket '{bucket_name}': {e}")
         raise
 
+MINIO_DELETE_BATCH_SIZE = 1000  # S3 DeleteObjects accepts at most 1000 keys per request
+
+def delete_documents_from_minio(object_names: List[str], bucket_name: str):
+    """
+    Deletes many objects with multi-object DeleteObjects requests (1000 keys each)
+    instead of one request per object. Objects that no longer exist are not errors.
+    Blocking; call it through run_minio from async code.
+    """
+    if not object_names:
+        return
+    minio_client = get_minio_client()
+    errors = []
+    for i in range(0, len(object_names), MINIO_DELETE_BATCH_SIZE):
+        batch = [DeleteObject(name) for name in object_names[i:i + MINIO_DELETE_BATCH_SIZE]]
+        # remove_objects is lazy: the requests are sent while its errors are iterated
+        errors.extend(e for e in minio_client.remove_objects(bucket_name, batch) if e.code != "NoSuchKey")
+    if errors:
+        raise RuntimeError(f"{len(errors)} object(s) could not be deleted from '{bucket_name}', e.g. {errors[0].name}: {errors[0].message}")
+    logger.info(f"Successfully deleted {len(object_names)} object(s) from '{bucket_name}'")
+
 async def get_document_bytes_from_minio(object_name: str, bucket_name: str) -> bytes:
     """
     Downloads a document from MinIO and returns its content as bytes.
-    This is an async function that runs the synchronous MinIO call in a thread.
+    This is an async function that runs the synchronous MinIO call on the MinIO executor.
 
     Args:
         object_name: The name of the object in the MinIO bucket.
@@ -178,13 +177,7 @@ async def get_document_bytes_from_minio(object_name: str, bucket_name: str) -> b
     
     def _get_bytes():
         try:
-            minio_client = Minio(
-                MINIO_ENDPOINT,
-                access_key=MINIO_ACCESS_KEY,
-                secret_key=MINIO_SECRET_KEY,
-                secure=False
-            )
-            
+            minio_client = get_minio_client()
             response = minio_client.get_object(bucket_name, object_name)
             file_bytes = response.read()
             return file_bytes
@@ -196,10 +189,9 @@ async def get_document_bytes_from_minio(object_name: str, bucket_name: str) -> b
                 response.close()
                 response.release_conn()
 
-    # Run the synchronous MinIO operation in a separate thread
+    # Run the synchronous MinIO operation on the dedicated MinIO executor
     # to avoid blocking the asyncio event loop.
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, _get_bytes)
+    return await run_minio(_get_bytes)
 
 def store_json_object_in_minio(data: dict, object_name: str, bucket_name: str) -> Optional[str]:
     """
@@ -218,17 +210,10 @@ def store_json_object_in_minio(data: dict, object_name: str, bucket_name: str) -
         return None
 
     try:
-        minio_client = Minio(
-            MINIO_ENDPOINT,
-            access_key=MINIO_ACCESS_KEY,
-            secret_key=MINIO_SECRET_KEY,
-            secure=False
-        )
+        minio_client = get_minio_client()
 
         # Ensure bucket exists
-        if not minio_client.bucket_exists(bucket_name):
-            minio_client.make_bucket(bucket_name)
-            logger.info(f"Bucket '{bucket_name}' created.")
+        ensure_bucket(bucket_name, minio_client)
 
         # Convert dict to JSON bytes and upload
         json_bytes = json.dumps(data, indent=4, ensure_ascii=False).encode('utf-8')
@@ -269,12 +254,7 @@ def read_json_object_from_minio(object_name: str, bucket_name: str) -> Optional[
 
     response = None
     try:
-        minio_client = Minio(
-            MINIO_ENDPOINT,
-            access_key=MINIO_ACCESS_KEY,
-            secret_key=MINIO_SECRET_KEY,
-            secure=False
-        )
+        minio_client = get_minio_client()
 
         response = minio_client.get_object(bucket_name, object_name)
         json_bytes = response.read()
@@ -295,4 +275,87 @@ def read_json_object_from_minio(object_name: str, bucket_name: str) -> Optional[
     finally:
         if response:
             response.close()
-            response.release_conn()
\ No newline at end of file
+            response.release_conn()
+
+class HashingReader:
+    """
+    Read-only file wrapper that computes the SHA256 and size of everything read
+    through it, so a stream can be hashed while it is being uploaded.
+    """
+
+    def __init__(self, raw: BinaryIO):
+        self._raw = raw
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._raw.read(size)
+        self._sha256.update(data)
+        self.size += len(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._sha256.hexdigest()
+
+
+@dataclass
+class StreamedUpload:
+    bucket_name: str
+    object_name: str
+    size: int
+    sha256: str
+    etag: str
+
+
+def stream_object_to_minio(fileobj: BinaryIO, object_name: str, bucket_name: str,
+                           content_type: str = "application/octet-stream",
+                           part_size_mb: Optional[int] = None) -> StreamedUpload:
+    """
+    Streams a file-like object into MinIO as a multipart upload of unknown length,
+    hashing it on the way. Parts are uploaded one at a time, so memory use is
+    bounded by the part size regardless of the file size. Blocking.
+
+    Args:
+        fileobj: Readable binary stream, positioned at the start of the data.
+        object_name: The desired name for the object in MinIO.
+        bucket_name: The name of the bucket to upload to.
+        content_type: Content type stored with the object.
+        part_size_mb: Multipart part size; defaults to MINIO_UPLOAD_PART_SIZE_MB.
+
+    Returns:
+        A StreamedUpload with the object's size, SHA256 and ETag.
+    """
+    part_size = max(part_size_mb or settings.MINIO_UPLOAD_PART_SIZE_MB, 5) * 1024 * 1024
+    minio_client = get_minio_client()
+    ensure_bucket(bucket_name, minio_client)
+
+    reader = HashingReader(fileobj)
+    result = minio_client.put_object(
+        bucket_name,
+        object_name,
+        reader,
+        length=-1,
+        part_size=part_size,
+        num_parallel_uploads=1,
+        content_type=content_type or "application/octet-stream",
+    )
+    logger.info(f"Streamed {reader.size} bytes to '{bucket_name}/{object_name}' in {part_size // (1024 * 1024)} MB parts.")
+    return StreamedUpload(bucket_name, object_name, reader.size, reader.hexdigest(), result.etag)
+
+
+async def stream_upload_to_minio(file: UploadFile, object_name: str, bucket_name: str,
+                                 part_size_mb: Optional[int] = None) -> StreamedUpload:
+    """
+    Streams a FastAPI UploadFile into MinIO on the MinIO executor, reading from
+    the spooled upload directly instead of copying it to memory or a temp file.
+    """
+    await file.seek(0)
+    return await run_minio(stream_object_to_minio, file.file, object_name, bucket_name, file.content_type, part_size_mb)
+
+
+def move_object_in_minio(source_object: str, dest_object: str, bucket_name: str) -> None:
+    """Server-side copy of an object to a new name followed by removal of the source. Blocking."""
+    minio_client = get_minio_client()
+    # compose_object falls back to a multipart copy for objects larger than 5 GB.
+    minio_client.compose_object(bucket_name, dest_object, [ComposeSource(bucket_name, source_object)])
+    minio_client.remove_object(bucket_name, source_object)
@@ -5,6 +5,7 @@ import asyncio
 import logging
 from concurrent.futures import ThreadPoolExecutor
 from ..core.config import settings
+from ..core.http_clients import get_ollama_client
 from sentence_transformers import SentenceTransformer, CrossEncoder
 from typing import List, Dict, Any, Optional
 
@@ -89,18 +90,18 @@ async def get_embedding_from_ollama(text: str) -> Optional[np.ndarray]:
     }
     
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(OLLAMA_EMBEDDING_API_URL, json=payload)
-            response.raise_for_status()
-            
-            data = response.json()
-            embedding = data.get("embedding")
-            
-            if embedding:
-                return np.array(embedding, dtype=np.float32)
-            else:
-                logger.error(f"Failed to get embedding from Ollama. Response: {data}")
-                return None
+        client = get_ollama_client(OLLAMA_EMBEDDING_MODEL_NAME)
+        response = await client.post(OLLAMA_EMBEDDING_API_URL, json=payload, timeout=60.0)
+        response.raise_for_status()
+        
+        data = response.json()
+        embedding = data.get("embedding")
+        
+        if embedding:
+            return np.array(embedding, dtype=np.float32)
+        else:
+            logger.error(f"Failed to get embedding from Ollama. Response: {data}")
+            return None
     except httpx.RequestError as e:
         logger.error(f"HTTP request to Ollama embedding service failed: {e}", exc_info=True)
         return None
@@ -179,22 +180,22 @@ async def _rerank_with_ollama(query: str, documents: List[Dict[str, Any]]) -> Li
     }
 
     try:
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            logger.info(f"Sending {len(doc_contents)} documents to Ollama reranker: {OLLAMA_RERANKER_MODEL}")
-            response = await client.post(OLLAMA_RERANK_API_URL, json=payload)
-            response.raise_for_status()
-            
-            rerank_results = response.json().get("results", [])
-            
-            # The rerank API should return a list of {'document': str, 'relevance_score': float, 'index': int}
-            # We need to map these scores back to our original document dictionaries.
-            for result in rerank_results:
-                original_index = result.get('index')
-                if original_index is not None and original_index < len(documents):
-                    documents[original_index]['rerank_score'] = result.get('relevance_score')
+        client = get_ollama_client(OLLAMA_RERANKER_MODEL)
+        logger.info(f"Sending {len(doc_contents)} documents to Ollama reranker: {OLLAMA_RERANKER_MODEL}")
+        response = await client.post(OLLAMA_RERANK_API_URL, json=payload, timeout=120.0)
+        response.raise_for_status()
+        
+        rerank_results = response.json().get("results", [])
+        
+        # The rerank API should return a list of {'document': str, 'relevance_score': float, 'index': int}
+        # We need to map these scores back to our original document dictionaries.
+        for result in rerank_results:
+            original_index = result.get('index')
+            if original_index is not None and original_index < len(documents):
+                documents[original_index]['rerank_score'] = result.get('relevance_score')
 
-            # Sort by the new score, handling cases where some docs might not get a score
-            return sorted(documents, key=lambda x: x.get('rerank_score', -float('inf')), reverse=True)
+        # Sort by the new score, handling cases where some docs might not get a score
+        return sorted(documents, key=lambda x: x.get('rerank_score', -float('inf')), reverse=True)
 
     except httpx.RequestError as e:
         logger.error(f"HTTP request to Ollama rerank service failed: {e}", exc_info=True)
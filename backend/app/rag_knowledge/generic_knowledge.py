@@ -11,7 +11,6 @@ from typing import List, Dict, Any, Tuple, Optional, AsyncGenerator
 import aiofiles
 import numpy as np
 from pymilvus import Collection, connections, FieldSchema, CollectionSchema, DataType, utility
-import markdown
 from bs4 import BeautifulSoup
 from pymongo import MongoClient
 from pymongo.server_api import ServerApi
@@ -19,14 +18,15 @@ from PIL import Image
 from sqlalchemy.orm import Session
 from fastapi import UploadFile
 from minio.error import S3Error
-from datetime import timedelta
 
 from app.models.database import FileGist
 from app.schemas import schemas
 from app.services.file_upload_service import get_minio_client
+from app.services.presigned_url_service import get_presigned_url_service
 from ..core.config import settings # Global import
 from app.services.mineru_parser import parse_doc # Import our new parser
 from app.core.state import doc_processing_lock # Import the global lock
+from app.core.http_clients import connection_stats, ConnectionStats
 
 # Configure logger
 logger = logging.getLogger(__name__)
@@ -50,9 +50,13 @@ from app.llm.llm import get_llm
 # 假设get_embedding函数已经存在
 from app.rag_knowledge.embedding_service import get_embedding, rerank_documents
 from app.services import ollama_service # Import the central service
+from app.services.llm_dispatcher import LLMPriority, llm_request_context
+from app.services import prompt_builder
+from app.services.prompt_builder import PromptBuilder
 from app.services.paddleocr_service import call_paddleocr_service
-from app.services.latexocr_service import call_latexocr_service
-from transformers import AutoProcessor, AutoModelForImageTextToText
+from app.services.figure_ocr_service import FigureJob, recognize_figures
+from app.rag_knowledge.ocr_model_service import get_ocr_model_service
+from app.rag_knowledge.markdown_parser import parse_markdown_structure
 from app.tools.pdf import process_pdf_with_mineru
 from app.tools.deal_document import summary_documents_content
 import fitz  # PyMuPDF
@@ -80,23 +84,14 @@ async def _process_image_with_paddle(file_bytes: bytes, filename: str) -> str:
 
 
 def ocr_image(image_path: str):
-    device = OLLAMA_DEVICE 
-    model = AutoModelForImageTextToText.from_pretrained("stepfun-ai/GOT-OCR-2.0-hf", device_map=device)
-    processor = AutoProcessor.from_pretrained("stepfun-ai/GOT-OCR-2.0-hf")
-
+    """
+    Recognizes the text in an image file with the shared GOT-OCR model.
+    The model is loaded once per process (see OcrModelService), not per image.
+    """
     try:
         # Open the image file using Pillow
-        image = Image.open(image_path)
-        inputs = processor(image, return_tensors="pt").to(device)
-
-        generate_ids = model.generate(
-            **inputs,
-            do_sample=False,
-            tokenizer=processor.tokenizer,
-            stop_strings="<|im_end|>",
-            max_new_tokens=4096,
-        )
-        wor = processor.decode(generate_ids[0, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+        with Image.open(image_path) as image:
+            wor = get_ocr_model_service().recognize(image)
         logger.info(wor)
         return wor
     except Exception as e:
@@ -162,70 +157,52 @@ async def read_markdown_file(file_path: str) -> str:
 
 async def parse_markdown(content: str, base_path: str, image_base_path: str) -> List[Dict[str, Any]]:
     """解析Markdown内容，分割为文本块和图片"""
-    # 将Markdown转换为HTML
-    html = markdown.markdown(content)
-    soup = BeautifulSoup(html, 'html.parser')
+    # Single pass over the markdown token stream (linear in document size).
+    parsed = parse_markdown_structure(content)
 
     chunks = []
 
     # 处理文本段落
-    # Expand the list of tags to extract text from, ensuring comprehensive content capture.
-    # This now includes all header levels, paragraphs, list items, and table cells.
-    for element in soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'td', 'th']):
-        if element.text.strip():
-            chunks.append({
-                "content": element.text.strip(),
-                "is_image": "False",
-                "filepath": base_path
-            })
+    # Headings, paragraphs, list items and table cells, in document order.
+    for block in parsed.text_blocks:
+        chunks.append({
+            "content": block.text,
+            "is_image": "False",
+            "filepath": base_path,
+            "section": " > ".join(block.section)
+        })
 
     # 处理图片
-    for img in soup.find_all('img'):
-        img_src = img.get('src', '')
-        if img_src:
-            logger.info(img_src)
-            # 处理相对路径
-            if not os.path.isabs(img_src):
-                # Use the provided image_base_path for joining
-                img_path = os.path.join(image_base_path, os.path.basename(img_src))
-            else:
-                img_path = img_src
+    for image in parsed.images:
+        img_src = image.src
+        logger.info(img_src)
+        # 处理相对路径
+        if not os.path.isabs(img_src):
+            # Use the provided image_base_path for joining
+            img_path = os.path.join(image_base_path, os.path.basename(img_src))
+        else:
+            img_path = img_src
 
-            # 提取图片文字
-            try:
-                ocr_text = ocr_image(img_path)
-
-                # 获取图片上下文（前后的文本块）
-                context = ""
-                img_index = soup.find_all().index(img)
-
-                # 查找前面的文本
-                for i in range(img_index - 1, -1, -1):
-                    element = soup.find_all()[i]
-                    # if element.name in ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'] and element.text.strip():
-                    if element.name in ['p', 'h1', 'h2' ] and element.text.strip():
-                        context += element.text.strip() + " "
-                        break
-
-                # 查找后面的文本
-                for i in range(img_index + 1, len(soup.find_all())):
-                    element = soup.find_all()[i]
-                    # if element.name in ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'] and element.text.strip():
-                    if element.name in ['p', 'h1', 'h2'] and element.text.strip():
-                        context += element.text.strip()
-                        break
-
-                # 图片内容为OCR文本+上下文
-                img_content = f"{ocr_text} [上下文: {context.strip()}]"
-
-                chunks.append({
-                    "content": img_content,
-                    "is_image": "True",
-                    "filepath": img_path
-                })
-            except Exception as e:
-                logger.error(f"处理图片时出错: {img_path}, 错误: {str(e)}", exc_info=True)
-    logger.debug(f"Parsed chunks: {chunks}")
+        # 提取图片文字
+        try:
+            # Blocking model inference runs in a worker thread to keep the event loop free.
+            ocr_text = await asyncio.to_thread(ocr_image, img_path)
+
+            # 获取图片上下文（前后的文本块）
+            context = f"{image.context_before} {image.context_after}"
+
+            # 图片内容为OCR文本+上下文
+            img_content = f"{ocr_text} [上下文: {context.strip()}]"
+
+            chunks.append({
+                "content": img_content,
+                "is_image": "True",
+                "filepath": img_path,
+                "section": " > ".join(image.section)
+            })
+        except Exception as e:
+            logger.error(f"处理图片时出错: {img_path}, 错误: {str(e)}", exc_info=True)
+    logger.debug(f"Parsed {len(chunks)} chunks from markdown.")
     return chunks
 
 
@@ -456,6 +433,7 @@ async def query_rag_system(
 
     combined_context = []
     source_documents = []
+    file_gist_lookup = {}
 
     for result in all_search_results:
         chunk_id = result.get("id")
@@ -489,11 +467,15 @@ async def query_rag_system(
                     # Retrieve file gist with download URL using the new service
                     # Use the new service function to get the file gist by filename and RAG item ID
                     logger.debug(f"--- DEBUG: Attempting to find download URL for filename: '{original_filename}' in RAG ID: {result.get('rag_item_id')} ---")
-                    file_gist_with_url = get_file_gist_by_filename_and_rag_id(
-                        db_session,
-                        filename=original_filename, # Use the original_filename from Mongo directly
-                        rag_id=result.get("rag_item_id")
-                    )
+                    # Several hits usually come from the same file; look each file up (and sign it) once
+                    gist_key = (original_filename, result.get("rag_item_id"))
+                    if gist_key not in file_gist_lookup:
+                        file_gist_lookup[gist_key] = get_file_gist_by_filename_and_rag_id(
+                            db_session,
+                            filename=original_filename, # Use the original_filename from Mongo directly
+                            rag_id=result.get("rag_item_id")
+                        )
+                    file_gist_with_url = file_gist_lookup[gist_key]
                     
                     # Collect source information for frontend display
                     source_doc_item = {
@@ -553,7 +535,15 @@ Your task is to answer the user's question based **strictly and solely** on the
 Based on the rules I provided, please answer the question using ONLY the context above.
 """
     
-    user_prompt = user_prompt_template.format(context="\n\n".join(combined_context), query=query_text)
+    # Chunks come in rerank order; keep the best ones that fit next to the prompt and the question.
+    builder = PromptBuilder(settings.MAX_CONTEXT_TOKENS)
+    builder.add("system", [system_prompt, user_prompt_template.format(context="", query=query_text)], 0, prompt_builder.REQUIRED,
+                overhead_tokens=prompt_builder.MESSAGE_OVERHEAD_TOKENS)
+    builder.add("chunks", combined_context, 1, prompt_builder.SKIP, overhead_tokens=1)  # "\n\n" between chunks
+    prompt_build = builder.build()
+    logger.info(f"RAG prompt: {prompt_build.describe()}")
+
+    user_prompt = user_prompt_template.format(context="\n\n".join(prompt_build.selected["chunks"]), query=query_text)
 
     # --- DEBUGGING: Print the final context and prompt ---
     logger.debug("--- DEBUG: System Prompt for LLM ---")
@@ -641,6 +631,7 @@ async def embed_parsed_mineru_data(
     """
     max_retries = 2
     retry_delay = 5  # seconds
+    connection_snapshot = connection_stats.snapshot()
 
     for attempt in range(max_retries + 1):
         mongo_client = None
@@ -684,6 +675,23 @@ async def embed_parsed_mineru_data(
                 logger.error(f"  - ROO_DEBUG: Could not serialize MinerU result to JSON: {json_e}")
                 logger.info(f"  - ROO_DEBUG: Raw MinerU result content: {pdf_info}")
             # --- END ROO DEBUG ---
+
+            # Recognize all figures up front in a concurrent pipeline instead of one at a time.
+            figure_jobs = []
+            for i, block in enumerate(blocks):
+                if not isinstance(block, dict) or block.get('type') not in ['figure', 'image']:
+                    continue
+                if block.get('b64_data'):
+                    try:
+                        figure_jobs.append(FigureJob(key=i, image_bytes=base64.b64decode(block['b64_data'])))
+                    except Exception as e:
+                        logger.error(f"Error decoding figure block {i}'s b64_data: {e}", exc_info=True)
+                elif file_bytes and block.get('page_idx') is not None:
+                    figure_jobs.append(FigureJob(key=i, page_index=block.get('page_idx')))
+                else:
+                    logger.warning(f"MinerU identified an image block but provided no image data (b64_data) or page index. Cannot perform OCR fallback. Block: {block}")
+            figure_texts = await recognize_figures(figure_jobs, file_bytes=file_bytes)
+
             for i, block in enumerate(blocks):
                 if not isinstance(block, dict):
                     logger.warning(f"  - Block {i} is not a dictionary, it is a {type(block)}. Skipping.")
@@ -701,44 +709,7 @@ async def embed_parsed_mineru_data(
                         chunk_content = soup.get_text(separator=' | ', strip=True)
                 # Corrected to handle both 'figure' and 'image' types
                 elif block_type in ['figure', 'image']:
-                    b64_data = block.get('b64_data')
-                    if b64_data:
-                        try:
-                            image_bytes = base64.b64decode(b64_data)
-                            temp_filename = f"figure_{uuid.uuid4()}.png"
-                            recognized_text = await _process_image_with_paddle(image_bytes, temp_filename)
-                            if recognized_text and recognized_text.strip():
-                                chunk_content = f"\n[Image Text: {recognized_text.strip()}]\n"
-                            else:
-                                latex_code = await call_latexocr_service(image_bytes)
-                                if latex_code:
-                                    chunk_content = f"\n$${latex_code}$$\n"
-                        except Exception as e:
-                            logger.error(f"Error processing figure block's b64_data: {e}", exc_info=True)
-                    # --- Fallback Logic ---
-                    elif file_bytes:
-                        page_index = block.get('page_idx')
-                        if page_index is not None:
-                            logger.warning(f"MinerU identified an image on page {page_index} but provided no data. Attempting fallback to PaddleOCR.")
-                            try:
-                                with fitz.open(stream=file_bytes, filetype="pdf") as doc:
-                                    if page_index < len(doc):
-                                        page = doc.load_page(page_index)
-                                        pix = page.get_pixmap()
-                                        img_bytes = pix.tobytes("png")
-
-                                        temp_filename = f"fallback_page_{page_index}.png"
-                                        recognized_text = await _process_image_with_paddle(img_bytes, temp_filename)
-                                        if recognized_text and recognized_text.strip():
-                                            chunk_content = f"\n[Image Text (Fallback OCR): {recognized_text.strip()}]\n"
-                                        else:
-                                            logger.warning(f"Fallback OCR on page {page_index} yielded no text.")
-                                    else:
-                                        logger.error(f"Page index {page_index} is out of bounds for document with {len(doc)} pages.")
-                            except Exception as e:
-                                logger.error(f"Error during PaddleOCR fallback for page {page_index}: {e}", exc_info=True)
-                        else:
-                            logger.warning(f"MinerU identified an image block but provided no image data (b64_data) or page index. Cannot perform OCR fallback. Block: {block}")
+                    chunk_content = figure_texts.get(i, "")
                 
                 if chunk_content and chunk_content.strip():
                     clean_content = chunk_content.strip()
@@ -786,7 +757,8 @@ async def embed_parsed_mineru_data(
             
             document_summary = "No text content to summarize."
             if full_document_text:
-                document_summary = await summary_documents_content(full_document_text, "Summarize this document.")
+                with llm_request_context(LLMPriority.INGESTION):
+                    document_summary = await summary_documents_content(full_document_text, "Summarize this document.")
 
             existing_doc = documents_collection.find_one({"original_filename": os.path.basename(original_filename)})
             if existing_doc:
@@ -797,6 +769,12 @@ async def embed_parsed_mineru_data(
                 documents_collection.insert_one(document_data)
 
             logger.info(f"Successfully processed and embedded {len(processed_chunks_milvus)} chunks for {original_filename}.")
+            http_usage = ConnectionStats.saved_since(connection_snapshot, connection_stats.snapshot())
+            logger.info(
+                f"OCR/parsing HTTP usage for '{original_filename}': {http_usage['requests']} requests, "
+                f"{http_usage['new_connections']} new connections ({http_usage['connect_seconds']:.3f}s), "
+                f"{http_usage['reused_connections']} reused (~{http_usage['estimated_seconds_saved']:.3f}s setup saved)."
+            )
             return len(processed_chunks_milvus)
 
         except (ConnectionError, ValueError, Exception) as e:
@@ -888,8 +866,15 @@ async def process_and_embed_pdf(
             logger.info(f"Released lock for {original_filename}")
 
 
-async def process_markdown_file(file_path: str, image_dir: str, collection_name: str, mongo_db_name: str, mongo_collection_name: str = "documents"):
-    """处理Markdown文件，存入Milvus并记录到MongoDB"""
+async def process_markdown_file(file_path: str, image_dir: str, collection_name: str, mongo_db_name: str, mongo_collection_name: str = "documents",
+                                source_path: Optional[str] = None):
+    """
+    处理Markdown文件，存入Milvus并记录到MongoDB
+
+    `source_path` is the object the text came from (e.g. a MinIO object name) when
+    `file_path` is only a temporary markdown copy. Chunks are then stored under it,
+    like the PDF pipeline does, and earlier chunks of the same source are replaced.
+    """
     # Connect to Milvus
     await connect_to_milvus()
 
@@ -903,7 +888,7 @@ async def process_markdown_file(file_path: str, image_dir: str, collection_name:
     documents_collection = db[mongo_collection_name]
 
     # Extract original filename and paths to generated files (assuming standard output structure from pdf.py)
-    original_filename = os.path.basename(file_path).replace(".md", "")
+    original_filename = os.path.basename(source_path) if source_path else os.path.basename(file_path).replace(".md", "")
     processed_img_dir = os.path.join(os.path.dirname(file_path), "images") # Assuming images are in a subdir named 'images'
     processed_layout_pdf_path = os.path.join(PDF_PATH, original_filename.join("_layout.pdf"))
     processed_model_pdf_path = os.path.join(PDF_PATH, original_filename.join("_model.pdf"))
@@ -916,14 +901,17 @@ async def process_markdown_file(file_path: str, image_dir: str, collection_name:
 
     # Parse Markdown
     # Pass the image_dir to parse_markdown
-    chunks = await parse_markdown(content, file_path, image_dir)
+    chunks = await parse_markdown(content, source_path or file_path, image_dir)
 
     # Process chunks (get embeddings and prepare for Milvus and MongoDB)
     processed_chunks_milvus = []
     simplified_chunks_mongo = []
     for chunk in chunks:
         chunk_id = str(uuid.uuid4())
-        vector = await get_embedding(chunk["content"])
+        # The heading path goes into the embedded text, so a chunk is found (and read) in its section's context
+        section = chunk.get("section", "")
+        chunk_content = f"[{section}]\n{chunk['content']}" if section else chunk["content"]
+        vector = await get_embedding(chunk_content)
         if vector is None or vector.size == 0:
             logger.warning(f"Failed to generate vector for markdown chunk. Skipping. Content: {chunk['content'][:100]}...")
             continue
@@ -932,7 +920,7 @@ async def process_markdown_file(file_path: str, image_dir: str, collection_name:
             "id": chunk_id,
             "vector": vector,
             "filepath": chunk["filepath"],
-            "content": chunk["content"],
+            "content": chunk_content,
             "is_image": chunk["is_image"]
         })
 
@@ -940,11 +928,17 @@ async def process_markdown_file(file_path: str, image_dir: str, collection_name:
         simplified_chunks_mongo.append({
             "chunk_id": chunk_id,
             "content_preview": chunk["content"][:200] + "..." if len(chunk["content"]) > 200 else chunk["content"],
+            "section": section,
             "is_image": chunk["is_image"] == "True",
             # TODO: Add page number if available from the parsing process
         })
 
 
+    if source_path and processed_chunks_milvus:
+        # Re-embedding a changed source replaces its earlier chunks and metadata
+        await delete_milvus_data_by_filepath(collection_name, source_path)
+        documents_collection.delete_many({"original_filename": original_filename})
+
     # Insert into Milvus
     await insert_to_milvus(collection, processed_chunks_milvus)
 
@@ -952,7 +946,8 @@ async def process_markdown_file(file_path: str, image_dir: str, collection_name:
     # Concatenate text chunks for summarization
     text_content = " ".join([chunk["content"] for chunk in chunks if chunk["is_image"] == "False"])
     if text_content:
-        document_summary = await summary_documents_content(text_content, "Summarize this document.") # Using a generic question for summarization
+        with llm_request_context(LLMPriority.INGESTION):
+            document_summary = await summary_documents_content(text_content, "Summarize this document.") # Using a generic question for summarization
     else:
         document_summary = "No text content to summarize."
 
@@ -967,6 +962,8 @@ async def process_markdown_file(file_path: str, image_dir: str, collection_name:
         "summary": document_summary,
         "milvus_chunks": simplified_chunks_mongo
     }
+    if source_path:
+        document_data["source_path"] = source_path  # Not "minio_object_path": purges delete that one as intermediate output
 
     # Insert into MongoDB
     try:
@@ -1008,12 +1005,7 @@ def get_file_gist_by_filename_and_rag_id(db: Session, filename: str, rag_id: int
         return schemas.FileGist.from_orm(file_gist)
 
     try:
-        minio_client = get_minio_client()
-        download_url = minio_client.presigned_get_object(
-            minio_bucket_name,
-            file_gist.filename,
-            expires=timedelta(days=7),
-        )
+        download_url = get_presigned_url_service().get_url(get_minio_client(), minio_bucket_name, file_gist.filename)
         file_gist_schema = schemas.FileGist.from_orm(file_gist)
         file_gist_schema.download_url = download_url
         return file_gist_schema
@@ -0,0 +1,139 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from markdown_it import MarkdownIt
+
+# Block tags whose text becomes a chunk (same set the HTML-based parser extracted).
+_TEXT_BLOCKS = {"paragraph", "heading", "list_item", "td", "th"}
+# Blocks whose text is used as the surrounding context of an image.
+_CONTEXT_HEADINGS = {"h1", "h2"}
+_HTML_IMG_SRC = re.compile(r"<img\b[^>]*?\bsrc\s*=\s*[\"']([^\"']+)[\"']", re.IGNORECASE)
+
+_md = MarkdownIt("commonmark").enable("table")
+
+
+@dataclass
+class TextBlock:
+    text: str
+    section: List[str]  # Titles of the enclosing headings, outermost first
+
+
+@dataclass
+class ImageRef:
+    src: str
+    section: List[str]
+    context_before: str = ""
+    context_after: str = ""
+
+
+@dataclass
+class ParsedMarkdown:
+    text_blocks: List[TextBlock] = field(default_factory=list)
+    images: List[ImageRef] = field(default_factory=list)
+
+
+@dataclass
+class _OpenBlock:
+    kind: str
+    slot: int
+    is_context: bool
+    parts: List[str] = field(default_factory=list)
+    # Images inside this block; they wait for the next context block, not this one.
+    images: List[ImageRef] = field(default_factory=list)
+
+
+def _inline_text(token) -> str:
+    """Plain text of an inline token, without markup and without image alt text."""
+    parts = []
+    for child in token.children or []:
+        if child.type in ("text", "code_inline"):
+            parts.append(child.content)
+        elif child.type in ("softbreak", "hardbreak"):
+            parts.append("\n")
+    return "".join(parts)
+
+
+def _inline_images(token) -> List[str]:
+    srcs = []
+    for child in token.children or []:
+        if child.type == "image" and child.attrGet("src"):
+            srcs.append(child.attrGet("src"))
+        elif child.type == "html_inline":
+            srcs.extend(_HTML_IMG_SRC.findall(child.content))
+    return srcs
+
+
+def parse_markdown_structure(content: str) -> ParsedMarkdown:
+    """
+    Splits markdown into text blocks and image references in a single pass over
+    the markdown-it token stream, so the cost is linear in the document size.
+
+    - Paragraphs, headings, list items and table cells each yield a text block,
+      in document order. A list item's text includes its nested content.
+    - Every block carries the heading hierarchy it appears under.
+    - Each image gets the nearest paragraph/h1/h2 text before and after it as
+      context (the paragraph containing the image counts as "before").
+    """
+    result = ParsedMarkdown()
+    slots: List[Optional[TextBlock]] = []
+    open_blocks: List[_OpenBlock] = []
+    headings: List[tuple] = []  # (level, title)
+    last_context = ""
+    awaiting_context: List[ImageRef] = []
+
+    def section() -> List[str]:
+        return [title for _, title in headings]
+
+    for token in _md.parse(content):
+        kind = token.type[:-5] if token.type.endswith("_open") else None
+        if kind in _TEXT_BLOCKS:
+            # Tight list paragraphs are not rendered as <p>; their text only feeds the list item.
+            if kind == "paragraph" and token.hidden:
+                continue
+            is_context = kind == "paragraph" or (kind == "heading" and token.tag in _CONTEXT_HEADINGS)
+            open_blocks.append(_OpenBlock(kind=kind, slot=len(slots), is_context=is_context))
+            slots.append(None)
+            if kind == "heading":
+                level = int(token.tag[1])
+                while headings and headings[-1][0] >= level:
+                    headings.pop()
+            continue
+
+        if token.type.endswith("_close") and token.type[:-6] in _TEXT_BLOCKS:
+            if token.type == "paragraph_close" and token.hidden:
+                continue
+            block = open_blocks.pop()
+            text = "\n".join(part for part in block.parts if part.strip()).strip()
+            if block.kind == "heading":
+                headings.append((int(token.tag[1]), text))
+            if text:
+                slots[block.slot] = TextBlock(text=text, section=section())
+                if block.is_context:
+                    for image in awaiting_context:
+                        image.context_after = text
+                    awaiting_context = []
+                    last_context = text
+            awaiting_context.extend(block.images)
+            continue
+
+        if token.type == "inline":
+            text = _inline_text(token)
+            for block in open_blocks:
+                block.parts.append(text)
+            # The enclosing paragraph's text is the context before its own images.
+            if open_blocks and open_blocks[-1].is_context and text.strip():
+                last_context = text.strip()
+            srcs = _inline_images(token)
+        elif token.type == "html_block":
+            srcs = _HTML_IMG_SRC.findall(token.content)
+        else:
+            continue
+
+        for src in srcs:
+            image = ImageRef(src=src, section=section(), context_before=last_context)
+            result.images.append(image)
+            (open_blocks[-1].images if open_blocks else awaiting_context).append(image)
+
+    result.text_blocks = [block for block in slots if block is not None]
+    return result
@@ -0,0 +1,111 @@
+import gc
+import logging
+import threading
+import time
+from PIL import Image
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OcrModelService:
+    """
+    Process-wide holder for the GOT-OCR model used when ingesting markdown images.
+
+    The model and processor are loaded lazily on the first request and kept for
+    later images. Inference is serialized with a lock because the model is not
+    safe to call from several threads. After GOT_OCR_IDLE_UNLOAD_SECONDS without
+    use the model is released to free (GPU) memory; the next request reloads it.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(OcrModelService, cls).__new__(cls)
+                cls._instance._model = None
+                cls._instance._processor = None
+                cls._instance._lock = threading.Lock()
+                cls._instance._last_used = 0.0
+                cls._instance._unload_timer = None
+                cls._instance.model_name = settings.GOT_OCR_MODEL
+                cls._instance.device = settings.GOT_OCR_DEVICE or settings.OLLAMA_DEVICE or "cpu"
+                cls._instance.idle_timeout = settings.GOT_OCR_IDLE_UNLOAD_SECONDS
+        return cls._instance
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    def _load(self):
+        """Loads model and processor. Must be called with the lock held."""
+        from transformers import AutoProcessor, AutoModelForImageTextToText
+
+        logger.info(f"Loading OCR model '{self.model_name}' on device '{self.device}'.")
+        start = time.perf_counter()
+        self._model = AutoModelForImageTextToText.from_pretrained(self.model_name, device_map=self.device)
+        self._processor = AutoProcessor.from_pretrained(self.model_name)
+        logger.info(f"OCR model loaded in {time.perf_counter() - start:.1f}s.")
+
+    def _schedule_unload(self):
+        """(Re)starts the idle timer. Must be called with the lock held."""
+        if self.idle_timeout <= 0:
+            return
+        if self._unload_timer is not None:
+            self._unload_timer.cancel()
+        self._unload_timer = threading.Timer(self.idle_timeout, self._unload_if_idle)
+        self._unload_timer.daemon = True
+        self._unload_timer.start()
+
+    def _unload_if_idle(self):
+        with self._lock:
+            if self._model is None or time.monotonic() - self._last_used < self.idle_timeout:
+                return
+            self._unload_locked()
+
+    def _unload_locked(self):
+        """Releases the model. Must be called with the lock held."""
+        logger.info(f"Unloading OCR model '{self.model_name}' to free memory.")
+        self._model = None
+        self._processor = None
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def unload(self):
+        with self._lock:
+            if self._unload_timer is not None:
+                self._unload_timer.cancel()
+                self._unload_timer = None
+            if self._model is not None:
+                self._unload_locked()
+
+    def recognize(self, image: Image.Image, max_new_tokens: int = 4096) -> str:
+        """Runs OCR on a PIL image and returns the recognized text. Blocking; call via asyncio.to_thread."""
+        with self._lock:
+            if self._model is None:
+                self._load()
+            try:
+                inputs = self._processor(image, return_tensors="pt").to(self.device)
+                generate_ids = self._model.generate(
+                    **inputs,
+                    do_sample=False,
+                    tokenizer=self._processor.tokenizer,
+                    stop_strings="<|im_end|>",
+                    max_new_tokens=max_new_tokens,
+                )
+                return self._processor.decode(generate_ids[0, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+            finally:
+                self._last_used = time.monotonic()
+                self._schedule_unload()
+
+
+def get_ocr_model_service() -> OcrModelService:
+    """Gets the singleton instance of the OcrModelService."""
+    return OcrModelService()
@@ -4,7 +4,7 @@ import logging
 import os
 from typing import List, Optional, Union
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
@@ -21,7 +21,9 @@ from app.agents.workflow_control_agent import WorkflowControlAgent
 from app.models.database import get_db
 from app.schemas import schemas
 from app.services import auth
+from app.services.llm_dispatcher import LLMPriority, set_llm_request_context
 from app.services.rag_permission_service import RagPermissionService
+from app.utils.stream_cancellation import cancel_on_disconnect
 from app.utils.stream_processors import sse_stream_formatter # Import the new formatter
 
 router = APIRouter()
@@ -54,6 +56,7 @@ orchestrator_agent.register_agent("Workflow Control Agent", workflow_control_age
 
 @router.post("/api/agent_chat")
 async def agent_chat_endpoint(
+    request: Request,
     message: str = Form(...),
     display_thoughts: Optional[str] = Form(None),
     search_ai_active: Optional[str] = Form(None),
@@ -68,6 +71,7 @@ async def agent_chat_endpoint(
     Accepts text message and optional file uploads.
     """
     logger.info(f"Received message: {message}")
+    set_llm_request_context(LLMPriority.AGENT, current_user)
 
     if files is None:
         files_list = []
@@ -110,5 +114,5 @@ async def agent_chat_endpoint(
     }
     
     # The response generation is now handled by the centralized sse_stream_formatter
-    response_generator = sse_stream_formatter(orchestrator_agent.process(message, context))
+    response_generator = sse_stream_formatter(cancel_on_disconnect(request, orchestrator_agent.process(message, context), "agent chat"))
     return StreamingResponse(response_generator, media_type="text/event-stream")
\ No newline at end of file
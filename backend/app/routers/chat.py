@@ -1,7 +1,7 @@
 # backend/app/routers/chat.py
 import logging
 from typing import List, Dict, Any, Optional
-from fastapi import APIRouter, File, UploadFile, Depends, HTTPException, Response
+from fastapi import APIRouter, File, UploadFile, Depends, HTTPException, Query, Request, Response
 from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
@@ -15,6 +15,8 @@ from app.services.chat_attachment_service import ChatAttachmentService
 from app.services.chat_lifecycle_service import ChatLifecycleService
 from app.services.chat_response_service import ChatResponseService
 from app.services.feedback_service import FeedbackService, get_feedback_service
+from app.services.llm_dispatcher import LLMPriority, set_llm_request_context
+from app.utils.stream_cancellation import cancel_on_disconnect
 from app.utils.stream_processors import sse_stream_formatter
 
 router = APIRouter()
@@ -64,11 +66,13 @@ async def upload_chat_files(
 @router.get("/conversations", response_model=List[schemas.Conversation], include_in_schema=False)
 @router.get("/conversations/", response_model=List[schemas.Conversation])
 async def get_user_conversations(
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
     current_user: User = Depends(auth.get_current_active_user),
     lifecycle_service: ChatLifecycleService = Depends(get_chat_lifecycle_service)
 ) -> List[schemas.Conversation]:
-    """Gets all chat conversations for the current user."""
-    conversations = await lifecycle_service.get_all_user_conversations(current_user)
+    """Gets the current user's chat conversations, most recently active first, without their messages."""
+    conversations = await lifecycle_service.get_all_user_conversations(current_user, skip, limit)
     return conversations
 
 @router.post("/conversations", response_model=schemas.Conversation, include_in_schema=False)
@@ -86,11 +90,13 @@ async def create_user_conversation(
 @router.get("/conversations/{conversation_id}/messages/", response_model=List[schemas.ChatMessage])
 async def get_conversation_messages(
     conversation_id: str,
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
     current_user: User = Depends(auth.get_current_active_user),
     lifecycle_service: ChatLifecycleService = Depends(get_chat_lifecycle_service)
 ) -> List[schemas.ChatMessage]:
-    """Gets messages for a specific conversation."""
-    messages = await lifecycle_service.get_messages(conversation_id, current_user)
+    """Gets the messages of a conversation, oldest first; `skip`/`limit` return one page."""
+    messages = await lifecycle_service.get_messages(conversation_id, current_user, skip, limit)
     return messages
 
 @router.post("/conversations/{conversation_id}/messages", response_model=None, include_in_schema=False)
@@ -98,14 +104,17 @@ async def get_conversation_messages(
 async def add_conversation_message(
     conversation_id: str,
     message_create: schemas.MessageCreate,
+    request: Request,
     current_user: User = Depends(auth.get_current_active_user),
     response_service: ChatResponseService = Depends(get_chat_response_service)
 ) -> StreamingResponse | JSONResponse:
-    """Adds a message and streams the bot's response."""
+    """Adds a message and streams the bot's response. The work stops if the client disconnects."""
     if not (message_create.search_ai_active or message_create.search_rosti_active or message_create.search_online_active or message_create.attachments):
         return JSONResponse(content={"message": "Please provide instructions, select a search option, or attach a file."})
 
+    set_llm_request_context(LLMPriority.INTERACTIVE, current_user)
     response_generator = await response_service.generate_response(conversation_id, message_create, current_user)
+    response_generator = cancel_on_disconnect(request, response_generator, "chat")
     return StreamingResponse(sse_stream_formatter(response_generator), media_type="text/event-stream")
 
 @router.get("/conversations/{conversation_id}/messages/{message_id}/attachments/{attachment_id}/download")
@@ -113,14 +122,14 @@ async def download_conversation_attachment(
     conversation_id: str,
     message_id: str,
     attachment_id: str,
+    request: Request,
     current_user: User = Depends(auth.get_current_active_user),
     lifecycle_service: ChatLifecycleService = Depends(get_chat_lifecycle_service),
     attachment_service: ChatAttachmentService = Depends(get_chat_attachment_service)
-):
+) -> Response:
     """Downloads a specific attachment from a message."""
     _, attachment = await lifecycle_service.find_message_and_attachment(conversation_id, message_id, attachment_id, current_user)
-    file_iterator = await attachment_service.handle_download(attachment)
-    return StreamingResponse(file_iterator, media_type=attachment['content_type'], headers={"Content-Disposition": f"attachment; filename=\"{attachment['filename']}\""})
+    return await attachment_service.handle_download(attachment, request)
 
 @router.delete("/conversations/{conversation_id}/messages/{message_id}/attachments/{attachment_id}")
 async def delete_conversation_attachment(
@@ -22,7 +22,8 @@ from app.schemas import schemas
 from app.services import auth
 from app.dependencies.permissions import check_permission # Import the new permission checker
 from app.modules.minio_module import store_document_in_minio
-from minio import Minio
+from app.core.minio_client import get_minio_client
+from app.services.ingestion_scheduler import get_ingestion_scheduler
 from minio.error import S3Error
 from pymilvus import Collection
 from app.rag_knowledge.generic_knowledge import delete_mongo_data_by_filename, delete_milvus_data_by_filepath
@@ -86,12 +87,7 @@ async def process_files_in_background(rag_id: int, file_ids: list[int], user_id:
         db.commit()
 
         try:
-            minio_client = Minio(
-                settings.MINIO_ENDPOINT,
-                access_key=settings.MINIO_ACCESS_KEY,
-                secret_key=settings.MINIO_SECRET_KEY,
-                secure=False
-            )
+            minio_client = get_minio_client()
         except Exception as e:
             for fg in file_gists:
                 fg.processing_status = 'failed'
@@ -101,68 +97,71 @@ async def process_files_in_background(rag_id: int, file_ids: list[int], user_id:
             return
 
         print(f"Background task started for RAG ID {rag_id} with {len(file_gists)} files.")
+        ingestion_scheduler = get_ingestion_scheduler()
 
         for file_gist in file_gists:
-            object_name = file_gist.filename
-            original_file_extension = os.path.splitext(object_name)[1].lower()
+            # Bulk embedding yields to interactive chat during business hours
+            async with ingestion_scheduler.slot():
+                object_name = file_gist.filename
+                original_file_extension = os.path.splitext(object_name)[1].lower()
             
-            file_bytes = None
-            response = None
-            try:
-                # Read file from MinIO into memory
-                response = minio_client.get_object(settings.MINIO_BUCKET_NAME, object_name)
-                file_bytes = response.read()
-                print(f"BG Task: Read '{object_name}' into memory ({len(file_bytes)} bytes).")
+                file_bytes = None
+                response = None
+                try:
+                    # Read file from MinIO into memory
+                    response = minio_client.get_object(settings.MINIO_BUCKET_NAME, object_name)
+                    file_bytes = response.read()
+                    print(f"BG Task: Read '{object_name}' into memory ({len(file_bytes)} bytes).")
                 
-                count = 0
-                if original_file_extension == '.pdf':
-                    from app.rag_knowledge.generic_knowledge import process_and_embed_pdf
-                    count = await process_and_embed_pdf(
-                        file_bytes=file_bytes,
-                        original_filename=object_name,
-                        milvus_collection_name=milvus_collection_name,
-                        mongo_db_name=mongo_db_name,
-                        rag_id=rag_id,
-                        mongo_collection_name=mongo_collection_name
-                    )
-                elif original_file_extension in ['.md', '.txt']:
-                    # For markdown, we still need a temporary file as the current logic expects a path
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=original_file_extension) as tmp:
-                        tmp.write(file_bytes)
-                        tmp_path = tmp.name
-                    
-                    image_dir = tempfile.mkdtemp()
-                    try:
-                        count = await process_markdown_file(
-                            tmp_path, image_dir, milvus_collection_name,
-                            mongo_db_name, mongo_collection_name
+                    count = 0
+                    if original_file_extension == '.pdf':
+                        from app.rag_knowledge.generic_knowledge import process_and_embed_pdf
+                        count = await process_and_embed_pdf(
+                            file_bytes=file_bytes,
+                            original_filename=object_name,
+                            milvus_collection_name=milvus_collection_name,
+                            mongo_db_name=mongo_db_name,
+                            rag_id=rag_id,
+                            mongo_collection_name=mongo_collection_name
                         )
-                    finally:
-                        os.remove(tmp_path)
-                        shutil.rmtree(image_dir)
-                else:
-                    raise ValueError(f"Unsupported file type: {original_file_extension}")
-
-                # If processing was successful
-                file_gist.processing_status = 'success'
-                file_gist.processing_details = f'Successfully processed {count} chunks.'
-                print(f"BG Task: Successfully processed {file_gist.id} ({object_name}).")
-
-            except Exception as e:
-                import traceback
-                error_str = f"Error processing file {object_name}: {e}"
-                print(f"BG Task: --- ERROR ---")
-                print(error_str)
-                traceback.print_exc()
-                print(f"BG Task: --- END ERROR ---")
-                file_gist.processing_status = 'failed'
-                file_gist.processing_details = str(e)
+                    elif original_file_extension in ['.md', '.txt']:
+                        # For markdown, we still need a temporary file as the current logic expects a path
+                        with tempfile.NamedTemporaryFile(delete=False, suffix=original_file_extension) as tmp:
+                            tmp.write(file_bytes)
+                            tmp_path = tmp.name
+                    
+                        image_dir = tempfile.mkdtemp()
+                        try:
+                            count = await process_markdown_file(
+                                tmp_path, image_dir, milvus_collection_name,
+                                mongo_db_name, mongo_collection_name
+                            )
+                        finally:
+                            os.remove(tmp_path)
+                            shutil.rmtree(image_dir)
+                    else:
+                        raise ValueError(f"Unsupported file type: {original_file_extension}")
+
+                    # If processing was successful
+                    file_gist.processing_status = 'success'
+                    file_gist.processing_details = f'Successfully processed {count} chunks.'
+                    print(f"BG Task: Successfully processed {file_gist.id} ({object_name}).")
+
+                except Exception as e:
+                    import traceback
+                    error_str = f"Error processing file {object_name}: {e}"
+                    print(f"BG Task: --- ERROR ---")
+                    print(error_str)
+                    traceback.print_exc()
+                    print(f"BG Task: --- END ERROR ---")
+                    file_gist.processing_status = 'failed'
+                    file_gist.processing_details = str(e)
             
-            finally:
-                if response:
-                    response.close()
-                    response.release_conn()
-                db.commit() # Commit status change for each file
+                finally:
+                    if response:
+                        response.close()
+                        response.release_conn()
+                    db.commit() # Commit status change for each file
         
         print(f"Background task for RAG ID {rag_id} completed.")
 
@@ -299,12 +298,7 @@ async def re_embed_rag_files(rag_id: int, file_embed_request: schemas.FileEmbedR
         raise HTTPException(status_code=404, detail="One or more file IDs not found for the specified RAG entry.")
 
     try:
-        minio_client = Minio(
-            settings.MINIO_ENDPOINT,
-            access_key=settings.MINIO_ACCESS_KEY,
-            secret_key=settings.MINIO_SECRET_KEY,
-            secure=False
-        )
+        minio_client = get_minio_client()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to initialize MinIO client: {e}")
 
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 import io
 import logging
 from typing import List
-from minio import Minio
+from app.core.minio_client import get_client_for_endpoint
+from app.utils.object_streaming import stream_minio_object
 
 from app.models.database import get_db, FileGist, User
 from app.services import auth, rag_file_service
@@ -61,6 +62,7 @@ def read_files(
 @router.get("/{file_id}/content", response_class=StreamingResponse)
 async def get_file_content(
     file_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(auth.get_current_active_user)
 ):
@@ -86,9 +88,7 @@ async def get_file_content(
             minio_bucket_name = settings.CUSTOMER_MINIO_BUCKET_NAME
             if not all([endpoint, access_key, secret_key, minio_bucket_name]):
                 raise ValueError("CUSTOMER MinIO settings are not fully configured.")
-            secure = "https" in endpoint
-            clean_endpoint = endpoint.replace("https://", "").replace("http://", "")
-            minio_client = file_upload_service.Minio(clean_endpoint, access_key=access_key, secret_key=secret_key, secure=secure)
+            minio_client = get_client_for_endpoint(endpoint, access_key, secret_key)
         else:
             endpoint = settings.MINIO_ENDPOINT
             access_key = settings.MINIO_ACCESS_KEY
@@ -96,16 +96,13 @@ async def get_file_content(
             minio_bucket_name = settings.MINIO_BUCKET_NAME
             if not all([endpoint, access_key, secret_key, minio_bucket_name]):
                 raise ValueError("Default MinIO settings are not fully configured.")
-            secure = "https" in endpoint
-            clean_endpoint = endpoint.replace("https://", "").replace("http://", "")
-            minio_client = file_upload_service.Minio(clean_endpoint, access_key=access_key, secret_key=secret_key, secure=secure)
+            minio_client = get_client_for_endpoint(endpoint, access_key, secret_key)
 
-        # Get the file object from MinIO
-        file_object = minio_client.get_object(minio_bucket_name, file_gist.filename)
-
-        # Stream the file content back to the client
-        return StreamingResponse(file_object.stream(32*1024), media_type='application/octet-stream')
+        # Stream the file content straight from MinIO to the client
+        return await stream_minio_object(request, minio_client, minio_bucket_name, file_gist.filename, media_type='application/octet-stream')
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error streaming file from MinIO: {e}")
         raise HTTPException(status_code=500, detail="Could not retrieve file content.")
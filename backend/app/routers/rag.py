@@ -1,14 +1,12 @@
 import os
 import aiofiles
 import json
-from fastapi import APIRouter, File, UploadFile, HTTPException, Query, Depends, status
-import tempfile # Import tempfile
+from fastapi import APIRouter, File, UploadFile, HTTPException, Query, Depends, Request, status
 from typing import List, Dict # Import List and Dict
-from fastapi.responses import JSONResponse, StreamingResponse, Response # Add StreamingResponse and Response
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session, joinedload # Import Session and joinedload
-from datetime import timedelta
 from urllib.parse import urlparse
-import io # Add import for io
+import uuid
 import logging
 logger = logging.getLogger(__name__)
 from app.rag_knowledge.generic_knowledge import process_markdown_file, search_in_milvus, connect_to_milvus, get_mongo_client
@@ -16,17 +14,22 @@ from pymilvus import utility
 from app.tools.deal_document import get_text_from_uploaded_file
 from app.llm.chain import fn_async_summarize_doc
 from app.llm.llm import get_llm
+from app.services.llm_dispatcher import LLMPriority, get_llm_dispatcher, set_llm_request_context
 import shutil # Import shutil for directory cleanup
 import app.models.database as database
 from app.models.database import get_db, FileGist, RagData, User
 from app.schemas import schemas
 from app.services import auth
-from app.modules.minio_module import store_document_in_minio
-from minio import Minio
+from app.modules.minio_module import store_document_in_minio, stream_upload_to_minio, move_object_in_minio
+from app.core.minio_client import get_minio_client, get_customer_minio_client, get_client_for_endpoint, run_minio
 from minio.error import S3Error
 from app.dependencies.permissions import require_abac_permission, check_permission, has_permission
 from app.services.query_filter_service import QueryFilterService, get_query_filter_service
 from app.services.rag_file_service import purge_file_and_all_related_data
+from app.services.bulk_purge_service import purge_files, remove_minio_objects
+from app.utils.object_streaming import stream_minio_object
+from app.utils.stream_cancellation import current_stream_work, run_unless_disconnected
+from app.services.presigned_url_service import get_presigned_url_service
 from ..core.config import settings
 router = APIRouter()
  
@@ -148,23 +151,15 @@ def delete_rag_data(
         if not minio_bucket_name:
             print("MinIO bucket name not set. Skipping MinIO deletion.")
         else:
+            # Only first-party objects are deleted; third-party files live in the customer's bucket
+            object_names = [f.filename for f in associated_files if not f.is_third_party]
             try:
-                minio_client = Minio(settings.MINIO_ENDPOINT, access_key=settings.MINIO_ACCESS_KEY, secret_key=settings.MINIO_SECRET_KEY, secure=False)
-                for file_gist in associated_files:
-                    # Only delete the object from MinIO if it's not a third-party file
-                    if not file_gist.is_third_party:
-                        try:
-                            minio_client.remove_object(minio_bucket_name, file_gist.filename)
-                            print(f"Successfully deleted '{file_gist.filename}' from MinIO.")
-                        except S3Error as e:
-                            print(f"Error deleting object '{file_gist.filename}' from Minio: {e}")
-                    else:
-                        print(f"Skipping deletion of third-party file '{file_gist.filename}' from MinIO.")
+                remove_minio_objects(minio_bucket_name, object_names)
+                print(f"Successfully deleted {len(object_names)} object(s) from MinIO.")
             except Exception as e:
-                print(f"An unexpected error occurred during MinIO client initialization: {e}")
-        
-        for file_gist in associated_files:
-            db.delete(file_gist)
+                print(f"Error deleting objects from MinIO: {e}")
+
+        db.query(database.FileGist).filter(database.FileGist.rag_id == rag_id).delete(synchronize_session=False)
         print(f"Deleted {len(associated_files)} FileGist records from PostgreSQL.")
 
     # 2. Delete the Milvus collection
@@ -209,47 +204,32 @@ def list_rag_files(rag_id: int, db: Session = Depends(get_db), current_user: Use
     check_permission(db, current_user, "read_files", resource_type="rag_data", resource_id=rag_data.id)
 
     files = db.query(database.FileGist).filter(database.FileGist.rag_id == rag_id).all()
-    # ... (rest of the URL generation logic remains the same)
-    files_with_urls = []
     try:
-        # Prepare clients for both first-party and third-party if needed
-        default_minio_client = None
-        if any(not f.is_third_party for f in files):
-            if all([settings.MINIO_ENDPOINT, settings.MINIO_ACCESS_KEY, settings.MINIO_SECRET_KEY, settings.MINIO_BUCKET_NAME]):
-                secure = "https" in settings.MINIO_ENDPOINT
-                clean_endpoint = settings.MINIO_ENDPOINT.replace("https://", "").replace("http://", "")
-                default_minio_client = Minio(clean_endpoint, access_key=settings.MINIO_ACCESS_KEY, secret_key=settings.MINIO_SECRET_KEY, secure=secure)
-        
-        customer_minio_client = None
-        if any(f.is_third_party for f in files):
-            if all([settings.CUSTOMER_MINIO_ENDPOINT, settings.CUSTOMER_MINIO_ACCESS_KEY, settings.CUSTOMER_MINIO_SECRET_KEY, settings.CUSTOMER_MINIO_BUCKET_NAME]):
-                secure = "https" in settings.CUSTOMER_MINIO_ENDPOINT
-                clean_endpoint = settings.CUSTOMER_MINIO_ENDPOINT.replace("https://", "").replace("http://", "")
-                customer_minio_client = Minio(clean_endpoint, access_key=settings.CUSTOMER_MINIO_ACCESS_KEY, secret_key=settings.CUSTOMER_MINIO_SECRET_KEY, secure=secure)
+        # Sign all URLs in one batch per MinIO instance; unchanged files reuse cached URLs
+        url_service = get_presigned_url_service()
+        first_party_urls, third_party_urls = {}, {}
 
+        first_party_names = [f.filename for f in files if not f.is_third_party]
+        if first_party_names:
+            if all([settings.MINIO_ENDPOINT, settings.MINIO_ACCESS_KEY, settings.MINIO_SECRET_KEY, settings.MINIO_BUCKET_NAME]):
+                first_party_urls = url_service.get_urls(get_minio_client(), settings.MINIO_BUCKET_NAME, first_party_names)
+            else:
+                print("Default MinIO client not configured for first-party files.")
+
+        third_party_names = [f.filename for f in files if f.is_third_party]
+        if third_party_names:
+            customer_minio_client = get_customer_minio_client()
+            if customer_minio_client and settings.CUSTOMER_MINIO_BUCKET_NAME:
+                third_party_urls = url_service.get_urls(customer_minio_client, settings.CUSTOMER_MINIO_BUCKET_NAME, third_party_names)
+            else:
+                print("Customer MinIO client not configured for third-party files.")
+
+        files_with_urls = []
         for file_gist in files:
             file_gist_schema = schemas.FileGist.from_orm(file_gist)
-            try:
-                if file_gist.is_third_party:
-                    if customer_minio_client:
-                        bucket_name = settings.CUSTOMER_MINIO_BUCKET_NAME
-                        client = customer_minio_client
-                    else:
-                        raise ValueError("Customer MinIO client not configured for a third-party file.")
-                else:
-                    if default_minio_client:
-                        bucket_name = settings.MINIO_BUCKET_NAME
-                        client = default_minio_client
-                    else:
-                        raise ValueError("Default MinIO client not configured for a first-party file.")
-                
-                download_url = client.presigned_get_object(bucket_name, file_gist.filename, expires=timedelta(days=7))
-                file_gist_schema.download_url = download_url
-            except (S3Error, ValueError) as e:
-                print(f"MinIO Error generating URL for file '{file_gist.filename}': {e}")
-                # Append schema without URL on error
+            urls = third_party_urls if file_gist.is_third_party else first_party_urls
+            file_gist_schema.download_url = urls.get(file_gist.filename)
             files_with_urls.append(file_gist_schema)
-            
         return files_with_urls
     except Exception as e:
         print(f"An unexpected error occurred during MinIO URL generation: {e}")
@@ -290,9 +270,36 @@ async def delete_rag_file(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An error occurred during the file deletion process. Check server logs for details.")
 
 
+@router.post("/{rag_id}/files/purge", response_model=schemas.FilePurgeResponse)
+async def purge_rag_files(
+    rag_id: int,
+    purge_request: schemas.FilePurgeRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth.get_current_active_user)
+):
+    """
+    Deletes many files of a RAG item (or all of them when no file_ids are given)
+    together with their data in MinIO, Milvus and MongoDB, using batched deletes.
+    Store deletions that fail are reported and retried in the background.
+    """
+    rag_data = db.query(database.RagData).filter(database.RagData.id == rag_id).first()
+    if rag_data is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="RAG data not found")
+
+    check_permission(db, current_user, "delete_file", resource_type="rag_data", resource_id=rag_data.id)
+
+    try:
+        result = await purge_files(db, file_ids=purge_request.file_ids, rag_id=rag_id)
+    except Exception as e:
+        logger.error(f"Bulk purge for RAG item {rag_id} failed: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An error occurred during the bulk deletion. Check server logs for details.")
+    return schemas.FilePurgeResponse(purged_file_ids=result.purged_file_ids, failures=result.failures)
+
+
 @router.get("/files/{file_id}/preview")
 async def preview_rag_file(
     file_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(auth.get_current_active_user)
 ):
@@ -323,9 +330,7 @@ async def preview_rag_file(
             logger.info(f"--- ROO DEBUG: CUSTOMER_MINIO_ACCESS_KEY: {access_key} ---")
             if not all([endpoint, access_key, secret_key, minio_bucket_name]):
                 raise ValueError("CUSTOMER MinIO settings are not fully configured.")
-            secure = "https" in endpoint
-            clean_endpoint = endpoint.replace("https://", "").replace("http://", "")
-            minio_client = Minio(clean_endpoint, access_key=access_key, secret_key=secret_key, secure=secure)
+            minio_client = get_client_for_endpoint(endpoint, access_key, secret_key)
         else:
             logger.info("--- ROO DEBUG: is_third_party is False, using default MINIO settings. ---")
             endpoint = settings.MINIO_ENDPOINT
@@ -336,24 +341,23 @@ async def preview_rag_file(
             logger.info(f"--- ROO DEBUG: MINIO_ACCESS_KEY: {access_key} ---")
             if not all([endpoint, access_key, secret_key, minio_bucket_name]):
                 raise ValueError("Default MinIO settings are not fully configured.")
-            secure = "https" in endpoint
-            clean_endpoint = endpoint.replace("https://", "").replace("http://", "")
-            minio_client = Minio(clean_endpoint, access_key=access_key, secret_key=secret_key, secure=secure)
+            minio_client = get_client_for_endpoint(endpoint, access_key, secret_key)
 
         object_name = file_gist.filename
         file_extension = os.path.splitext(object_name)[1].lower()
 
         if file_extension == '.pdf':
-            response = minio_client.get_object(minio_bucket_name, object_name)
-            file_content = io.BytesIO(response.read())
-            response.close()
-            response.release_conn()
-            return StreamingResponse(file_content, media_type='application/pdf', headers={"Content-Disposition": f"inline; filename=\"{os.path.basename(object_name.encode('utf-8').decode('latin-1'))}\""})
+            # Streamed with Range/ETag support so PDF viewers can fetch pages lazily and browsers can cache
+            return await stream_minio_object(request, minio_client, minio_bucket_name, object_name, media_type='application/pdf', filename=os.path.basename(object_name), disposition="inline")
         else:
-            url = minio_client.presigned_get_object(minio_bucket_name, object_name, expires=timedelta(days=7))
+            url = get_presigned_url_service().get_url(minio_client, minio_bucket_name, object_name)
+            if not url:
+                raise ValueError(f"Could not sign a preview URL for '{object_name}'.")
             file_type = 'text' if file_extension in ['.txt', '.md'] else 'image' if file_extension in ['.jpg', '.jpeg', '.png', '.gif'] else 'unknown'
             return {"url": url, "file_type": file_type}
             
+    except HTTPException:
+        raise
     except (S3Error, ValueError) as e:
         raise HTTPException(status_code=500, detail=f"Error generating file preview: {e}")
     except Exception as e:
@@ -374,41 +378,31 @@ async def upload_rag_file(
 
     check_permission(db, current_user, "upload_file", resource_type="rag_data", resource_id=rag_entry.id)
 
-    # ... (rest of the upload logic remains the same)
     minio_bucket_name = settings.MINIO_BUCKET_NAME
     if not minio_bucket_name:
         raise HTTPException(status_code=500, detail="MINIO_BUCKET_NAME environment variable not set.")
-    file_location = None
+    if not all([settings.MINIO_ENDPOINT, settings.MINIO_ACCESS_KEY, settings.MINIO_SECRET_KEY]):
+        raise HTTPException(status_code=500, detail="MinIO credentials environment variables not set.")
+
+    object_name = f"{rag_entry.name}/{file.filename}"
+    # The hash is only known once the whole stream has been read. If another file of this
+    # RAG entry already uses the object name, stage the upload so a duplicate cannot overwrite it.
+    name_taken = db.query(FileGist.id).filter(FileGist.rag_id == rag_id, FileGist.filename == object_name).first() is not None
+    upload_name = f"{rag_entry.name}/.uploads/{uuid.uuid4()}" if name_taken else object_name
+    uploaded = None
     try:
-        # Use a with statement for the temporary file to ensure it's handled correctly
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-            file_content = await file.read()
-            temp_file.write(file_content)
-            file_location = temp_file.name
-
-        # Calculate file hash
-        import hashlib
-        file_hash = hashlib.sha256(file_content).hexdigest()
+        # Stream straight into a MinIO multipart upload, hashing on the way
+        uploaded = await stream_upload_to_minio(file, upload_name, minio_bucket_name)
 
         # Check for duplicates in the same RAG entry
-        existing_file = db.query(FileGist).filter(FileGist.rag_id == rag_id, FileGist.file_hash == file_hash).first()
+        existing_file = db.query(FileGist).filter(FileGist.rag_id == rag_id, FileGist.file_hash == uploaded.sha256).first()
         if existing_file:
+            await run_minio(get_minio_client().remove_object, minio_bucket_name, upload_name)
+            uploaded = None
             raise HTTPException(status_code=409, detail=f"This exact file already exists in this RAG entry (File ID: {existing_file.id}).")
 
-        object_name = f"{rag_entry.name}/{file.filename}"
-        
-        # MinIO Operations
-        minio_endpoint = settings.MINIO_ENDPOINT
-        minio_access_key = settings.MINIO_ACCESS_KEY
-        minio_secret_key = settings.MINIO_SECRET_KEY
-        if not all([minio_endpoint, minio_access_key, minio_secret_key]):
-             raise HTTPException(status_code=500, detail="MinIO credentials environment variables not set.")
-        
-        minio_client = Minio(minio_endpoint, access_key=minio_access_key, secret_key=minio_secret_key, secure=False)
-        if not minio_client.bucket_exists(minio_bucket_name):
-            minio_client.make_bucket(minio_bucket_name)
-            
-        minio_client.fput_object(minio_bucket_name, object_name, file_location)
+        if upload_name != object_name:
+            await run_minio(move_object_in_minio, upload_name, object_name, minio_bucket_name)
         minio_url = f"/{minio_bucket_name}/{object_name}"
 
         # Create and commit the FileGist object with the hash
@@ -416,21 +410,27 @@ async def upload_rag_file(
             filename=object_name,
             gist=f"MinIO Object: {object_name}",
             rag_id=rag_id,
-            file_hash=file_hash
+            file_hash=uploaded.sha256
         )
         db.add(db_gist)
         db.commit()
         db.refresh(db_gist)
         
         return JSONResponse(content={"message": f"File '{file.filename}' uploaded.", "file_gist_id": db_gist.id, "minio_url": minio_url})
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         print(f"!!! DETAILED UPLOAD ERROR: {str(e)}")
         print(f"!!! TRACEBACK: {traceback.format_exc()}")
+        if uploaded and upload_name != object_name:
+            try:
+                await run_minio(get_minio_client().remove_object, minio_bucket_name, upload_name)
+            except Exception as cleanup_error:
+                logger.warning(f"Could not remove staged upload '{upload_name}': {cleanup_error}")
         raise HTTPException(status_code=500, detail=f"Error uploading file: {e}")
     finally:
-        if file_location and os.path.exists(file_location):
-            os.remove(file_location)
+        await file.close()
 
 
 @router.post("/{rag_id}/process_document_for_preview", response_class=JSONResponse)
@@ -465,7 +465,7 @@ async def process_document_for_preview(
                "filename": file.filename, 
                "processed_text": processed_text,
                "success": not is_error,
-               "file_size": file.size if hasattr(file, 'size') else len(await file.read()) if file else 0,
+               "file_size": file.size or 0,
                "message": "文档处理成功" if not is_error else "文档处理遇到问题，请查看详细信息"
            }
        )
@@ -486,26 +486,36 @@ async def process_document_for_preview(
 
 @router.post("/query")
 async def query_rag_system(
+    request: Request,
     query: str = Query(..., description="The user's query for the RAG system."),
     rag_id: int = Query(..., description="The ID of the RAG entry to query."),
     db: Session = Depends(get_db),
     current_user: User = Depends(auth.get_current_active_user)
 ):
     """
-    Queries the RAG system using a hybrid search approach.
+    Queries the RAG system using a hybrid search approach. The query parsing
+    and search are cancelled if the client disconnects before they finish.
     """
     rag_item = db.query(database.RagData).filter(database.RagData.id == rag_id).first()
     if not rag_item:
         raise HTTPException(status_code=404, detail="RAG item not found")
 
     check_permission(db, current_user, "query", resource_type="rag_data", resource_id=rag_item.id)
+    set_llm_request_context(LLMPriority.INTERACTIVE, current_user)
+    return await run_unless_disconnected(request, _filter_and_search(query, rag_item), "rag query")
+
 
+async def _filter_and_search(query: str, rag_item: RagData) -> JSONResponse:
+    """Lets the LLM turn the query into a filter and a semantic query, then searches the RAG item's collection."""
+    work = current_stream_work()
+    work.stage = "query filter"
     # ... (rest of the query analysis and Milvus search logic remains the same)
     llm = get_llm()
     prompt_template = '''...''' # Template remains the same
     prompt = prompt_template.format(user_query=query)
     try:
-        llm_response = await llm.ainvoke(prompt)
+        async with get_llm_dispatcher().slot("query filter"):
+            llm_response = await llm.ainvoke(prompt)
         response_content = llm_response.content if hasattr(llm_response, 'content') else llm_response
         if "```json" in response_content:
             response_content = response_content.split("```json")[1].split("```")[0].strip()
@@ -521,6 +531,7 @@ async def query_rag_system(
     filter_expr = ""
     if search_filter and search_filter.get("filename"):
         filter_expr = f"original_filename == '{search_filter['filename']}'"
+    work.stage = "searching"
     try:
         sanitized_rag_item_name = rag_item.name.lower().replace(" ", "_")
         collection_name = f"rag_{sanitized_rag_item_name}"
@@ -44,6 +44,7 @@ class Conversation(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     messages: List[ChatMessage] = []
+    message_count: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime # Import datetime
 from fastapi import UploadFile # Import UploadFile
 from enum import Enum
@@ -166,6 +166,13 @@ class UserRoleAssign(BaseModel):
 class FileEmbedRequest(BaseModel):
     file_ids: List[int]
 
+class FilePurgeRequest(BaseModel):
+    file_ids: Optional[List[int]] = None # None purges every file of the RAG item
+
+class FilePurgeResponse(BaseModel):
+    purged_file_ids: List[int]
+    failures: Dict[str, str] # store -> error; these deletions are retried in the background
+
 class AgentChatRequest(BaseModel):
     message: str
     display_thoughts: Optional[bool] = False
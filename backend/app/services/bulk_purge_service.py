@@ -0,0 +1,234 @@
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from pymilvus import Collection, utility
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.minio_client import run_minio
+from app.models.database import FileGist, RagData
+from app.modules.minio_module import delete_documents_from_minio
+from app.modules.mongodb_module import get_mongo_client
+from app.rag_knowledge.generic_knowledge import connect_to_milvus
+from app.services.presigned_url_service import get_presigned_url_service
+from app.utils.redis_utils import get_redis_client_from_pool
+
+logger = logging.getLogger(__name__)
+
+# Redis list of store deletions that failed and are replayed by retry_failed_purges().
+# Every entry is an idempotent delete, so replaying one that already happened is harmless.
+RETRY_LOG_KEY = "purge:retry_log"
+
+MILVUS_DELETE_BATCH_SIZE = 1000  # Keeps `filepath in [...]` expressions well below Milvus' expression size limit
+
+
+@dataclass
+class PurgeResult:
+    purged_file_ids: List[int] = field(default_factory=list)
+    # store -> error message, for deletions that were written to the retry log
+    failures: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def complete(self) -> bool:
+        return not self.failures
+
+
+def _store_names(rag_name: str):
+    dynamic_name = rag_name.lower().replace(" ", "_")
+    return f"rag_{dynamic_name}", f"rag_db_{dynamic_name}", f"documents_{dynamic_name}"
+
+
+def _batches(items: List[str], size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# --- Per-store batched deletes (blocking; run in threads) ---
+
+def remove_minio_objects(bucket_name: str, object_names: List[str]):
+    """Deletes objects in DeleteObjects batches and drops their cached download URLs."""
+    delete_documents_from_minio(object_names, bucket_name)
+    url_service = get_presigned_url_service()
+    for name in object_names:
+        url_service.invalidate(bucket_name, name)
+
+
+def _delete_milvus_entities(collection_name: str, filepaths: List[str]):
+    """Deletes the entities of many files with `filepath in [...]` expressions."""
+    if not filepaths or not utility.has_collection(collection_name):
+        return
+    collection = Collection(collection_name)
+    collection.load()
+    for batch in _batches(filepaths, MILVUS_DELETE_BATCH_SIZE):
+        # JSON string literals are valid Milvus string literals and take care of quoting
+        collection.delete(f"filepath in {json.dumps(batch, ensure_ascii=False)}")
+
+
+def _delete_mongo_documents(mongo_client, mongo_db_name: str, mongo_collection_name: str, filenames: List[str]):
+    if filenames:
+        mongo_client[mongo_db_name][mongo_collection_name].delete_many({"original_filename": {"$in": filenames}})
+
+
+def _find_intermediate_objects(mongo_client, mongo_db_name: str, mongo_collection_name: str, filenames: List[str]) -> List[str]:
+    """MinIO paths of the MinerU output stored for the given files."""
+    cursor = mongo_client[mongo_db_name][mongo_collection_name].find(
+        {"original_filename": {"$in": filenames}, "minio_object_path": {"$nin": [None, ""]}},
+        {"minio_object_path": 1},
+    )
+    return [doc["minio_object_path"] for doc in cursor]
+
+
+# --- Retry log ---
+
+def _log_for_retry(entry: dict):
+    redis_client = get_redis_client_from_pool()
+    try:
+        redis_client.rpush(RETRY_LOG_KEY, json.dumps({**entry, "attempts": entry.get("attempts", 0)}))
+    except Exception as e:
+        logger.critical(f"Could not write purge retry entry {entry}: {e}. Manual cleanup may be required.")
+
+
+def _replay(entry: dict, mongo_client=None):
+    store = entry["store"]
+    if store == "minio":
+        remove_minio_objects(entry["bucket"], entry["objects"])
+    elif store == "milvus":
+        _delete_milvus_entities(entry["collection"], entry["filepaths"])
+    elif store == "mongo":
+        _delete_mongo_documents(mongo_client, entry["db"], entry["collection"], entry["filenames"])
+    else:
+        raise ValueError(f"Unknown store '{store}' in purge retry log")
+
+
+async def _run_store_delete(entry: dict, result: PurgeResult, mongo_client=None):
+    """Runs one store's batched delete in a thread; on failure the delete goes to the retry log."""
+    try:
+        if entry["store"] == "minio":
+            await run_minio(_replay, entry)
+        else:
+            await asyncio.to_thread(_replay, entry, mongo_client)
+    except Exception as e:
+        logger.error(f"Bulk purge: {entry['store']} delete failed, queued for retry: {e}", exc_info=True)
+        result.failures[entry["store"]] = str(e)
+        _log_for_retry(entry)
+
+
+async def retry_failed_purges() -> int:
+    """
+    Replays deletions from the retry log. Entries that fail again go back to
+    the end of the log until PURGE_RETRY_MAX_ATTEMPTS is reached.
+    Returns the number of entries that succeeded.
+    """
+    redis_client = get_redis_client_from_pool()
+    pending = redis_client.llen(RETRY_LOG_KEY)
+    if not pending:
+        return 0
+
+    await connect_to_milvus()
+    mongo_client = None
+    succeeded = 0
+    try:
+        for _ in range(pending):
+            raw = redis_client.lpop(RETRY_LOG_KEY)
+            if raw is None:
+                break
+            entry = json.loads(raw)
+            if entry["store"] == "mongo" and mongo_client is None:
+                mongo_client = get_mongo_client()
+            try:
+                await asyncio.to_thread(_replay, entry, mongo_client)
+                succeeded += 1
+            except Exception as e:
+                entry["attempts"] += 1
+                if entry["attempts"] >= settings.PURGE_RETRY_MAX_ATTEMPTS:
+                    logger.critical(f"Giving up on purge retry after {entry['attempts']} attempts: {entry}. Last error: {e}")
+                else:
+                    logger.warning(f"Purge retry failed ({entry['attempts']}/{settings.PURGE_RETRY_MAX_ATTEMPTS}): {e}")
+                    redis_client.rpush(RETRY_LOG_KEY, json.dumps(entry))
+    finally:
+        if mongo_client:
+            mongo_client.close()
+    logger.info(f"Purge retry log: {succeeded} of {pending} entries replayed successfully.")
+    return succeeded
+
+
+# --- Bulk purge ---
+
+def _delete_rows(db: Session, ids: List[int]) -> None:
+    db.query(FileGist).filter(FileGist.id.in_(ids)).delete(synchronize_session=False)
+    db.commit()
+
+
+async def purge_files(db: Session, file_ids: Optional[List[int]] = None, rag_id: Optional[int] = None) -> PurgeResult:
+    """
+    Purges many files at once: the given `file_ids`, or every file of the RAG
+    item `rag_id` (the RAG item itself is kept).
+
+    Per RAG item this issues batched MinIO DeleteObjects requests (source and
+    MinerU output), `filepath in [...]` Milvus deletes, one Mongo delete_many
+    and one SQL DELETE ... WHERE id IN. The rows are deleted and committed
+    first; if that fails, nothing of the group has been purged yet and the
+    error is raised. The store deletes then run concurrently. A store that
+    fails does not block the others: its delete is written to the retry log, so
+    the files have already disappeared for users while the leftovers are
+    cleaned up later. No row ever points at purged data.
+    """
+    query = db.query(FileGist)
+    if file_ids is not None:
+        query = query.filter(FileGist.id.in_(file_ids))
+    if rag_id is not None:
+        query = query.filter(FileGist.rag_id == rag_id)
+    file_gists = query.all()
+
+    result = PurgeResult()
+    if not file_gists:
+        return result
+
+    by_rag: Dict[int, List[FileGist]] = defaultdict(list)
+    for file_gist in file_gists:
+        by_rag[file_gist.rag_id].append(file_gist)
+    rag_names = dict(db.query(RagData.id, RagData.name).filter(RagData.id.in_(list(by_rag))).all())
+
+    bucket_name = settings.MINIO_BUCKET_NAME
+    await connect_to_milvus()
+    mongo_client = get_mongo_client()
+    try:
+        for group_rag_id, group in by_rag.items():
+            ids = [f.id for f in group]
+            rag_name = rag_names.get(group_rag_id)
+            if rag_name is None:
+                logger.error(f"RAG item {group_rag_id} not found; removing {len(group)} orphaned file record(s) only.")
+                _delete_rows(db, ids)
+            else:
+                milvus_collection_name, mongo_db_name, mongo_collection_name = _store_names(rag_name)
+                filepaths = [f.filename for f in group]
+                basenames = [os.path.basename(f.filename) for f in group]
+                # Third-party sources live in the customer's bucket and are never deleted
+                source_objects = [f.filename for f in group if not f.is_third_party]
+
+                # The MinerU output paths must be read before the Mongo documents go away
+                intermediate_paths = await asyncio.to_thread(
+                    _find_intermediate_objects, mongo_client, mongo_db_name, mongo_collection_name, basenames)
+
+                # Rows first: a failure here leaves every store of the group untouched
+                _delete_rows(db, ids)
+
+                await asyncio.gather(
+                    _run_store_delete({"store": "minio", "bucket": bucket_name, "objects": intermediate_paths + source_objects}, result),
+                    _run_store_delete({"store": "milvus", "collection": milvus_collection_name, "filepaths": filepaths}, result),
+                    _run_store_delete({"store": "mongo", "db": mongo_db_name, "collection": mongo_collection_name, "filenames": basenames}, result, mongo_client),
+                )
+
+            result.purged_file_ids.extend(ids)
+            logger.info(f"Bulk purge removed {len(ids)} file(s) of RAG item {group_rag_id}.")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        mongo_client.close()
+    return result
@@ -1,31 +1,14 @@
-import os
-from datetime import datetime
-import os
 from datetime import datetime
 from typing import List, Dict, Any, Optional
-from pymongo import MongoClient
-from pymongo.server_api import ServerApi
 from bson.objectid import ObjectId # Import ObjectId for MongoDB document IDs
-from ..core.config import settings # Global import for configuration settings
+from app.core.mongo_client import get_chat_conversations_collection
 from app.schemas.chat_schemas import Attachment # Import the Attachment schema
 
-# Assuming MONGO_URI and MONGO_DB_NAME are available from environment variables
-MONGO_URI = settings.MONGO_URI
-MONGO_DB_NAME = settings.MONGO_DB_NAME # Use a dedicated DB for chat
+# All functions use the shared asynchronous client from app.core.mongo_client, so
+# MongoDB round trips no longer block the event loop.
 
-# Reuse the MongoDB client connection logic
-def get_mongo_client():
-    """Establishes and returns a MongoDB client connection."""
-    try:
-        # Use the ServerApi version 1
-        client = MongoClient(MONGO_URI, server_api=ServerApi('1'))
-        # Ping the admin database to confirm a successful connection
-        client.admin.command('ping')
-        print("Pinged your deployment. You successfully connected to MongoDB!")
-        return client
-    except Exception as e:
-        print(f"Failed to connect to MongoDB: {e}")
-        return None
+# Excludes the embedded message arrays when only conversation metadata is needed.
+WITHOUT_MESSAGES = {"messages": 0}
 
 # --- Data Structures (using Pydantic schemas for consistency) ---
 # We will use the Pydantic schemas defined in chat_schemas.py directly
@@ -35,11 +18,18 @@ def get_mongo_client():
 
 def get_conversations_collection():
     """Gets the MongoDB collection for chat conversations."""
-    client = get_mongo_client()
-    if client:
-        db = client[MONGO_DB_NAME]
-        return db["chat_conversations"] # Use a dedicated collection for conversations
-    return None
+    return get_chat_conversations_collection()
+
+def _stringify_ids(conv: Dict[str, Any]) -> Dict[str, Any]:
+    """Converts the ObjectIds of a conversation, its messages and their attachments to strings."""
+    conv['_id'] = str(conv['_id'])
+    for msg in conv.get('messages', []):
+        if '_id' in msg:
+            msg['_id'] = str(msg['_id'])
+        for att in msg.get('attachments', []):
+            if '_id' in att:
+                att['_id'] = str(att['_id'])
+    return conv
 
 async def create_conversation(user_id: str, title: str) -> Optional[Dict[str, Any]]:
     """Creates a new chat conversation for a user."""
@@ -57,95 +47,109 @@ async def create_conversation(user_id: str, title: str) -> Optional[Dict[str, An
     }
 
     try:
-        insert_result = collection.insert_one(conversation_data)
-        # Retrieve the inserted document to return the full conversation object
-        inserted_conversation = collection.find_one({"_id": insert_result.inserted_id})
-        if inserted_conversation:
-             # Convert ObjectId to string for the response
-             inserted_conversation['_id'] = str(inserted_conversation['_id'])
-             return inserted_conversation
-        return None
+        insert_result = await collection.insert_one(conversation_data)
+        conversation_data['_id'] = str(insert_result.inserted_id)
+        return conversation_data
     except Exception as e:
         print(f"Error creating conversation: {e}")
         return None
 
-async def get_conversations_by_user(user_id: str) -> List[Dict[str, Any]]:
-    """Retrieves all conversations for a given user."""
+async def get_conversations_by_user(user_id: str, skip: int = 0, limit: int = 0) -> List[Dict[str, Any]]:
+    """Retrieves a user's conversations, newest first, without their messages."""
     collection = get_conversations_collection()
     if collection is None:
         return []
 
     try:
-        # Find conversations for the user, sort by updated_at descending
-        conversations_data = list(collection.find({"user_id": user_id}).sort("updated_at", -1))
-        # Convert ObjectIds to strings for the response
-        for conv in conversations_data:
-            conv['_id'] = str(conv['_id'])
-            # Also convert message ObjectIds if needed, though typically messages are embedded
-            if 'messages' in conv:
-                 for msg in conv['messages']:
-                     if '_id' in msg:
-                         msg['_id'] = str(msg['_id'])
-                     if 'attachments' in msg:
-                         for att in msg['attachments']:
-                             if '_id' in att:
-                                 att['_id'] = str(att['_id'])
-
-        return conversations_data
+        cursor = collection.find({"user_id": user_id}, WITHOUT_MESSAGES).sort("updated_at", -1).skip(skip).limit(limit)
+        return [_stringify_ids(conv) async for conv in cursor]
     except Exception as e:
         print(f"Error retrieving conversations for user {user_id}: {e}")
         return []
 
-async def get_all_conversations() -> List[Dict[str, Any]]:
-    """Retrieves all chat conversations from the database."""
+async def get_conversation_summaries_by_user(user_id: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Retrieves title, timestamps and message count of a user's conversations,
+    without the messages. Returns None if MongoDB could not be queried.
+    """
+    collection = get_conversations_collection()
+    if collection is None:
+        return None
+
+    try:
+        cursor = await collection.aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$project": {
+                "user_id": 1, "title": 1, "created_at": 1, "updated_at": 1,
+                "message_count": {"$size": {"$ifNull": ["$messages", []]}},
+            }},
+        ])
+        return [_stringify_ids(conv) async for conv in cursor]
+    except Exception as e:
+        print(f"Error retrieving conversation summaries for user {user_id}: {e}")
+        return None
+
+async def get_all_conversations(skip: int = 0, limit: int = 0) -> List[Dict[str, Any]]:
+    """Retrieves chat conversations from the database, without their messages."""
     collection = get_conversations_collection()
     if collection is None:
         return []
 
     try:
-        conversations_data = list(collection.find({}))
-        # Convert ObjectIds to strings for consistency
-        for conv in conversations_data:
-            conv['_id'] = str(conv['_id'])
-            if 'messages' in conv:
-                for msg in conv['messages']:
-                    if '_id' in msg:
-                        msg['_id'] = str(msg['_id'])
-                    if 'attachments' in msg:
-                        for att in msg['attachments']:
-                            if '_id' in att:
-                                att['_id'] = str(att['_id'])
-        return conversations_data
+        cursor = collection.find({}, WITHOUT_MESSAGES).skip(skip).limit(limit)
+        return [_stringify_ids(conv) async for conv in cursor]
     except Exception as e:
         print(f"Error retrieving all conversations: {e}")
         return []
 
-async def get_conversation_by_id(conversation_id: str) -> Optional[Dict[str, Any]]:
-    """Retrieves a specific conversation by its ID."""
+async def get_conversation_by_id(conversation_id: str, include_messages: bool = True) -> Optional[Dict[str, Any]]:
+    """Retrieves a specific conversation by its ID, optionally without its messages."""
     collection = get_conversations_collection()
     if collection is None:
         return None
 
     try:
         # Find the conversation by its ObjectId
-        conversation_data = collection.find_one({"_id": ObjectId(conversation_id)})
+        conversation_data = await collection.find_one(
+            {"_id": ObjectId(conversation_id)}, None if include_messages else WITHOUT_MESSAGES)
         if conversation_data:
-            # Convert ObjectId to string for the response
-            conversation_data['_id'] = str(conversation_data['_id'])
-            if 'messages' in conversation_data:
-                 for msg in conversation_data['messages']:
-                     if '_id' in msg:
-                         msg['_id'] = str(msg['_id'])
-                     if 'attachments' in msg:
-                         for att in msg['attachments']:
-                             if '_id' in att:
-                                 att['_id'] = str(att['_id'])
-            return conversation_data
+            return _stringify_ids(conversation_data)
         return None
     except Exception as e:
         print(f"Error retrieving conversation {conversation_id}: {e}")
         return None
 
+async def get_conversation_messages(conversation_id: str, skip: int = 0, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Retrieves one page of a conversation's messages with a $slice projection,
+    so only that page is read and transferred. A negative `skip` counts from
+    the end (skip=-20 is the last 20 messages). Returns the conversation's
+    _id, user_id and the sliced "messages", or None if it does not exist.
+    """
+    collection = get_conversations_collection()
+    if collection is None:
+        return None
+
+    if skip < 0:
+        message_slice = [skip, limit or -skip]
+    elif limit:
+        message_slice = [skip, limit]
+    else:
+        message_slice = [skip, 2**31 - 1]  # $slice needs a positive count; this means "to the end"
+
+    try:
+        conversation_data = await collection.find_one(
+            {"_id": ObjectId(conversation_id)},
+            {"user_id": 1, "messages": {"$slice": message_slice}},
+        )
+        if conversation_data:
+            conversation_data.setdefault('messages', [])
+            return _stringify_ids(conversation_data)
+        return None
+    except Exception as e:
+        print(f"Error retrieving messages of conversation {conversation_id}: {e}")
+        return None
+
 async def add_message_to_conversation(
     conversation_id: str,
     sender: str,
@@ -173,7 +177,7 @@ async def add_message_to_conversation(
 
     try:
         # Push the new message to the messages array and update updated_at
-        update_result = collection.update_one(
+        update_result = await collection.update_one(
             {"_id": ObjectId(conversation_id)},
             {
                 "$push": {"messages": new_message_data},
@@ -194,7 +198,7 @@ async def delete_attachment_from_conversation(conversation_id: str, message_id:
 
     try:
         # Pull the attachment from the specific message's attachments array
-        update_result = collection.update_one(
+        update_result = await collection.update_one(
             {"_id": ObjectId(conversation_id), "messages._id": ObjectId(message_id)},
             {
                 "$pull": {"messages.$.attachments": {"_id": ObjectId(attachment_id)}},
@@ -215,7 +219,7 @@ async def delete_conversation(conversation_id: str) -> bool:
 
     try:
         # Delete the conversation document
-        delete_result = collection.delete_one({"_id": ObjectId(conversation_id)})
+        delete_result = await collection.delete_one({"_id": ObjectId(conversation_id)})
         print(f"Deleted conversation {conversation_id}. Deleted count: {delete_result.deleted_count}")
         if delete_result.deleted_count == 0:
              # Conversation not found or not deleted
@@ -226,6 +230,18 @@ async def delete_conversation(conversation_id: str) -> bool:
         print(f"Error deleting conversation {conversation_id}: {e}")
         raise # Re-raise the exception to be caught by the router
 
+async def delete_conversations(conversation_ids: List[str]) -> int:
+    """Deletes many conversations with one delete_many. Returns the number deleted."""
+    collection = get_conversations_collection()
+    if collection is None:
+        return 0
+
+    object_ids = [ObjectId(conversation_id) for conversation_id in conversation_ids if ObjectId.is_valid(conversation_id)]
+    if not object_ids:
+        return 0
+    delete_result = await collection.delete_many({"_id": {"$in": object_ids}})
+    return delete_result.deleted_count
+
 # TODO: Add functions for file size and count limits enforcement,
 # potentially during the add_message_to_conversation or a separate validation step.
 # This might be better handled on the frontend initially for user feedback,
@@ -238,7 +254,7 @@ async def update_conversation_title(conversation_id: str, new_title: str) -> boo
         return False
 
     try:
-        update_result = collection.update_one(
+        update_result = await collection.update_one(
             {"_id": ObjectId(conversation_id)},
             {
                 "$set": {
@@ -71,23 +71,22 @@ class ChatLifecycleService:
                             att['download_url'] = f"/chat/conversations/{conversation_id}/messages/{msg_id}/attachments/{att_id}/download/"
         return conv
 
-    async def get_all_user_conversations(self, current_user: User) -> List[Dict[str, Any]]:
-        """Gets all conversations for a user, hydrating with Redis data if available."""
-        user_id_str = str(current_user.id)
+    async def get_all_user_conversations(self, current_user: User, skip: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Gets a page of the user's conversations, most recently active first,
+        from the Redis conversation index. Messages are not included; they are
+        loaded with get_messages when a conversation is opened.
+        """
         user_id_int = current_user.id
-        
-        conversations_from_db = await chat_data_service.get_conversations_by_user(user_id_str)
 
-        for conv in conversations_from_db:
-            conversation_id = conv['_id']
-            redis_state = self.conversation_service.get_conversation_state(user_id_int, conversation_id)
-            
-            if redis_state and 'history' in redis_state:
-                conv['messages'] = redis_state['history']
-            
-            self._format_timestamps_and_urls(conv)
+        if not self.conversation_service.is_user_indexed(user_id_int):
+            # First listing since the index was introduced: add the conversations stored in MongoDB
+            summaries = await chat_data_service.get_conversation_summaries_by_user(str(user_id_int))
+            if summaries is None:
+                raise HTTPException(status_code=503, detail="Conversations are temporarily unavailable")
+            self.conversation_service.index_user_conversations(user_id_int, summaries)
 
-        return conversations_from_db
+        return self.conversation_service.list_conversation_summaries(user_id_int, skip, limit)
 
     async def create_conversation(self, title: str, current_user: User) -> Dict[str, Any]:
         """Creates a new conversation and initializes its state in Redis."""
@@ -101,16 +100,31 @@ class ChatLifecycleService:
         initial_state = {
             "history": [], "context": {}, "variables": {}, "attached_files": []
         }
+        self.conversation_service.index_conversation(user_id_int, str(conversation['_id']), title, conversation.get('created_at'))
         self.conversation_service.save_conversation_state(user_id_int, str(conversation['_id']), initial_state)
         logger.info(f"Initial conversation state for {conversation['_id']} saved to Redis.")
 
         conversation['messages'] = []
         return self._format_timestamps_and_urls(conversation)
 
-    async def get_messages(self, conversation_id: str, current_user: User) -> List[Dict[str, Any]]:
-        """Gets messages for a specific conversation."""
-        conversation_state = await self._get_conversation_state_or_load_from_db(str(current_user.id), conversation_id)
-        messages_data = conversation_state.get("history", [])
+    async def get_messages(self, conversation_id: str, current_user: User, skip: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Gets messages for a specific conversation, or one page of them with
+        `skip`/`limit`. A page missing from Redis is read from MongoDB with a
+        $slice projection and not cached.
+        """
+        if skip or limit:
+            messages_data = self.conversation_service.get_message_page(current_user.id, conversation_id, skip, limit)
+            if messages_data is None:
+                conversation_from_db = await chat_data_service.get_conversation_messages(conversation_id, skip, limit)
+                if not conversation_from_db:
+                    raise HTTPException(status_code=404, detail="Conversation not found")
+                if conversation_from_db['user_id'] != str(current_user.id):
+                    raise HTTPException(status_code=403, detail="Not authorized to access this conversation")
+                messages_data = conversation_from_db['messages']
+        else:
+            conversation_state = await self._get_conversation_state_or_load_from_db(str(current_user.id), conversation_id)
+            messages_data = conversation_state.get("history", [])
         
         # Create a temporary conversation dict to reuse the formatting function
         temp_conv_for_formatting = {'_id': conversation_id, 'messages': messages_data}
@@ -169,7 +183,7 @@ class ChatLifecycleService:
         user_id_int = current_user.id
 
         # Verify ownership from DB first
-        conversation_db = await chat_data_service.get_conversation_by_id(conversation_id)
+        conversation_db = await chat_data_service.get_conversation_by_id(conversation_id, include_messages=False)
         if not conversation_db:
             raise HTTPException(status_code=404, detail="Conversation not found")
         if conversation_db['user_id'] != user_id_str:
@@ -202,7 +216,7 @@ class ChatLifecycleService:
         user_id_str = str(current_user.id)
         
         # Verify ownership
-        conversation = await chat_data_service.get_conversation_by_id(conversation_id)
+        conversation = await chat_data_service.get_conversation_by_id(conversation_id, include_messages=False)
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
         if conversation['user_id'] != user_id_str:
@@ -211,6 +225,7 @@ class ChatLifecycleService:
         success = await chat_data_service.update_conversation_title(conversation_id, new_title)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to update conversation title")
+        self.conversation_service.set_conversation_title(current_user.id, conversation_id, new_title)
 
-        updated_conversation = await chat_data_service.get_conversation_by_id(conversation_id)
+        updated_conversation = await chat_data_service.get_conversation_by_id(conversation_id, include_messages=False)
         return self._format_timestamps_and_urls(updated_conversation)
\ No newline at end of file
@@ -10,9 +10,8 @@ import asyncio
 import tempfile
 import traceback
 import re
-from typing import Dict, Any, AsyncGenerator, List
+from typing import Dict, Any, AsyncGenerator, List, Tuple
 from datetime import datetime
-import tiktoken
 
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
@@ -21,13 +20,18 @@ from app.models.database import User, RagData
 from app.schemas import chat_schemas
 from app.services import chat_data_service, ollama_service
 from app.services.conversation_service import ConversationService
+from app.services import extraction_cache
+from app.services.extraction_cache import content_hash, get_extraction_cache
+from app.services import prompt_builder
+from app.services.prompt_builder import PromptBuild, PromptBuilder, count_tokens, message_token_count
 from app.rag_knowledge.generic_knowledge import query_rag_system
 from app.tools.search_online_tools import duckduckgosearch
 from app.tools.document_processor import summarize_long_text
-from app.tools.deal_document import extract_text_from_file_content
+from app.tools.deal_document import extract_text_from_file_content, extraction_depends_on_question, is_extraction_failure
 from app.services.rag_permission_service import RagPermissionService
 from app.core.config import settings
 from app.modules.minio_module import get_document_from_minio, get_document_bytes_from_minio
+from app.utils.stream_cancellation import current_stream_work
 
 logger = logging.getLogger(__name__)
 
@@ -51,7 +55,7 @@ class ChatResponseService:
         gathers context, and streams the final LLM answer.
         """
         # 1. Get or initialize conversation state
-        conversation_state = self._get_or_initialize_conversation_state(current_user, conversation_id)
+        conversation_state = await self._get_or_initialize_conversation_state(current_user, conversation_id)
 
         # 2. Add user message to state
         self._add_user_message_to_state(conversation_state, message_create, current_user, conversation_id)
@@ -59,11 +63,14 @@ class ChatResponseService:
         # 3. Stream the response generation process
         return self._master_stream_generator(conversation_id, message_create, current_user, conversation_state)
 
-    def _get_or_initialize_conversation_state(self, current_user: User, conversation_id: str) -> Dict[str, Any]:
+    async def _get_or_initialize_conversation_state(self, current_user: User, conversation_id: str) -> Dict[str, Any]:
         """Gets conversation state from Redis or initializes it from DB."""
-        conversation_state = self.conversation_service.get_conversation_state(current_user.id, conversation_id)
+        # Only the recent history is needed for the prompt
+        conversation_state = self.conversation_service.get_conversation_state(
+            current_user.id, conversation_id, last_n=settings.CONVERSATION_PROMPT_HISTORY_MESSAGES
+        )
         if not conversation_state:
-            conversation_from_db = asyncio.run(chat_data_service.get_conversation_by_id(conversation_id))
+            conversation_from_db = await chat_data_service.get_conversation_by_id(conversation_id)
             if not conversation_from_db:
                 raise HTTPException(status_code=404, detail="Conversation not found")
             if conversation_from_db['user_id'] != str(current_user.id):
@@ -81,17 +88,18 @@ class ChatResponseService:
         user_message_entry = {
             "sender": "user",
             "content": message.content,
+            "token_count": count_tokens(message.content),
             "attachments": [att.model_dump() for att in message.attachments] if message.attachments else [],
             "timestamp": datetime.now().isoformat(),
             "_id": str(uuid.uuid4())
         }
         state["history"].append(user_message_entry)
-        
+        self.conversation_service.append_message(user.id, conv_id, user_message_entry)
+
         if message.attachments:
-            for att in message.attachments:
-                state["attached_files"].append(att.model_dump())
-        
-        self.conversation_service.save_conversation_state(user.id, conv_id, state)
+            attached_files = [att.model_dump() for att in message.attachments]
+            state.setdefault("attached_files", []).extend(attached_files)
+            self.conversation_service.add_attached_files(user.id, conv_id, attached_files)
 
     async def _master_stream_generator(
         self,
@@ -100,9 +108,45 @@ class ChatResponseService:
         current_user: User,
         conversation_state: Dict[str, Any]
     ) -> AsyncGenerator[Dict[str, Any], None]:
-        """Orchestrates the entire response generation process as a stream."""
+        """
+        Orchestrates the entire response generation process as a stream.
+
+        If the stream is cancelled (its client disconnected), the searches it
+        started are cancelled as well and the bot message keeps the part of
+        the answer generated so far instead of staying in the loading state.
+        """
         bot_message_id = str(uuid.uuid4())
         self._add_loading_message_to_state(current_user.id, conversation_id, bot_message_id)
+
+        work = current_stream_work()
+        tasks: List[asyncio.Task] = []
+        partial_answer = ""
+        finished = False
+        try:
+            async for chunk in self._generate_stream(conversation_id, message_create, current_user, conversation_state, bot_message_id, tasks):
+                if chunk.get("event") == "text":
+                    partial_answer += chunk["data"]
+                yield chunk
+            finished = True
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                    work.searches_cancelled += 1
+            if not finished:
+                self._save_final_bot_message(current_user.id, conversation_id, bot_message_id, partial_answer, [])
+
+    async def _generate_stream(
+        self,
+        conversation_id: str,
+        message_create: chat_schemas.MessageCreate,
+        current_user: User,
+        conversation_state: Dict[str, Any],
+        bot_message_id: str,
+        tasks: List[asyncio.Task],
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Gathers the context and streams the answer; search tasks are added to `tasks`."""
+        work = current_stream_work()
         if message_create.show_think_process:
             yield {"event": "thought", "data": "Thinking..."}
 
@@ -111,7 +155,7 @@ class ChatResponseService:
         online_context, online_sources = "", []
         attachment_context = ""
 
-        tasks = []
+        work.stage = "searching"
         if message_create.search_rosti_active:
             yield {"event": "thought", "data": "\n- Searching Rosti Data..."}
             # Create a cleaned version of the query for RAG search
@@ -122,9 +166,12 @@ class ChatResponseService:
             yield {"event": "thought", "data": "\n- Searching online..."}
             tasks.append(asyncio.create_task(self._run_online_search_task(message_create.content)))
 
+        work.searches_started = len(tasks)
+
         if message_create.attachments:
+            work.stage = "attachments"
             yield {"event": "thought", "data": "\n- Processing attachments..."}
-            async for chunk in self._process_attachments_stream(message_create, message_create.show_think_process):
+            async for chunk in self._process_attachments_stream(message_create, message_create.show_think_process, current_user.id, conversation_id):
                 # Check for the internal event to capture the final content
                 if chunk.get("event") == "internal_content":
                     attachment_context = chunk["data"]
@@ -134,6 +181,7 @@ class ChatResponseService:
 
         # Await concurrent search tasks
         if tasks:
+            work.stage = "searching"
             yield {"event": "thought", "data": "\n\nGathering all information..."}
             results = await asyncio.gather(*tasks)
             # Unpack results based on which tasks were run
@@ -153,10 +201,6 @@ class ChatResponseService:
         logger.info(f"attachment_context preview: {attachment_context[:300] if attachment_context else 'Empty'}...")
         logger.info(f"=== END CONTEXT DEBUG ===")
         
-        search_results_context = f"\n\nRelevant Rosti Data:\n{rag_context}" if rag_context else ""
-        search_results_context += online_context
-        search_results_context += attachment_context
-        
         source_documents = self._deduplicate_sources(rag_sources + online_sources)
 
         # --- Dual-mode prompt logic ---
@@ -171,14 +215,25 @@ class ChatResponseService:
 
         # If RAG or Online Search is active, use the structured prompt
         if message_create.search_rosti_active or message_create.search_online_active or message_create.attachments:
-            system_prompt = self._construct_rag_system_prompt(final_user_query_for_llm, search_results_context, conversation_state, message_create)
+            system_prompt, prompt_build = self._construct_rag_system_prompt(
+                final_user_query_for_llm, rag_context, online_context, attachment_context, conversation_state, message_create
+            )
             llm_messages = [{'role': 'system', 'content': system_prompt}, {'role': 'user', 'content': final_user_query_for_llm}]
         else:
             # "Direct Chat" mode: just use the history and a simple system message
             # Restore history and use a simple prompt. Temperature will be added later.
-            history_messages = self._get_token_limited_history(conversation_state, settings.MAX_CONTEXT_TOKENS)
             system_prompt_content = DIRECT_CHAT_SYSTEM_PROMPT
+            builder = PromptBuilder(settings.MAX_CONTEXT_TOKENS)
+            builder.add("system", [system_prompt_content, final_user_query_for_llm], 0, prompt_builder.REQUIRED,
+                        overhead_tokens=prompt_builder.MESSAGE_OVERHEAD_TOKENS)
+            history = self._add_history_section(builder, conversation_state, 1)
+            prompt_build = builder.build()
+            history_messages = [
+                {"role": msg.get("sender", "user"), "content": msg.get("content", "")}
+                for msg in reversed(history[:len(prompt_build.selected["history"])])
+            ]
             llm_messages = [{"role": "system", "content": system_prompt_content}] + history_messages + [{'role': 'user', 'content': final_user_query_for_llm}]
+        logger.info(f"Prompt for conversation {conversation_id}: {prompt_build.describe()}")
 
         full_bot_response_content = ""
         try:
@@ -194,12 +249,14 @@ class ChatResponseService:
                 "presence_penalty": 0.0,
                 "frequency_penalty": 0.0,
             }
+            work.stage = "generating"
             async for chunk in ollama_service.get_chat_response_stream(
                 llm_messages,
                 show_think_process=message_create.show_think_process,
                 options=llm_options
             ):
                 full_bot_response_content += chunk
+                work.llm_chunks += 1
                 yield {"event": "text", "data": chunk}
 
             logger.debug(f"--- DEBUG: Final source_documents to be yielded: {source_documents}")
@@ -214,13 +271,11 @@ class ChatResponseService:
 
     def _add_loading_message_to_state(self, user_id: int, conv_id: str, bot_message_id: str):
         """Adds a temporary 'bot is typing' message to Redis."""
-        state = self.conversation_service.get_conversation_state(user_id, conv_id)
         loading_message = {
             "_id": bot_message_id, "sender": "bot", "content": "", "loading": True,
             "attachments": [], "source_documents": [], "timestamp": datetime.now().isoformat()
         }
-        state["history"].append(loading_message)
-        self.conversation_service.save_conversation_state(user_id, conv_id, state)
+        self.conversation_service.append_message(user_id, conv_id, loading_message)
 
     async def _run_rag_search_task(self, query_text: str, current_user: User, show_think_process: bool):
         """Performs RAG search using a cleaned query."""
@@ -260,51 +315,105 @@ class ChatResponseService:
             logger.error(f"Error during Online search: {e}")
             return f"\n\nError during Online search: {e}", []
 
-    async def _process_attachments_stream(self, message_create: chat_schemas.MessageCreate, show_think_process: bool):
+    async def _process_attachments_stream(self, message_create: chat_schemas.MessageCreate, show_think_process: bool, user_id: int, conversation_id: str):
         """
         Processes multiple file attachments using the unified document processing service,
         and streams summarization if needed.
+
+        Up to CHAT_ATTACHMENT_CONCURRENCY attachments are downloaded and extracted at
+        once; their progress events are streamed as they happen and their contents are
+        combined in the order they were attached. Extractions are cached per conversation,
+        so a file attached in an earlier turn is not processed again, and in the shared
+        extraction cache by content hash, so neither is a file someone else already
+        attached. The summary of the combined content is cached the same way.
         """
         if not message_create.attachments:
             return
 
-        full_extracted_content = []
-        total_attachments = len(message_create.attachments)
+        attachments = message_create.attachments
+        total_attachments = len(attachments)
+        work = current_stream_work()
+        work.attachments_total = total_attachments
 
-        for i, att in enumerate(message_create.attachments):
+        # Images are described with respect to the question, so only other files are cached
+        refs = {i: f"{att.bucket_name}/{att.object_name}" for i, att in enumerate(attachments)
+                if not extraction_depends_on_question(att.filename)}
+        cached = self.conversation_service.get_cached_extractions(user_id, conversation_id, list(refs.values()))
+
+        shared_cache = get_extraction_cache()
+        full_extracted_content = [""] * total_attachments
+        events: asyncio.Queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(settings.CHAT_ATTACHMENT_CONCURRENCY)
+
+        async def process(i: int, att):
+            ref = refs.get(i)
             try:
-                if show_think_process:
-                    yield {"event": "thought", "data": f"\n- Processing attachment {i+1}/{total_attachments}: {att.filename}..."}
-                
-                # Get file bytes directly from MinIO
-                file_bytes = await get_document_bytes_from_minio(att.object_name, att.bucket_name)
-                
-                # Use the unified document processing service, passing the user's query for context (especially for images)
-                content = await extract_text_from_file_content(
-                    file_bytes,
-                    att.filename,
-                    question=message_create.content
-                )
-                
+                if ref in cached:
+                    content = cached[ref]
+                    if show_think_process:
+                        events.put_nowait({"event": "thought", "data": f"\n- Reusing extracted content of attachment {i+1}/{total_attachments}: {att.filename}"})
+                else:
+                    async with semaphore:
+                        if show_think_process:
+                            events.put_nowait({"event": "thought", "data": f"\n- Processing attachment {i+1}/{total_attachments}: {att.filename}..."})
+
+                        # Get file bytes directly from MinIO
+                        file_bytes = await get_document_bytes_from_minio(att.object_name, att.bucket_name)
+
+                        # Images are described in answer to the question, other files extract the same for everyone
+                        kind, question = (extraction_cache.TEXT, None) if ref else (extraction_cache.ANSWER, message_create.content)
+                        digest = await asyncio.to_thread(content_hash, file_bytes)
+                        content = await shared_cache.get(kind, digest, question)
+                        if content is not None:
+                            if show_think_process:
+                                events.put_nowait({"event": "thought", "data": f"\n- Reusing the cached extraction of {att.filename}"})
+                        else:
+                            # Use the unified document processing service, passing the user's query for context (especially for images)
+                            content = await extract_text_from_file_content(
+                                file_bytes,
+                                att.filename,
+                                question=message_create.content
+                            )
+                            if not is_extraction_failure(content):
+                                await shared_cache.put(kind, digest, content, question)
+                    if ref and not is_extraction_failure(content):
+                        self.conversation_service.cache_extraction(user_id, conversation_id, ref, content)
+
                 # DEBUG: Log the extracted content details
                 logger.info(f"=== ATTACHMENT DEBUG: {att.filename} ===")
                 logger.info(f"Content type: {type(content)}")
                 logger.info(f"Content length: {len(content) if content else 0}")
                 logger.info(f"Content preview: {content[:200] if content else 'None'}...")
                 logger.info(f"=== END ATTACHMENT DEBUG ===")
-                
+
                 if content:
-                    full_extracted_content.append(f"\n\n--- Content from attachment: {att.filename} ---\n{content}")
+                    full_extracted_content[i] = f"\n\n--- Content from attachment: {att.filename} ---\n{content}"
                 else:
                     logger.warning(f"No content extracted from attachment: {att.filename}")
-                    full_extracted_content.append(f"\n\n--- Content from attachment: {att.filename} ---\n[No content could be extracted from this file]")
+                    full_extracted_content[i] = f"\n\n--- Content from attachment: {att.filename} ---\n[No content could be extracted from this file]"
 
             except Exception as e:
                 error_message = f"\n\nError processing attachment '{att.filename}': {e}"
                 logger.error(f"Error processing attachment {att.object_name}: {e}", exc_info=True)
-                full_extracted_content.append(error_message)
+                full_extracted_content[i] = error_message
                 if show_think_process:
-                    yield {"event": "thought", "data": f"\n- Failed to process {att.filename}."}
+                    events.put_nowait({"event": "thought", "data": f"\n- Failed to process {att.filename}."})
+            work.attachments_done += 1
+            events.put_nowait(None)  # This attachment is done
+
+        tasks = [asyncio.create_task(process(i, att)) for i, att in enumerate(attachments)]
+        try:
+            finished = 0
+            while finished < total_attachments:
+                event = await events.get()
+                if event is None:
+                    finished += 1
+                else:
+                    yield event
+        finally:
+            # Only left running if the stream was cancelled
+            for task in tasks:
+                task.cancel()
 
         # Combine content from all attachments
         combined_content = "\n".join(full_extracted_content)
@@ -322,6 +431,17 @@ class ChatResponseService:
         
         # Summarize if the combined content is too long AND it's not a translation task
         if len(combined_content) > settings.LONG_TEXT_THRESHOLD and not is_translation_task:
+            work.stage = "summarizing attachments"
+            # The model used for summarizing depends on show_think_process
+            summary_kind = f"{extraction_cache.SUMMARY}:{'cot' if show_think_process else 'chat'}"
+            summary_digest = await asyncio.to_thread(content_hash, combined_content)
+            cached_summary = await shared_cache.get(summary_kind, summary_digest)
+            if cached_summary is not None:
+                if show_think_process:
+                    yield {"event": "thought", "data": "\n- Reusing the cached summary of these attachments.\n"}
+                yield {"event": "internal_content", "data": cached_summary}
+                return
+
             if show_think_process:
                 yield {"event": "thought", "data": "\n- Combined content is long, starting summarization...\n"}
             
@@ -352,6 +472,7 @@ class ChatResponseService:
                     if chunk_count % 3 == 0:  # Every 3rd chunk
                         yield {"event": "progress", "data": f"Summarizing document... ({chunk_count} sections processed)"}
             
+            await shared_cache.put(summary_kind, summary_digest, final_summary)
             yield {"event": "internal_content", "data": final_summary}
         else:
             # For translation tasks or short content, use original content
@@ -364,40 +485,33 @@ class ChatResponseService:
         """Removes command-like arguments (e.g., /nothink) from the query."""
         return re.sub(r'\s*/\w+', '', query).strip()
 
-    def _get_token_limited_history(self, state: Dict, max_tokens: int) -> List[Dict[str, str]]:
+    def _add_history_section(self, builder: PromptBuilder, state: Dict, priority: int) -> List[Dict]:
         """
-        Truncates conversation history to fit within a specified token limit.
+        Adds the conversation history (without the latest user message) to `builder`,
+        newest first, using the token counts stored with the messages.
+        Returns the messages in that order; the build keeps a prefix of them.
         """
-        try:
-            encoding = tiktoken.get_encoding("cl100k_base")
-        except Exception:
-            encoding = None
-
-        history_for_prompt = []
-        current_history_tokens = 0
-        
-        # Iterate backwards through history (from newest to oldest)
-        for msg in reversed(state["history"][:-1]): # Exclude the latest user message
-            # Ensure message format is correct for passing to LLM
-            formatted_msg = {"role": msg.get("sender", "user"), "content": msg.get("content", "")}
-            
-            msg_tokens = len(encoding.encode(formatted_msg["content"])) if encoding else len(formatted_msg["content"]) / 3
-            
-            if current_history_tokens + msg_tokens <= max_tokens:
-                current_history_tokens += msg_tokens
-                history_for_prompt.insert(0, formatted_msg)
-            else:
-                break
-        
-        return history_for_prompt
-
-    def _construct_rag_system_prompt(self, latest_user_query: str, context: str, state: Dict, message_create: chat_schemas.MessageCreate) -> str:
-        """Builds the structured system prompt for RAG or Online Search modes."""
-        
-        fixed_context_tokens = len(latest_user_query + context) / 3
-        history_token_budget = settings.MAX_CONTEXT_TOKENS - fixed_context_tokens - 1000
-        history_messages = self._get_token_limited_history(state, history_token_budget)
-        history_context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in history_messages])
+        history = list(reversed(state["history"][:-1]))
+        builder.add(
+            "history",
+            [f"{msg.get('sender', 'user')}: {msg.get('content', '')}" for msg in history],
+            priority,
+            prompt_builder.STOP,
+            token_counts=[message_token_count(msg) for msg in history],
+            overhead_tokens=prompt_builder.MESSAGE_OVERHEAD_TOKENS,
+        )
+        return history
+
+    def _construct_rag_system_prompt(self, latest_user_query: str, rag_context: str, online_context: str, attachment_context: str,
+                                     state: Dict, message_create: chat_schemas.MessageCreate) -> Tuple[str, PromptBuild]:
+        """
+        Builds the structured system prompt for RAG or Online Search modes.
+        The prompt is filled up to MAX_CONTEXT_TOKENS in this order: instructions and
+        question, retrieved data, attachments, then as much recent history as fits.
+        """
+        retrieved = [f"\n\nRelevant Rosti Data:\n{rag_context}" if rag_context else "", online_context]
+        retrieved = [part for part in retrieved if part]
+        attachments = [attachment_context] if attachment_context else []
 
         # --- Dynamically build instructions based on context and settings ---
         instructions = [
@@ -406,7 +520,9 @@ class ChatResponseService:
             "4. Provide a comprehensive, relevant, and well-formatted Markdown response."
         ]
 
-        context_is_empty = not context.strip() or "No real-time information was searched for or found" in context
+        context_parts = retrieved + attachments
+        context_is_empty = (not any(part.strip() for part in context_parts)
+                            or any("No real-time information was searched for or found" in part for part in context_parts))
         is_rag_search_mode = message_create.search_rosti_active or message_create.search_online_active or message_create.attachments
 
         if is_rag_search_mode:
@@ -433,6 +549,22 @@ class ChatResponseService:
         instructions_str = "\n            ".join(instructions)
         # --- End of dynamic instructions ---
 
+        builder = PromptBuilder(settings.MAX_CONTEXT_TOKENS)
+        # The question is also sent as the user message.
+        fixed_prompt = self._render_rag_system_prompt(latest_user_query, "", "", instructions_str)
+        builder.add("system", [fixed_prompt, latest_user_query], 0, prompt_builder.REQUIRED,
+                    overhead_tokens=prompt_builder.MESSAGE_OVERHEAD_TOKENS)
+        builder.add("retrieved", retrieved, 1, prompt_builder.TRUNCATE)
+        builder.add("attachments", attachments, 2, prompt_builder.TRUNCATE)
+        history = self._add_history_section(builder, state, 3)
+        build = builder.build()
+
+        context = "".join(build.selected["retrieved"] + build.selected["attachments"])
+        history_messages = reversed(history[:len(build.selected["history"])])
+        history_context = "\n".join([f"{msg.get('sender', 'user')}: {msg.get('content', '')}" for msg in history_messages])
+        return self._render_rag_system_prompt(latest_user_query, context, history_context, instructions_str), build
+
+    def _render_rag_system_prompt(self, latest_user_query: str, context: str, history_context: str, instructions_str: str) -> str:
         return f"""You are an expert AI assistant. Your primary goal is to answer the user's LATEST QUESTION directly and accurately.
 
             **LATEST QUESTION:**
@@ -466,13 +598,11 @@ class ChatResponseService:
 
     def _save_final_bot_message(self, user_id: int, conv_id: str, msg_id: str, content: str, sources: list):
         """Updates the bot's message in Redis with the final content."""
-        final_state = self.conversation_service.get_conversation_state(user_id, conv_id)
-        message_to_update = next((msg for msg in final_state["history"] if msg.get("_id") == msg_id), None)
-        if message_to_update:
-            message_to_update["content"] = content
-            message_to_update["loading"] = False
-            message_to_update["source_documents"] = sources
-            self.conversation_service.save_conversation_state(user_id, conv_id, final_state)
+        updated = self.conversation_service.update_message(
+            user_id, conv_id, msg_id,
+            {"content": content, "token_count": count_tokens(content), "loading": False, "source_documents": sources}
+        )
+        if updated:
             logger.info(f"Final bot response saved to Redis for conversation {conv_id}")
         else:
             logger.error(f"Could not find message {msg_id} to update after final response.")
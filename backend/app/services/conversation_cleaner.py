@@ -1,17 +1,149 @@
-import os
-from datetime import datetime, timedelta
+import asyncio
+import json
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
 import logging
+from typing import List
 from ..core.config import settings
+from app.core.minio_client import run_minio
 from app.services import chat_data_service
-from app.modules.minio_module import delete_document_from_minio
-from minio.error import S3Error
+from app.services.conversation_service import ACTIVITY_INDEX_KEY, ATTACHMENT_INDEX_KEY, BLOB_KEY, USER_INDEX_KEY, activity_member, attachment_refs, conversation_keys
+from app.modules.minio_module import delete_documents_from_minio
+from app.utils.redis_utils import get_redis_client_from_pool
 
 logger = logging.getLogger(__name__)
 
+BACKFILL_DONE_KEY = "conversations:last_activity:backfilled"
+
+
+async def _backfill_activity_index(redis_client):
+    """
+    One-time population of the activity index for conversations created before it
+    existed: Redis states are scored by their remaining TTL (last save = now -
+    (TTL - remaining)), MongoDB-only conversations by updated_at. ZADD NX keeps
+    any score already written by real activity.
+    """
+    now = time.time()
+    ttl_seconds = settings.REMOVE_OLD_CONVERSATIONS_AFTER_DAYS * 24 * 60 * 60
+    indexed = await asyncio.to_thread(_backfill_from_redis, redis_client, now, ttl_seconds)
+
+    collection = chat_data_service.get_conversations_collection()
+    if collection is not None:
+        scores = {}
+        cursor = collection.find({}, {"user_id": 1, "updated_at": 1, "created_at": 1}).batch_size(1000)
+        async for conv in cursor:
+            last_activity = conv.get("updated_at") or conv.get("created_at")
+            if last_activity and last_activity.tzinfo is None:
+                last_activity = last_activity.replace(tzinfo=timezone.utc) # Stored with datetime.utcnow()
+            scores[activity_member(conv.get("user_id", ""), str(conv["_id"]))] = last_activity.timestamp() if last_activity else 0
+            if len(scores) >= 1000:
+                redis_client.zadd(ACTIVITY_INDEX_KEY, scores, nx=True)
+                indexed += len(scores)
+                scores = {}
+        if scores:
+            redis_client.zadd(ACTIVITY_INDEX_KEY, scores, nx=True)
+            indexed += len(scores)
+
+    redis_client.set(BACKFILL_DONE_KEY, datetime.utcnow().isoformat())
+    logger.info(f"Backfilled the conversation activity index with {indexed} entries.")
+
+
+def _backfill_from_redis(redis_client, now: float, ttl_seconds: int) -> int:
+    """Scans the conversation states stored as blobs. Blocking."""
+    indexed = 0
+    keys = []
+    for key in redis_client.scan_iter(match="conversation:*", count=1000):
+        keys.append(key)
+        if len(keys) >= 1000:
+            indexed += _backfill_states(redis_client, keys, now, ttl_seconds)
+            keys = []
+    if keys:
+        indexed += _backfill_states(redis_client, keys, now, ttl_seconds)
+    return indexed
+
+
+def _backfill_states(redis_client, keys: List[str], now: float, ttl_seconds: int) -> int:
+    pipe = redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.ttl(key)
+        pipe.get(key)
+    results = pipe.execute()
+
+    scores = {}
+    pipe = redis_client.pipeline(transaction=False)
+    for key, remaining, raw_state in zip(keys, results[0::2], results[1::2]):
+        _, user_id, conversation_id = key.split(":", 2)
+        member = activity_member(user_id, conversation_id)
+        scores[member] = now - max(ttl_seconds - remaining, 0) if remaining and remaining > 0 else now
+        try:
+            refs = attachment_refs(json.loads(raw_state)) if raw_state else []
+        except (ValueError, TypeError):
+            refs = []
+        if refs:
+            pipe.sadd(ATTACHMENT_INDEX_KEY.format(user_id=user_id, conversation_id=conversation_id), *refs)
+    if scores:
+        pipe.zadd(ACTIVITY_INDEX_KEY, scores, nx=True)
+    pipe.execute()
+    return len(scores)
+
+
+async def _delete_expired_page(redis_client, members: List[str]) -> bool:
+    """
+    Deletes one page of expired conversations: attachments with batched MinIO
+    deletes, MongoDB records with one delete_many, and Redis keys and index
+    entries in one pipeline. Returns False if the attachments could not be
+    removed; the page then stays in the index for the next run.
+    """
+    pairs = [member.split(":", 1) for member in members]
+
+    pipe = redis_client.pipeline(transaction=False)
+    for user_id, conversation_id in pairs:
+        pipe.smembers(ATTACHMENT_INDEX_KEY.format(user_id=user_id, conversation_id=conversation_id))
+        pipe.get(BLOB_KEY.format(user_id=user_id, conversation_id=conversation_id)) # Blobs may predate the attachment index
+    results = pipe.execute()
+
+    objects_by_bucket = defaultdict(set)
+    for refs, raw_state in zip(results[0::2], results[1::2]):
+        refs = set(refs)
+        if raw_state:
+            try:
+                refs.update(attachment_refs(json.loads(raw_state)))
+            except (ValueError, TypeError):
+                pass
+        for ref in refs:
+            bucket_name, object_name = json.loads(ref)
+            objects_by_bucket[bucket_name].add(object_name)
+
+    try:
+        for bucket_name, object_names in objects_by_bucket.items():
+            await run_minio(delete_documents_from_minio, sorted(object_names), bucket_name)
+    except Exception as e:
+        logger.error(f"Could not delete attachments of {len(members)} expired conversation(s): {e}. Retrying on the next run.", exc_info=True)
+        return False
+
+    deleted_records = await chat_data_service.delete_conversations([conversation_id for _, conversation_id in pairs])
+
+    pipe = redis_client.pipeline(transaction=False)
+    for user_id, conversation_id in pairs:
+        pipe.delete(*conversation_keys(user_id, conversation_id))
+        pipe.zrem(USER_INDEX_KEY.format(user_id=user_id), conversation_id)
+    pipe.zrem(ACTIVITY_INDEX_KEY, *members)
+    pipe.execute()
+
+    attachment_count = sum(len(names) for names in objects_by_bucket.values())
+    logger.info(f"Deleted {len(members)} expired conversation(s) ({deleted_records} MongoDB record(s), {attachment_count} attachment(s)).")
+    return True
+
+
 async def remove_old_conversations():
     """
-    Removes old chat conversations and their associated MinIO files
-    if they haven't been updated for a specified number of days.
+    Removes chat conversations and their MinIO attachments once they have had
+    no activity for REMOVE_OLD_CONVERSATIONS_AFTER_DAYS.
+
+    Expired conversations are selected from the activity index (a Redis sorted
+    set) in pages of CONVERSATION_CLEANUP_PAGE_SIZE, and a run stops after
+    CONVERSATION_CLEANUP_BUDGET_SECONDS; the next run continues where it left off.
     """
     try:
         days_str = settings.REMOVE_OLD_CONVERSATIONS_AFTER_DAYS
@@ -29,51 +161,29 @@ async def remove_old_conversations():
             return
 
         cutoff_date = datetime.utcnow() - timedelta(days=days_to_keep)
-        logger.info(f"Starting conversation cleanup. Deleting conversations last updated before: {cutoff_date.isoformat()} UTC")
+        cutoff = time.time() - days_to_keep * 24 * 60 * 60
+        logger.info(f"Starting conversation cleanup. Deleting conversations last active before: {cutoff_date.isoformat()} UTC")
 
-        all_conversations = await chat_data_service.get_all_conversations() 
-        
-        if not all_conversations:
-            logger.info("No conversations found for cleanup.")
-            return
+        redis_client = get_redis_client_from_pool()
+        if not redis_client.exists(BACKFILL_DONE_KEY):
+            await _backfill_activity_index(redis_client)
 
+        deadline = time.monotonic() + settings.CONVERSATION_CLEANUP_BUDGET_SECONDS
+        page_size = max(settings.CONVERSATION_CLEANUP_PAGE_SIZE, 1)
         deleted_count = 0
-        for conversation in all_conversations:
-            conversation_id = conversation.get('_id')
-            updated_at = conversation.get('updated_at')
-
-            if not updated_at or updated_at < cutoff_date:
-                logger.info(f"Conversation {conversation_id} (Title: {conversation.get('title', 'N/A')}) is old ({updated_at}) and will be deleted.")
-                
-                # Delete associated MinIO files
-                if 'messages' in conversation:
-                    for message in conversation['messages']:
-                        if 'attachments' in message:
-                            for attachment in message['attachments']:
-                                object_name = attachment.get('object_name')
-                                bucket_name = attachment.get('bucket_name')
-                                if object_name and bucket_name:
-                                    try:
-                                        delete_document_from_minio(object_name, bucket_name)
-                                        logger.info(f"Deleted MinIO object: {object_name} from bucket: {bucket_name}")
-                                    except S3Error as e:
-                                        logger.error(f"MinIO S3Error deleting {object_name} from {bucket_name}: {e}")
-                                    except Exception as e:
-                                        logger.error(f"Error deleting MinIO object {object_name} from {bucket_name}: {e}")
-                                else:
-                                    logger.warning(f"Attachment in conversation {conversation_id} missing object_name or bucket_name: {attachment}")
-
-                # Delete conversation from database
-                success = await chat_data_service.delete_conversation(conversation_id)
-                if success:
-                    deleted_count += 1
-                    logger.info(f"Successfully deleted conversation {conversation_id} from database.")
-                else:
-                    logger.error(f"Failed to delete conversation {conversation_id} from database.")
-            else:
-                logger.info(f"Conversation {conversation_id} (Title: {conversation.get('title', 'N/A')}) is recent ({updated_at}). Skipping.")
+        while True:
+            if time.monotonic() >= deadline:
+                remaining = redis_client.zcount(ACTIVITY_INDEX_KEY, "-inf", cutoff)
+                logger.info(f"Conversation cleanup budget used up; {remaining} expired conversation(s) left for the next run.")
+                break
+            members = redis_client.zrangebyscore(ACTIVITY_INDEX_KEY, "-inf", cutoff, start=0, num=page_size)
+            if not members:
+                break
+            if not await _delete_expired_page(redis_client, members):
+                break
+            deleted_count += len(members)
 
         logger.info(f"Conversation cleanup finished. Total conversations deleted: {deleted_count}")
 
     except Exception as e:
-        logger.error(f"An unexpected error occurred during conversation cleanup: {e}", exc_info=True)
\ No newline at end of file
+        logger.error(f"An unexpected error occurred during conversation cleanup: {e}", exc_info=True)
@@ -1,54 +1,445 @@
 import redis
 import json
-from typing import Dict, Any, Optional
+import logging
+import time
+from typing import Dict, Any, List, Optional
 from fastapi import Depends
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 from app.core.redis_client import get_redis_client
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+# Sorted set of "<user_id>:<conversation_id>" scored by the time of the last activity,
+# so the cleanup job can page through expired conversations without loading them all.
+ACTIVITY_INDEX_KEY = "conversations:last_activity"
+# Set of attachment references ([bucket, object] as JSON) ever added to a conversation.
+# It outlives the state's TTL, so attachments can still be removed after the state expired.
+ATTACHMENT_INDEX_KEY = "conversation_attachments:{user_id}:{conversation_id}"
+
+# "blob" layout: the whole state as one JSON string.
+BLOB_KEY = "conversation:{user_id}:{conversation_id}"
+# "split" layout: context, variables and attached_files as JSON fields of a hash, the
+# history as a list with one JSON message per element, and message id -> list position.
+META_KEY = "conversation_meta:{user_id}:{conversation_id}"
+MESSAGES_KEY = "conversation_messages:{user_id}:{conversation_id}"
+MESSAGE_INDEX_KEY = "conversation_message_index:{user_id}:{conversation_id}"
+META_FIELDS = ("context", "variables", "attached_files")
+
+# Conversation list: per user a sorted set of conversation ids scored by last activity, and per
+# conversation a small hash with title, created_at, updated_at (epoch seconds) and message_count,
+# so the sidebar is one page of the sorted set plus one pipelined HGETALL per entry.
+USER_INDEX_KEY = "user_conversations:{user_id}"
+SUMMARY_KEY = "conversation_summary:{user_id}:{conversation_id}"
+# Set once a user's existing MongoDB conversations have been added to the index.
+USER_INDEX_READY_KEY = "user_conversations_indexed:{user_id}"
+# Text extracted from the conversation's attachments, "<bucket>/<object>" -> text, so a file
+# attached once is not downloaded and parsed again on later turns. Expires with the state.
+EXTRACTION_KEY = "conversation_extractions:{user_id}:{conversation_id}"
+
+
+def activity_member(user_id, conversation_id: str) -> str:
+    return f"{user_id}:{conversation_id}"
+
+
+def attachment_refs(state_data: Dict[str, Any]) -> list:
+    return [
+        json.dumps([att["bucket_name"], att["object_name"]])
+        for att in state_data.get("attached_files", [])
+        if att.get("bucket_name") and att.get("object_name")
+    ]
+
+
+def conversation_keys(user_id, conversation_id: str) -> List[str]:
+    """Every Redis key that can hold state of a conversation, in either layout."""
+    return [key.format(user_id=user_id, conversation_id=conversation_id)
+            for key in (BLOB_KEY, META_KEY, MESSAGES_KEY, MESSAGE_INDEX_KEY, ATTACHMENT_INDEX_KEY, SUMMARY_KEY, EXTRACTION_KEY)]
+
+
+def _timestamp(value) -> float:
+    """Epoch seconds of a datetime or ISO string; naive values are UTC (stored with datetime.utcnow())."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return time.time()
+
+
+def _isoformat(timestamp) -> str:
+    return datetime.fromtimestamp(float(timestamp), timezone.utc).isoformat()
+
+
+def _json_serial(obj):
+    """JSON serializer for objects not serializable by default json code"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError ("Type %s not serializable" % type(obj))
+
+
 class ConversationService:
+    """
+    Conversation state in Redis.
+
+    With CONVERSATION_STORAGE_LAYOUT = "split" (the default) a message append is
+    one RPUSH and the final bot answer one LSET, instead of rewriting the whole
+    history, and prompt building reads only the last N messages with LRANGE.
+    Conversations still stored as blobs are converted on first read;
+    migrate_blob_conversations() converts all of them up front.
+    """
     def __init__(self, redis_client: redis.Redis):
         self.redis = redis_client
         self.conversation_ttl_seconds = settings.REMOVE_OLD_CONVERSATIONS_AFTER_DAYS * 24 * 60 * 60 # Convert days to seconds
+        self.split_layout = settings.CONVERSATION_STORAGE_LAYOUT == "split"
 
     def _get_conversation_key(self, user_id: int, conversation_id: str) -> str:
-        return f"conversation:{user_id}:{conversation_id}"
+        return BLOB_KEY.format(user_id=user_id, conversation_id=conversation_id)
+
+    def _split_keys(self, user_id: int, conversation_id: str):
+        return (META_KEY.format(user_id=user_id, conversation_id=conversation_id),
+                MESSAGES_KEY.format(user_id=user_id, conversation_id=conversation_id),
+                MESSAGE_INDEX_KEY.format(user_id=user_id, conversation_id=conversation_id))
 
     def _json_serial(self, obj):
-        """JSON serializer for objects not serializable by default json code"""
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        raise TypeError ("Type %s not serializable" % type(obj))
+        return _json_serial(obj)
+
+    def _touch(self, pipe, user_id: int, conversation_id: str, attached_files: Optional[list] = None,
+               message_count: Optional[int] = None, added_messages: int = 0):
+        """Queues the TTL refresh and index updates that go with every write."""
+        if self.split_layout:
+            for key in self._split_keys(user_id, conversation_id):
+                pipe.expire(key, self.conversation_ttl_seconds)
+        now = time.time()
+        pipe.zadd(ACTIVITY_INDEX_KEY, {activity_member(user_id, conversation_id): now})
+        pipe.zadd(USER_INDEX_KEY.format(user_id=user_id), {conversation_id: now})
+        summary_key = SUMMARY_KEY.format(user_id=user_id, conversation_id=conversation_id)
+        pipe.hset(summary_key, "updated_at", now)
+        if message_count is not None:
+            pipe.hset(summary_key, "message_count", message_count)
+        elif added_messages:
+            pipe.hincrby(summary_key, "message_count", added_messages)
+        refs = attachment_refs({"attached_files": attached_files or []})
+        if refs:
+            pipe.sadd(ATTACHMENT_INDEX_KEY.format(user_id=user_id, conversation_id=conversation_id), *refs)
+
+    def _write_split_state(self, pipe, user_id: int, conversation_id: str, state_data: Dict[str, Any]):
+        meta_key, messages_key, index_key = self._split_keys(user_id, conversation_id)
+        history = state_data.get("history", [])
+        pipe.delete(messages_key, index_key)
+        pipe.hset(meta_key, mapping={field: json.dumps(state_data.get(field, {} if field != "attached_files" else []), default=_json_serial) for field in META_FIELDS})
+        if history:
+            pipe.rpush(messages_key, *(json.dumps(msg, default=_json_serial) for msg in history))
+            positions = {str(msg["_id"]): position for position, msg in enumerate(history) if msg.get("_id")}
+            if positions:
+                pipe.hset(index_key, mapping=positions)
 
     def save_conversation_state(self, user_id: int, conversation_id: str, state_data: Dict[str, Any]):
         """
-        Saves the conversation state to Redis.
+        Saves the conversation state to Redis, replacing what was stored.
         state_data should include:
         - "history": List of chat messages
         - "context": Current conversation context (e.g., topic, entities)
         - "variables": Session-related temporary variables
         - "attached_files": List of attached file info (e.g., file IDs, MinIO paths)
+        Prefer append_message/update_message/add_attached_files for single changes.
         """
-        key = self._get_conversation_key(user_id, conversation_id)
-        self.redis.setex(key, self.conversation_ttl_seconds, json.dumps(state_data, default=self._json_serial))
+        pipe = self.redis.pipeline(transaction=True)
+        if self.split_layout:
+            self._write_split_state(pipe, user_id, conversation_id, state_data)
+            pipe.delete(self._get_conversation_key(user_id, conversation_id))
+        else:
+            key = self._get_conversation_key(user_id, conversation_id)
+            pipe.setex(key, self.conversation_ttl_seconds, json.dumps(state_data, default=_json_serial))
+        self._touch(pipe, user_id, conversation_id, state_data.get("attached_files"), message_count=len(state_data.get("history", [])))
+        pipe.execute()
 
-    def get_conversation_state(self, user_id: int, conversation_id: str) -> Optional[Dict[str, Any]]:
+    def get_conversation_state(self, user_id: int, conversation_id: str, last_n: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """
-        Retrieves the conversation state from Redis.
+        Retrieves the conversation state from Redis. With `last_n`, "history"
+        holds only the most recent `last_n` messages.
         """
-        key = self._get_conversation_key(user_id, conversation_id)
-        data = self.redis.get(key)
-        if data:
-            return json.loads(data)
-        return None
+        if self.split_layout:
+            meta_key, messages_key, _ = self._split_keys(user_id, conversation_id)
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hgetall(meta_key)
+            pipe.lrange(messages_key, -last_n if last_n else 0, -1)
+            meta, messages = pipe.execute()
+            if meta:
+                state = {field: json.loads(meta[field]) for field in META_FIELDS if field in meta}
+                state["history"] = [json.loads(msg) for msg in messages]
+                return state
+
+        data = self.redis.get(self._get_conversation_key(user_id, conversation_id))
+        if not data:
+            return None
+        state = json.loads(data)
+        if self.split_layout:
+            # Convert a conversation still stored in the old layout
+            self.save_conversation_state(user_id, conversation_id, state)
+        if last_n:
+            state["history"] = state.get("history", [])[-last_n:]
+        return state
+
+    def get_message_page(self, user_id: int, conversation_id: str, skip: int = 0, limit: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """One page of the history, oldest first. Returns None if the conversation is not in Redis."""
+        meta_key, messages_key, _ = self._split_keys(user_id, conversation_id)
+        if self.split_layout and self.redis.exists(meta_key):
+            end = skip + limit - 1 if limit else -1
+            return [json.loads(msg) for msg in self.redis.lrange(messages_key, skip, end)]
+        state = self.get_conversation_state(user_id, conversation_id)
+        if state is None:
+            return None
+        return state.get("history", [])[skip:skip + limit if limit else None]
+
+    def conversation_exists(self, user_id: int, conversation_id: str) -> bool:
+        meta_key, _, _ = self._split_keys(user_id, conversation_id)
+        return bool(self.redis.exists(meta_key, self._get_conversation_key(user_id, conversation_id)))
+
+    def _ensure_split(self, user_id: int, conversation_id: str) -> bool:
+        """Makes sure the conversation is stored in the split layout. Returns False if it does not exist."""
+        meta_key, _, _ = self._split_keys(user_id, conversation_id)
+        if self.redis.exists(meta_key):
+            return True
+        return self.get_conversation_state(user_id, conversation_id) is not None
+
+    def append_message(self, user_id: int, conversation_id: str, message: Dict[str, Any]) -> bool:
+        """Appends a message to the history. Returns False if the conversation is not in Redis."""
+        if not self.split_layout:
+            state = self.get_conversation_state(user_id, conversation_id)
+            if state is None:
+                return False
+            state["history"].append(message)
+            self.save_conversation_state(user_id, conversation_id, state)
+            return True
+
+        if not self._ensure_split(user_id, conversation_id):
+            return False
+        _, messages_key, index_key = self._split_keys(user_id, conversation_id)
+        length = self.redis.rpush(messages_key, json.dumps(message, default=_json_serial))
+        pipe = self.redis.pipeline(transaction=False)
+        if message.get("_id"):
+            pipe.hset(index_key, str(message["_id"]), length - 1)
+        self._touch(pipe, user_id, conversation_id, message.get("attachments"), added_messages=1)
+        pipe.execute()
+        return True
+
+    def update_message(self, user_id: int, conversation_id: str, message_id: str, updates: Dict[str, Any]) -> bool:
+        """Merges `updates` into one message of the history. Returns False if it is not found."""
+        if not self.split_layout:
+            state = self.get_conversation_state(user_id, conversation_id)
+            message = next((msg for msg in (state or {}).get("history", []) if str(msg.get("_id")) == message_id), None)
+            if message is None:
+                return False
+            message.update(updates)
+            self.save_conversation_state(user_id, conversation_id, state)
+            return True
+
+        if not self._ensure_split(user_id, conversation_id):
+            return False
+        _, messages_key, index_key = self._split_keys(user_id, conversation_id)
+        position = self.redis.hget(index_key, message_id)
+        if position is None:
+            return False
+        # Positions only change on a full rewrite, so they stay valid while other messages are appended
+        raw = self.redis.lindex(messages_key, int(position))
+        if raw is None:
+            return False
+        message = json.loads(raw)
+        if str(message.get("_id")) != message_id:
+            logger.warning(f"Message index of conversation {conversation_id} is stale; rewriting it.")
+            state = self.get_conversation_state(user_id, conversation_id)
+            self.save_conversation_state(user_id, conversation_id, state)
+            return self.update_message(user_id, conversation_id, message_id, updates)
+        message.update(updates)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.lset(messages_key, int(position), json.dumps(message, default=_json_serial))
+        self._touch(pipe, user_id, conversation_id)
+        pipe.execute()
+        return True
+
+    def add_attached_files(self, user_id: int, conversation_id: str, attached_files: List[Dict[str, Any]]) -> bool:
+        """Adds attachment metadata to the conversation. Returns False if the conversation is not in Redis."""
+        if not self.split_layout:
+            state = self.get_conversation_state(user_id, conversation_id)
+            if state is None:
+                return False
+            state.setdefault("attached_files", []).extend(attached_files)
+            self.save_conversation_state(user_id, conversation_id, state)
+            return True
+
+        if not self._ensure_split(user_id, conversation_id):
+            return False
+        meta_key, _, _ = self._split_keys(user_id, conversation_id)
+        current = json.loads(self.redis.hget(meta_key, "attached_files") or "[]")
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(meta_key, "attached_files", json.dumps(current + attached_files, default=_json_serial))
+        self._touch(pipe, user_id, conversation_id, attached_files)
+        pipe.execute()
+        return True
+
+    def get_cached_extractions(self, user_id: int, conversation_id: str, refs: List[str]) -> Dict[str, str]:
+        """Returns the cached extracted text of the given attachment refs ("<bucket>/<object>") that have one."""
+        if not refs:
+            return {}
+        try:
+            values = self.redis.hmget(EXTRACTION_KEY.format(user_id=user_id, conversation_id=conversation_id), refs)
+        except redis.RedisError as e:
+            logger.warning(f"Could not read cached attachment extractions of conversation {conversation_id}: {e}")
+            return {}
+        return {ref: value for ref, value in zip(refs, values) if value is not None}
+
+    def cache_extraction(self, user_id: int, conversation_id: str, ref: str, content: str):
+        """Keeps the extracted text of an attachment for later turns, unless it is empty or too long."""
+        if not content or len(content) > settings.CHAT_EXTRACTION_CACHE_MAX_CHARS:
+            return
+        key = EXTRACTION_KEY.format(user_id=user_id, conversation_id=conversation_id)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hset(key, ref, content)
+            pipe.expire(key, self.conversation_ttl_seconds)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not cache the extraction of {ref} for conversation {conversation_id}: {e}")
 
     def delete_conversation_state(self, user_id: int, conversation_id: str):
         """
         Deletes the conversation state from Redis.
         """
-        key = self._get_conversation_key(user_id, conversation_id)
-        self.redis.delete(key)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(*conversation_keys(user_id, conversation_id))
+        pipe.zrem(ACTIVITY_INDEX_KEY, activity_member(user_id, conversation_id))
+        pipe.zrem(USER_INDEX_KEY.format(user_id=user_id), conversation_id)
+        pipe.execute()
+
+    # --- Conversation list ---
+
+    def index_conversation(self, user_id: int, conversation_id: str, title: str, created_at=None):
+        """Adds a newly created conversation to the user's conversation list."""
+        created = _timestamp(created_at)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(SUMMARY_KEY.format(user_id=user_id, conversation_id=conversation_id), mapping={
+            "title": title, "created_at": created, "updated_at": created, "message_count": 0,
+        })
+        pipe.zadd(USER_INDEX_KEY.format(user_id=user_id), {conversation_id: created})
+        pipe.execute()
+
+    def set_conversation_title(self, user_id: int, conversation_id: str, title: str):
+        self.redis.hset(SUMMARY_KEY.format(user_id=user_id, conversation_id=conversation_id), "title", title)
+
+    def is_user_indexed(self, user_id: int) -> bool:
+        return bool(self.redis.exists(USER_INDEX_READY_KEY.format(user_id=user_id)))
+
+    def index_user_conversations(self, user_id: int, conversations: List[Dict[str, Any]]):
+        """
+        Adds a user's existing conversations (MongoDB records without their
+        messages) to the conversation list. Activity and message counts already
+        recorded in Redis take precedence over the MongoDB values.
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for conv in conversations:
+            pipe.zscore(ACTIVITY_INDEX_KEY, activity_member(user_id, conv["_id"]))
+            pipe.llen(MESSAGES_KEY.format(user_id=user_id, conversation_id=conv["_id"]))
+        results = pipe.execute()
+
+        pipe = self.redis.pipeline(transaction=False)
+        for conv, last_activity, stored_messages in zip(conversations, results[0::2], results[1::2]):
+            conversation_id = conv["_id"]
+            updated = last_activity or _timestamp(conv.get("updated_at") or conv.get("created_at"))
+            summary_key = SUMMARY_KEY.format(user_id=user_id, conversation_id=conversation_id)
+            pipe.hset(summary_key, mapping={"title": conv.get("title", ""), "created_at": _timestamp(conv.get("created_at"))})
+            pipe.hsetnx(summary_key, "updated_at", updated)
+            pipe.hsetnx(summary_key, "message_count", max(stored_messages, conv.get("message_count", 0)))
+            pipe.zadd(USER_INDEX_KEY.format(user_id=user_id), {conversation_id: updated}, nx=True)
+        pipe.set(USER_INDEX_READY_KEY.format(user_id=user_id), datetime.utcnow().isoformat())
+        pipe.execute()
+        logger.info(f"Indexed {len(conversations)} existing conversation(s) of user {user_id}.")
+
+    def list_conversation_summaries(self, user_id: int, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        One page of the user's conversations, most recently active first, as
+        conversation dicts without messages. Reads the page of ids and then all
+        summaries in a single pipeline.
+        """
+        end = offset + limit - 1 if limit else -1
+        conversation_ids = self.redis.zrevrange(USER_INDEX_KEY.format(user_id=user_id), offset, end)
+        if not conversation_ids:
+            return []
+        pipe = self.redis.pipeline(transaction=False)
+        for conversation_id in conversation_ids:
+            pipe.hgetall(SUMMARY_KEY.format(user_id=user_id, conversation_id=conversation_id))
+        summaries = pipe.execute()
+
+        conversations = []
+        for conversation_id, summary in zip(conversation_ids, summaries):
+            if "title" not in summary:
+                continue # Redis state without a MongoDB record
+            conversations.append({
+                "_id": conversation_id,
+                "user_id": str(user_id),
+                "title": summary["title"],
+                "created_at": _isoformat(summary.get("created_at") or summary["updated_at"]),
+                "updated_at": _isoformat(summary["updated_at"]),
+                "message_count": int(summary.get("message_count") or 0),
+            })
+        return conversations
+
+
+def migrate_blob_conversations(redis_client: redis.Redis, batch_size: int = 500, dry_run: bool = False) -> int:
+    """
+    Converts every conversation stored as a JSON blob to the split layout,
+    keeping its remaining TTL. Safe to run repeatedly and while the app is
+    serving: each conversation is converted in one MULTI/EXEC.
+    Returns the number of conversations converted.
+    """
+    service = ConversationService(redis_client)
+    service.split_layout = True
+    converted = 0
+    keys = []
+
+    def convert(batch: List[str]) -> int:
+        pipe = redis_client.pipeline(transaction=False)
+        for key in batch:
+            pipe.get(key)
+            pipe.ttl(key)
+        results = pipe.execute()
+        count = 0
+        for key, raw, remaining in zip(batch, results[0::2], results[1::2]):
+            if not raw:
+                continue
+            _, user_id, conversation_id = key.split(":", 2)
+            try:
+                state = json.loads(raw)
+            except ValueError:
+                logger.warning(f"Skipping unreadable conversation blob {key}")
+                continue
+            count += 1
+            if dry_run:
+                continue
+            ttl = remaining if remaining and remaining > 0 else service.conversation_ttl_seconds
+            write = redis_client.pipeline(transaction=True)
+            service._write_split_state(write, user_id, conversation_id, state)
+            for split_key in service._split_keys(user_id, conversation_id):
+                write.expire(split_key, ttl)
+            refs = attachment_refs(state)
+            if refs:
+                write.sadd(ATTACHMENT_INDEX_KEY.format(user_id=user_id, conversation_id=conversation_id), *refs)
+            write.hset(SUMMARY_KEY.format(user_id=user_id, conversation_id=conversation_id), "message_count", len(state.get("history", [])))
+            write.delete(key)
+            write.execute()
+        return count
+
+    for key in redis_client.scan_iter(match="conversation:*", count=batch_size):
+        keys.append(key)
+        if len(keys) >= batch_size:
+            converted += convert(keys)
+            keys = []
+    if keys:
+        converted += convert(keys)
+    logger.info(f"{'Would convert' if dry_run else 'Converted'} {converted} conversation blob(s) to the split layout.")
+    return converted
+
 
 def get_conversation_service(redis_client: redis.Redis = Depends(get_redis_client)):
     """
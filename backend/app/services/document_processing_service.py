@@ -12,9 +12,10 @@ from app.utils.document_utils import is_scanned_pdf
 from app.utils.table_utils import linearize_html_table_to_markdown
 from app.utils.dwg_utils import extract_text_from_dwg
 from app.services.mineru_service import mineru_client
-from app.services.paddleocr_service import call_paddleocr_service
+from app.services.paddleocr_service import call_paddleocr_service, call_paddleocr_batch_service
 # Placeholder for the new service client we will create
 from app.services.latexocr_service import call_latexocr_service
+from app.core.config import settings
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -179,10 +180,30 @@ async def _process_with_mineru(file_bytes: bytes, filename: str) -> str:
         logger.warning(f"MinerU returned a valid structure but with no pages for '{filename}'.")
         return ""
 
+    # OCR every figure of the document up front, in batches, keyed by (page, block) position.
+    figure_images = {}
+    for page_num, page in enumerate(pages):
+        for block_num, block in enumerate(page.get('blocks', [])):
+            if isinstance(block, dict) and block.get('type') == 'figure' and block.get('b64_data'):
+                try:
+                    figure_images[(page_num, block_num)] = base64.b64decode(block['b64_data'])
+                except Exception as e:
+                    logger.error(f"Error decoding figure block's b64_data: {e}")
+    try:
+        texts = await call_paddleocr_batch_service(
+            [(f"figure_{uuid.uuid4()}.png", data) for data in figure_images.values()],
+            concurrency=settings.FIGURE_OCR_CONCURRENCY,
+        )
+    except Exception as e:
+        # Without OCR text the figures fall back to LatexOCR (or are skipped), as before.
+        logger.error(f"PaddleOCR failed for the figures of '{filename}': {e}")
+        texts = [""] * len(figure_images)
+    figure_texts = dict(zip(figure_images.keys(), texts))
+
     for page_num, page in enumerate(pages):
         content_parts.append(f"\n\n--- Page {page_num + 1} ---\n\n")
         blocks = page.get('blocks', [])
-        for block in blocks:
+        for block_num, block in enumerate(blocks):
             # Defensive coding: Ensure the block is a dictionary before processing.
             # The underlying MinerU library might return non-dict items in the blocks list.
             if not isinstance(block, dict):
@@ -199,15 +220,12 @@ async def _process_with_mineru(file_bytes: bytes, filename: str) -> str:
                     markdown_table = linearize_html_table_to_markdown(html_content)
                     content_parts.append(f"\n\n{markdown_table}\n\n")
             elif block_type == 'figure':
-                b64_data = block.get('b64_data')
-                if b64_data:
+                image_bytes = figure_images.get((page_num, block_num))
+                if image_bytes is not None:
                     try:
-                        image_bytes = base64.b64decode(b64_data)
-                        
                         # Per user spec: Process images first with PaddleOCR, then LatexOCR as fallback.
                         # This handles both text within images and mathematical formulas.
-                        temp_filename = f"figure_{uuid.uuid4()}.png"
-                        recognized_text = await _process_image_with_paddle(image_bytes, temp_filename)
+                        recognized_text = figure_texts.get((page_num, block_num), "")
 
                         if recognized_text and recognized_text.strip():
                             content_parts.append(f"\n[Image Text: {recognized_text.strip()}]\n")
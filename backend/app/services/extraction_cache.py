@@ -0,0 +1,154 @@
+"""
+Shared cache of text extracted from files and of the summaries made from it.
+
+Entries are keyed by the SHA-256 of the content, not by object name or user,
+so the same file attached again (in a later turn, or uploaded by a colleague)
+is not parsed by MinerU or a vision model again. Results that depend on the
+user's question (images described by the vision model, agent answers) add a
+hash of the question to the key.
+
+Entries are Redis strings that expire after EXTRACTION_CACHE_TTL_SECONDS (the
+TTL is refreshed on every hit). Entries larger than
+EXTRACTION_CACHE_MAX_ENTRY_BYTES are not stored, and once all entries together
+exceed EXTRACTION_CACHE_MAX_BYTES the least recently used ones are evicted. The
+byte count is kept with INCRBY/DECRBY, so with several workers it is an
+approximation, which is good enough for a budget.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from typing import Optional
+
+import redis
+
+from app.core.config import settings
+from app.utils.redis_utils import get_redis_client_from_pool
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "extraction_cache"
+# Cache key -> time of the last use, for LRU eviction.
+LRU_KEY = "extraction_cache:lru"
+# Cache key -> stored bytes, and the sum of all of them.
+SIZES_KEY = "extraction_cache:sizes"
+TOTAL_BYTES_KEY = "extraction_cache:total_bytes"
+
+# Kinds of cached results
+TEXT = "text"  # Question-independent extraction of a file (extract_text_from_file_content)
+ANSWER = "answer"  # Question-dependent extraction (images through the vision model)
+SUMMARY = "summary"  # summarize_long_text of a text
+AGENT_TEXT = "agent_text"  # FileProcessingAgent's own extraction of a file
+AGENT_ANSWER = "agent_answer"  # FileProcessingAgent's LLM result for a file and task
+
+EVICTION_BATCH = 100
+
+
+def content_hash(data) -> str:
+    """SHA-256 hex digest of bytes or of a string's UTF-8 encoding."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class ExtractionCache:
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(ExtractionCache, cls).__new__(cls)
+                cls._instance.hits = 0
+                cls._instance.misses = 0
+        return cls._instance
+
+    @staticmethod
+    def key(kind: str, digest: str, question: Optional[str] = None) -> str:
+        key = f"{KEY_PREFIX}:{kind}:{digest}"
+        if question is not None:
+            key += f":{content_hash(question)[:32]}"
+        return key
+
+    async def get(self, kind: str, digest: str, question: Optional[str] = None) -> Optional[str]:
+        """Returns the cached result, or None. Redis errors count as a miss."""
+        value = await asyncio.to_thread(self._get, self.key(kind, digest, question))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def put(self, kind: str, digest: str, value: str, question: Optional[str] = None) -> None:
+        """Stores a result unless it is empty or larger than the per-entry cap."""
+        if not value:
+            return
+        await asyncio.to_thread(self._put, self.key(kind, digest, question), value)
+
+    def _get(self, key: str) -> Optional[str]:
+        redis_client = get_redis_client_from_pool()
+        if redis_client is None:
+            return None
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.expire(key, settings.EXTRACTION_CACHE_TTL_SECONDS)
+            pipe.zadd(LRU_KEY, {key: time.time()}, xx=True)
+            value, _, _ = pipe.execute()
+            return value
+        except redis.RedisError as e:
+            logger.warning(f"Extraction cache read of {key} failed: {e}")
+            return None
+
+    def _put(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        if size > settings.EXTRACTION_CACHE_MAX_ENTRY_BYTES:
+            logger.debug(f"Not caching {key}: {size} bytes exceed the per-entry cap.")
+            return
+        redis_client = get_redis_client_from_pool()
+        if redis_client is None:
+            return
+        try:
+            previous_size = int(redis_client.hget(SIZES_KEY, key) or 0)
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.setex(key, settings.EXTRACTION_CACHE_TTL_SECONDS, value)
+            pipe.zadd(LRU_KEY, {key: time.time()})
+            pipe.hset(SIZES_KEY, key, size)
+            pipe.incrby(TOTAL_BYTES_KEY, size - previous_size)
+            total = pipe.execute()[-1]
+            if total > settings.EXTRACTION_CACHE_MAX_BYTES:
+                self._evict(redis_client, total)
+        except redis.RedisError as e:
+            logger.warning(f"Extraction cache write of {key} failed: {e}")
+
+    def _evict(self, redis_client: redis.Redis, total: int) -> None:
+        """Deletes least recently used entries (expired ones come first) until the cache is under 90% of its cap."""
+        target = settings.EXTRACTION_CACHE_MAX_BYTES * 0.9
+        evicted = 0
+        while total > target:
+            keys = redis_client.zrange(LRU_KEY, 0, EVICTION_BATCH - 1)
+            if not keys:
+                break
+            sizes = redis_client.hmget(SIZES_KEY, keys)
+            freed = 0
+            batch = []
+            for key, size in zip(keys, sizes):
+                batch.append(key)
+                freed += int(size or 0)
+                if total - freed <= target:
+                    break
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.delete(*batch)
+            pipe.zrem(LRU_KEY, *batch)
+            pipe.hdel(SIZES_KEY, *batch)
+            pipe.decrby(TOTAL_BYTES_KEY, freed)
+            total = pipe.execute()[-1]
+            evicted += len(batch)
+        logger.info(f"Extraction cache evicted {evicted} entries; {total} bytes remain.")
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """Gets the singleton instance of the ExtractionCache."""
+    return ExtractionCache()
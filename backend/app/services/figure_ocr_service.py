@@ -0,0 +1,165 @@
+import asyncio
+import io
+import logging
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from app.core.config import settings
+from app.services.paddleocr_service import call_paddleocr_batch_service
+from app.services.latexocr_service import call_latexocr_service
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FigureJob:
+    """
+    One figure block to recognize. `key` identifies the block for the caller
+    (e.g. its index in the MinerU block list). Either `image_bytes` is set, or
+    `page_index` points at the page to render as a fallback.
+    """
+    key: object
+    image_bytes: Optional[bytes] = None
+    page_index: Optional[int] = None
+
+
+def should_skip_ocr(image_bytes: bytes) -> bool:
+    """
+    Returns True for images too small or too uniform to contain text, such as
+    separators, bullets and blank placeholders. Thresholds come from settings.
+    """
+    if len(image_bytes) < settings.FIGURE_OCR_MIN_BYTES:
+        return True
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            if min(image.size) < settings.FIGURE_OCR_MIN_SIDE_PX:
+                return True
+            # Shannon entropy of the grayscale histogram; near zero for flat images.
+            return image.convert("L").entropy() < settings.FIGURE_OCR_MIN_ENTROPY
+    except Exception:
+        # Let the OCR service decide on images PIL cannot read.
+        return False
+
+
+class PageRenderer:
+    """
+    Renders PDF pages to PNG for figures MinerU reported without image data.
+    The document is opened once and reused for every page render; renders are
+    cached per page. PyMuPDF documents are not thread-safe, so renders are serialized.
+    """
+
+    def __init__(self, file_bytes: bytes):
+        self._file_bytes = file_bytes
+        self._doc = None
+        self._lock = threading.Lock()
+        self._cache: Dict[int, Optional[bytes]] = {}
+
+    def _render(self, page_index: int) -> Optional[bytes]:
+        with self._lock:
+            if page_index in self._cache:
+                return self._cache[page_index]
+            if self._doc is None:
+                self._doc = fitz.open(stream=self._file_bytes, filetype="pdf")
+            if page_index < len(self._doc):
+                rendered = self._doc.load_page(page_index).get_pixmap().tobytes("png")
+            else:
+                logger.error(f"Page index {page_index} is out of bounds for document with {len(self._doc)} pages.")
+                rendered = None
+            self._cache[page_index] = rendered
+            return rendered
+
+    async def render(self, page_index: int) -> Optional[bytes]:
+        return await asyncio.to_thread(self._render, page_index)
+
+    def close(self):
+        with self._lock:
+            if self._doc is not None:
+                self._doc.close()
+                self._doc = None
+            self._cache.clear()
+
+
+async def recognize_figures(jobs: List[FigureJob], file_bytes: Optional[bytes] = None) -> Dict[object, str]:
+    """
+    Recognizes a document's figures concurrently, with at most FIGURE_OCR_CONCURRENCY
+    requests in flight per stage.
+
+    1. Figures without image data are rendered from their page (PDF opened once).
+    2. Tiny or low-entropy images are skipped.
+    3. The rest go through PaddleOCR in concurrent batches.
+    4. Figures with no text are retried concurrently as formulas with LatexOCR.
+
+    Returns:
+        A mapping from job key to chunk text ("[Image Text: ...]" or "$$latex$$").
+        Figures that yielded nothing are absent.
+    """
+    concurrency = max(1, settings.FIGURE_OCR_CONCURRENCY)
+    renderer = PageRenderer(file_bytes) if file_bytes else None
+    images: Dict[object, bytes] = {}
+    rendered_keys = set()
+
+    try:
+        # --- Stage 1: page renders for figures MinerU returned without data ---
+        fallback_jobs = [job for job in jobs if job.image_bytes is None and job.page_index is not None]
+        if fallback_jobs and renderer is None:
+            logger.warning(f"{len(fallback_jobs)} figures have no image data and no source PDF was provided. Skipping them.")
+        elif fallback_jobs:
+            logger.warning(f"MinerU provided no image data for {len(fallback_jobs)} figures. Rendering their pages for fallback OCR.")
+            renders = await asyncio.gather(*(renderer.render(job.page_index) for job in fallback_jobs))
+            for job, rendered in zip(fallback_jobs, renders):
+                if rendered:
+                    images[job.key] = rendered
+                    rendered_keys.add(job.key)
+        for job in jobs:
+            if job.image_bytes is not None:
+                images[job.key] = job.image_bytes
+    finally:
+        if renderer:
+            renderer.close()
+
+    # --- Stage 2: drop images that cannot contain text ---
+    keys = list(images.keys())
+    skip_flags = await asyncio.gather(*(asyncio.to_thread(should_skip_ocr, images[key]) for key in keys))
+    ocr_keys = [key for key, skip in zip(keys, skip_flags) if not skip]
+    if len(ocr_keys) < len(keys):
+        logger.info(f"Skipping OCR for {len(keys) - len(ocr_keys)} of {len(keys)} figures below the size/entropy threshold.")
+
+    # --- Stage 3: PaddleOCR in concurrent batches ---
+    try:
+        texts = await call_paddleocr_batch_service(
+            [(f"figure_{uuid.uuid4()}.png", images[key]) for key in ocr_keys],
+            concurrency=concurrency,
+        )
+    except Exception as e:
+        logger.error(f"PaddleOCR failed for this document's figures, trying LatexOCR only: {e}")
+        texts = [""] * len(ocr_keys)
+
+    results: Dict[object, str] = {}
+    latex_keys = []
+    for key, text in zip(ocr_keys, texts):
+        if text and text.strip():
+            label = "Image Text (Fallback OCR)" if key in rendered_keys else "Image Text"
+            results[key] = f"\n[{label}: {text.strip()}]\n"
+        elif key not in rendered_keys:
+            # Whole-page renders are not formulas; only embedded figures go to LatexOCR.
+            latex_keys.append(key)
+
+    # --- Stage 4: LatexOCR for figures without text ---
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def recognize_formula(key) -> Optional[str]:
+        async with semaphore:
+            return await call_latexocr_service(images[key])
+
+    latex_codes = await asyncio.gather(*(recognize_formula(key) for key in latex_keys))
+    for key, latex_code in zip(latex_keys, latex_codes):
+        if latex_code:
+            results[key] = f"\n$${latex_code}$$\n"
+
+    logger.info(f"Figure OCR finished: {len(results)}/{len(jobs)} figures recognized (concurrency {concurrency}).")
+    return results
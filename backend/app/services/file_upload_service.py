@@ -6,18 +6,11 @@ from fastapi import UploadFile
 from sqlalchemy.orm import Session
 
 from app.models.database import FileGist, RagData
-from app.modules.minio_module import Minio, S3Error, settings
+from app.modules.minio_module import S3Error
+from app.core.minio_client import get_minio_client, ensure_bucket
 
 logger = logging.getLogger(__name__)
 
-def get_minio_client():
-    return Minio(
-        settings.MINIO_ENDPOINT,
-        access_key=settings.MINIO_ACCESS_KEY,
-        secret_key=settings.MINIO_SECRET_KEY,
-        secure=False
-    )
-
 async def handle_file_uploads(db: Session, rag_id: int, files: List[UploadFile]) -> List[FileGist]:
     """
     Handles uploading multiple files to MinIO and creating FileGist records.
@@ -40,10 +33,7 @@ async def handle_file_uploads(db: Session, rag_id: int, files: List[UploadFile])
 
     try:
         # Ensure bucket exists
-        found = minio_client.bucket_exists(bucket_name)
-        if not found:
-            minio_client.make_bucket(bucket_name)
-            logger.info(f"Bucket '{bucket_name}' created.")
+        ensure_bucket(bucket_name, minio_client)
 
         for file in files:
             # Sanitize filename
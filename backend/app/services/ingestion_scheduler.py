@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_hour_window(value: str) -> Optional[Tuple[int, int]]:
+    """Parses "22-6" style hour ranges (as in MINERU_NIGHTTIME_HOURS) into (start, end)."""
+    try:
+        start, end = (int(part) for part in value.split("-"))
+    except ValueError:
+        return None
+    if not (0 <= start <= 23 and 0 <= end <= 23):
+        return None
+    return start, end
+
+
+class IngestionScheduler:
+    """
+    Decides how much bulk ingestion (MinIO sync, background embedding) may run
+    at the moment.
+
+    - Off-hours (MINERU_NIGHTTIME_HOURS) bulk work runs at full parallelism.
+    - During business hours it gets at most INGESTION_DAYTIME_CONCURRENCY slots,
+      scaled down as chat gets slower or Ollama gets busier, and paused while
+      either is over its limit. The signals are the time to first token of
+      recent chat answers and the number of chat requests in flight to Ollama,
+      both recorded by ollama_service.
+    - A caller never waits longer than INGESTION_MAX_WAIT_SECONDS, so bulk work
+      cannot be starved indefinitely.
+
+    State is guarded by a threading lock because background embedding runs on
+    its own event loop in a worker thread.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(IngestionScheduler, cls).__new__(cls)
+                cls._instance._lock = threading.Lock()
+                cls._instance._latencies = deque()  # (monotonic time, seconds to first token)
+                cls._instance._ollama_in_flight = 0
+                cls._instance._active_slots = 0
+        return cls._instance
+
+    # --- Load signals ---
+
+    def record_chat_latency(self, seconds: float) -> None:
+        """Records the time to first token of a chat answer."""
+        with self._lock:
+            self._latencies.append((time.monotonic(), seconds))
+            self._trim_latencies()
+
+    @contextmanager
+    def track_ollama_request(self):
+        """Counts a chat request as in flight to Ollama while the block runs."""
+        with self._lock:
+            self._ollama_in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._ollama_in_flight -= 1
+
+    def _trim_latencies(self) -> None:
+        cutoff = time.monotonic() - settings.INGESTION_LOAD_WINDOW_SECONDS
+        while self._latencies and self._latencies[0][0] < cutoff:
+            self._latencies.popleft()
+
+    def chat_latency_p90(self) -> float:
+        """90th percentile time to first token over the load window (0 when chat was idle)."""
+        with self._lock:
+            self._trim_latencies()
+            values = sorted(seconds for _, seconds in self._latencies)
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, math.ceil(0.9 * len(values)) - 1)]
+
+    @property
+    def ollama_in_flight(self) -> int:
+        return self._ollama_in_flight
+
+    # --- Time windows ---
+
+    def _now(self) -> datetime:
+        return datetime.now(ZoneInfo(settings.TIMEZONE))
+
+    def is_off_hours(self, now: Optional[datetime] = None) -> bool:
+        window = _parse_hour_window(settings.MINERU_NIGHTTIME_HOURS)
+        if not window:
+            return False
+        start, end = window
+        hour = (now or self._now()).hour
+        if start > end:
+            return hour >= start or hour < end
+        return start <= hour < end
+
+    def window_end(self, now: Optional[datetime] = None) -> Optional[datetime]:
+        """End of the current off-hours window, or None during business hours."""
+        now = now or self._now()
+        window = _parse_hour_window(settings.MINERU_NIGHTTIME_HOURS)
+        if not window or not self.is_off_hours(now):
+            return None
+        end = now.replace(hour=window[1], minute=0, second=0, microsecond=0)
+        return end if end > now else end + timedelta(days=1)
+
+    # --- Throttling ---
+
+    def target_concurrency(self, max_concurrency: int) -> int:
+        """How many bulk ingestion jobs may run now, out of `max_concurrency`."""
+        if self.is_off_hours():
+            return max_concurrency
+        latency_pressure = self.chat_latency_p90() / max(settings.INGESTION_CHAT_LATENCY_TARGET_SECONDS, 1e-3)
+        queue_pressure = self.ollama_in_flight / max(settings.INGESTION_OLLAMA_QUEUE_LIMIT, 1)
+        pressure = max(latency_pressure, queue_pressure)
+        if pressure >= 1:
+            return 0
+        daytime_max = min(max_concurrency, settings.INGESTION_DAYTIME_CONCURRENCY)
+        return max(1, math.ceil(daytime_max * (1 - pressure))) if daytime_max > 0 else 0
+
+    def try_acquire(self, max_concurrency: int) -> bool:
+        """Takes a bulk ingestion slot if the current target allows one more."""
+        target = self.target_concurrency(max_concurrency)
+        with self._lock:
+            if self._active_slots < target:
+                self._active_slots += 1
+                return True
+        return False
+
+    def force_acquire(self) -> None:
+        """Takes a slot regardless of the target, for work that has waited INGESTION_MAX_WAIT_SECONDS."""
+        with self._lock:
+            self._active_slots += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._active_slots = max(self._active_slots - 1, 0)
+
+    @asynccontextmanager
+    async def slot(self, max_concurrency: int = 1):
+        """Waits for a bulk ingestion slot, but no longer than INGESTION_MAX_WAIT_SECONDS."""
+        waited_until = time.monotonic() + settings.INGESTION_MAX_WAIT_SECONDS
+        acquired = self.try_acquire(max_concurrency)
+        if not acquired:
+            logger.info("Bulk ingestion throttled while chat is busy; waiting for a slot.")
+        while not acquired and time.monotonic() < waited_until:
+            await asyncio.sleep(settings.INGESTION_POLL_SECONDS)
+            acquired = self.try_acquire(max_concurrency)
+        if not acquired:
+            logger.warning(f"No ingestion slot after {settings.INGESTION_MAX_WAIT_SECONDS}s; proceeding anyway.")
+            self.force_acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    # --- Backlog estimate ---
+
+    def estimate_backlog(self, backlog_files: int, files_per_minute: float) -> dict:
+        """
+        Estimates whether `backlog_files` will be processed before the current
+        off-hours window ends (or, during business hours, within the next one).
+        """
+        now = self._now()
+        end = self.window_end(now)
+        if end is None:
+            window = _parse_hour_window(settings.MINERU_NIGHTTIME_HOURS)
+            hours = (window[1] - window[0]) % 24 if window else 0
+            window_minutes = hours * 60
+        else:
+            window_minutes = (end - now).total_seconds() / 60
+        estimated_minutes = backlog_files / files_per_minute if files_per_minute > 0 else (0.0 if backlog_files == 0 else math.inf)
+        return {
+            "backlog_files": backlog_files,
+            "files_per_minute": round(files_per_minute, 1),
+            "estimated_minutes": round(estimated_minutes, 1) if math.isfinite(estimated_minutes) else -1,
+            "window_minutes_left": round(window_minutes, 1),
+            "will_finish": estimated_minutes <= window_minutes,
+        }
+
+    def status(self) -> dict:
+        """Current load signals and throttle decision, for logs and diagnostics."""
+        return {
+            "off_hours": self.is_off_hours(),
+            "chat_latency_p90": round(self.chat_latency_p90(), 2),
+            "ollama_in_flight": self.ollama_in_flight,
+            "active_slots": self._active_slots,
+        }
+
+
+def get_ingestion_scheduler() -> IngestionScheduler:
+    """Gets the singleton instance of the IngestionScheduler."""
+    return IngestionScheduler()
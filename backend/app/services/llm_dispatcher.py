@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LLMPriority(IntEnum):
+    """Dispatch classes; lower values are served first."""
+    INTERACTIVE = 0  # Chat answers and query parsing a user is waiting for
+    AGENT = 1  # Multi-agent steps, and LLM work that was not classified
+    INGESTION = 2  # Document summaries produced while embedding files
+
+
+@dataclass(frozen=True)
+class LLMRequestContext:
+    priority: LLMPriority = LLMPriority.AGENT
+    user_id: Optional[int] = None
+    department: Optional[str] = None
+
+
+# Who the LLM calls of the current task are made for. Set by the routes (and by the
+# ingestion code) so the call sites deep in tools and services need no extra arguments.
+_request_context: ContextVar[LLMRequestContext] = ContextVar("llm_request_context", default=LLMRequestContext())
+
+
+def set_llm_request_context(priority: LLMPriority, user=None) -> None:
+    """
+    Classifies the LLM calls made by the rest of the current request. Meant for
+    route handlers: the request's task, and the streaming response task that is
+    started from it, inherit the value.
+    """
+    _request_context.set(LLMRequestContext(priority, getattr(user, "id", None), getattr(user, "department", None) or None))
+
+
+@contextmanager
+def llm_request_context(priority: LLMPriority, user=None):
+    """Classifies the LLM calls made inside the block."""
+    token = _request_context.set(LLMRequestContext(priority, getattr(user, "id", None), getattr(user, "department", None) or None))
+    try:
+        yield
+    finally:
+        _request_context.reset(token)
+
+
+@dataclass
+class _Waiter:
+    context: LLMRequestContext
+    sequence: int
+    loop: asyncio.AbstractEventLoop
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.monotonic)
+    granted: bool = False
+
+
+class LLMDispatcher:
+    """
+    Central admission control for LLM calls to Ollama.
+
+    - At most LLM_MAX_CONCURRENCY calls run at once. Waiting calls are admitted by
+      priority class (interactive > agent > ingestion), first come first served
+      within a class.
+    - Ingestion never holds more than LLM_INGESTION_MAX_CONCURRENCY slots, so chat
+      always finds free capacity soon.
+    - One user may run LLM_MAX_CONCURRENCY_PER_USER calls, one department
+      LLM_MAX_CONCURRENCY_PER_DEPARTMENT (0 disables a cap). A capped caller does
+      not block others queued behind it.
+    - Time spent queued is recorded per class (see stats()).
+    - A caller cancelled while queued (e.g. its client disconnected) leaves the
+      queue; a running call releases its slot when it ends or is cancelled.
+
+    State is guarded by a threading lock because background embedding runs on
+    its own event loop in a worker thread.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(LLMDispatcher, cls).__new__(cls)
+                cls._instance._lock = threading.Lock()
+                cls._instance._waiters: List[_Waiter] = []
+                cls._instance._sequence = 0
+                cls._instance._running = Counter()  # priority -> running calls
+                cls._instance._running_by_user = Counter()
+                cls._instance._running_by_department = Counter()
+                cls._instance._waits = {priority: deque() for priority in LLMPriority}  # (monotonic time, seconds queued)
+                cls._instance._admitted = Counter()
+                cls._instance._cancelled = Counter()
+        return cls._instance
+
+    # --- Admission ---
+
+    def _can_run(self, context: LLMRequestContext) -> bool:
+        if sum(self._running.values()) >= settings.LLM_MAX_CONCURRENCY:
+            return False
+        if context.priority == LLMPriority.INGESTION and self._running[LLMPriority.INGESTION] >= settings.LLM_INGESTION_MAX_CONCURRENCY:
+            return False
+        user_cap = settings.LLM_MAX_CONCURRENCY_PER_USER
+        if context.user_id is not None and user_cap > 0 and self._running_by_user[context.user_id] >= user_cap:
+            return False
+        department_cap = settings.LLM_MAX_CONCURRENCY_PER_DEPARTMENT
+        if context.department and department_cap > 0 and self._running_by_department[context.department] >= department_cap:
+            return False
+        return True
+
+    def _occupy(self, context: LLMRequestContext) -> None:
+        self._running[context.priority] += 1
+        if context.user_id is not None:
+            self._running_by_user[context.user_id] += 1
+        if context.department:
+            self._running_by_department[context.department] += 1
+
+    def _dispatch_locked(self) -> None:
+        """Admits queued callers in priority order while capacity lasts. Caller holds the lock."""
+        for waiter in sorted(self._waiters, key=lambda w: (w.context.priority, w.sequence)):
+            if sum(self._running.values()) >= settings.LLM_MAX_CONCURRENCY:
+                break
+            if self._can_run(waiter.context):
+                self._occupy(waiter.context)
+                waiter.granted = True
+                self._waiters.remove(waiter)
+                waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+
+    def _release(self, context: LLMRequestContext) -> None:
+        with self._lock:
+            self._running[context.priority] -= 1
+            if context.user_id is not None:
+                self._running_by_user[context.user_id] -= 1
+                if self._running_by_user[context.user_id] <= 0:
+                    del self._running_by_user[context.user_id]
+            if context.department:
+                self._running_by_department[context.department] -= 1
+                if self._running_by_department[context.department] <= 0:
+                    del self._running_by_department[context.department]
+            self._dispatch_locked()
+
+    def _record_wait(self, priority: LLMPriority, seconds: float, label: str) -> None:
+        with self._lock:
+            self._admitted[priority] += 1
+            self._waits[priority].append((time.monotonic(), seconds))
+            self._trim_waits(priority)
+        if seconds >= settings.LLM_QUEUE_WAIT_LOG_SECONDS:
+            logger.info(f"LLM call '{label}' ({priority.name.lower()}) waited {seconds:.1f}s for a slot.")
+
+    def _trim_waits(self, priority: LLMPriority) -> None:
+        cutoff = time.monotonic() - settings.LLM_METRICS_WINDOW_SECONDS
+        waits = self._waits[priority]
+        while waits and waits[0][0] < cutoff:
+            waits.popleft()
+
+    @asynccontextmanager
+    async def slot(self, label: str = "llm"):
+        """Waits for permission to run one LLM call (or stream) for the current request context."""
+        context = _request_context.get()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._sequence += 1
+            waiter = _Waiter(context, self._sequence, loop, loop.create_future())
+            self._waiters.append(waiter)
+            self._dispatch_locked()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._waiters.remove(waiter)
+                self._cancelled[context.priority] += 1
+            if granted:
+                self._release(context)
+            raise
+
+        self._record_wait(context.priority, time.monotonic() - waiter.enqueued, label)
+        try:
+            yield
+        finally:
+            self._release(context)
+
+    # --- Metrics ---
+
+    def stats(self) -> Dict[str, dict]:
+        """Running and queued calls and queue-time percentiles (seconds) per priority class."""
+        with self._lock:
+            queued = Counter(waiter.context.priority for waiter in self._waiters)
+            result = {}
+            for priority in LLMPriority:
+                self._trim_waits(priority)
+                waits = sorted(seconds for _, seconds in self._waits[priority])
+                result[priority.name.lower()] = {
+                    "running": self._running[priority],
+                    "queued": queued[priority],
+                    "admitted": self._admitted[priority],
+                    "cancelled": self._cancelled[priority],
+                    "wait_p50": round(_percentile(waits, 0.5), 3),
+                    "wait_p95": round(_percentile(waits, 0.95), 3),
+                    "wait_max": round(waits[-1], 3) if waits else 0.0,
+                }
+        return result
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, math.ceil(fraction * len(values)) - 1)]
+
+
+def get_llm_dispatcher() -> LLMDispatcher:
+    """Gets the singleton instance of the LLMDispatcher."""
+    return LLMDispatcher()
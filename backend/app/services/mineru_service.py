@@ -27,6 +27,7 @@ import time
 from typing import Optional, Dict, Any, List, Tuple
 
 from app.core.config import settings
+from app.core.http_clients import MINERU, get_aiohttp_session, get_aiohttp_timeout
 
 logger = logging.getLogger(__name__)
 
@@ -67,7 +68,7 @@ class OptimizedVLMProcessor:
         self.base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
         
         # 配置参数
-        self.timeout_seconds = 600  # 10分钟
+        self.timeout_seconds = settings.MINERU_PARSE_TIMEOUT_SECONDS
         self.max_retries = 3
         self.retry_delay = 2.0
         
@@ -76,27 +77,9 @@ class OptimizedVLMProcessor:
         logger.info(f"超时设置: {self.timeout_seconds}秒")
         logger.info(f"重试设置: {self.max_retries}次")
     
-    def _create_session(self) -> aiohttp.ClientSession:
-        """创建HTTP会话"""
-        timeout = aiohttp.ClientTimeout(total=self.timeout_seconds)
-        connector = aiohttp.TCPConnector(
-            limit=10,
-            limit_per_host=5,
-            keepalive_timeout=60,
-            enable_cleanup_closed=True
-        )
-        
-        headers = {
-            "Content-Type": "application/json",
-            "User-Agent": "RostiAI-MinerU-VLM/1.0",
-            "Accept": "application/json"
-        }
-        
-        return aiohttp.ClientSession(
-            timeout=timeout,
-            connector=connector,
-            headers=headers
-        )
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的HTTP会话（连接池由应用生命周期管理，调用方不得关闭）"""
+        return get_aiohttp_session(MINERU)
     
     async def _check_server_health(self) -> bool:
         """检查服务器健康状态"""
@@ -106,15 +89,15 @@ class OptimizedVLMProcessor:
         health_endpoints = ["/health", "/api/health", "/api/v1/health", "/status", "/"]
         
         try:
-            async with self._create_session() as session:
-                for endpoint in health_endpoints:
-                    try:
-                        async with session.get(f"{self.base_url}{endpoint}", timeout=aiohttp.ClientTimeout(total=10)) as response:
-                            if response.status == 200:
-                                logger.debug(f"服务器健康检查成功: {endpoint}")
-                                return True
-                    except:
-                        continue
+            session = self._get_session()
+            for endpoint in health_endpoints:
+                try:
+                    async with session.get(f"{self.base_url}{endpoint}", timeout=get_aiohttp_timeout("health")) as response:
+                        if response.status == 200:
+                            logger.debug(f"服务器健康检查成功: {endpoint}")
+                            return True
+                except:
+                    continue
         except Exception as e:
             logger.error(f"服务器健康检查失败: {e}")
         
@@ -193,7 +176,7 @@ class OptimizedVLMProcessor:
             logger.debug(f"VLM请求: {endpoint}")
             start_time = time.time()
             
-            async with session.post(url, json=request_data) as response:
+            async with session.post(url, json=request_data, timeout=get_aiohttp_timeout("parse")) as response:
                 processing_time = time.time() - start_time
                 
                 if response.status == 200:
@@ -318,24 +301,24 @@ class OptimizedVLMProcessor:
         request_formats = self._prepare_vlm_request(file_bytes, filename)
         
         # 尝试不同的API格式
-        async with self._create_session() as session:
-            for i, format_config in enumerate(request_formats, 1):
-                logger.debug(f"尝试格式 {i}/{len(request_formats)}: {format_config['endpoint']}")
-                
-                result = await self._vlm_parse_request(
-                    session, 
-                    format_config["endpoint"], 
-                    format_config["data"],
-                    filename
-                )
-                
-                if result:
-                    logger.info(f"VLM处理成功: {filename} (格式 {i})")
-                    return result
-                
-                # 在格式之间短暂等待
-                if i < len(request_formats):
-                    await asyncio.sleep(0.5)
+        session = self._get_session()
+        for i, format_config in enumerate(request_formats, 1):
+            logger.debug(f"尝试格式 {i}/{len(request_formats)}: {format_config['endpoint']}")
+            
+            result = await self._vlm_parse_request(
+                session, 
+                format_config["endpoint"], 
+                format_config["data"],
+                filename
+            )
+            
+            if result:
+                logger.info(f"VLM处理成功: {filename} (格式 {i})")
+                return result
+            
+            # 在格式之间短暂等待
+            if i < len(request_formats):
+                await asyncio.sleep(0.5)
         
         logger.error(f"所有VLM格式都失败: {filename}")
         return None
@@ -23,6 +23,7 @@ from pathlib import Path
 import urllib.parse
 
 from app.core.config import settings
+from app.core.http_clients import MINERU, get_aiohttp_session, get_aiohttp_timeout
 
 logger = logging.getLogger(__name__)
 
@@ -48,27 +49,15 @@ class OptimizedMinerUVLMClient:
         self.base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
         
         # 配置选项
-        self.timeout = aiohttp.ClientTimeout(total=600)  # 10分钟超时
+        self.timeout = get_aiohttp_timeout("parse")
         self.max_retries = 3
         self.retry_delay = 2.0  # 秒
         
         logger.info(f"初始化OptimizedMinerUVLMClient: {self.base_url}")
     
-    async def _create_session(self) -> aiohttp.ClientSession:
-        """创建HTTP客户端会话"""
-        return aiohttp.ClientSession(
-            timeout=self.timeout,
-            connector=aiohttp.TCPConnector(
-                limit=10,
-                limit_per_host=5,
-                keepalive_timeout=60,
-                enable_cleanup_closed=True
-            ),
-            headers={
-                "Content-Type": "application/json",
-                "User-Agent": "RostiAI-MinerU-VLM-Client/1.0"
-            }
-        )
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的HTTP会话（连接池由应用生命周期管理，调用方不得关闭）"""
+        return get_aiohttp_session(MINERU)
     
     async def check_server_health(self) -> Tuple[bool, Dict[str, Any]]:
         """
@@ -79,21 +68,21 @@ class OptimizedMinerUVLMClient:
         """
         health_endpoints = ["/health", "/api/health", "/api/v1/health", "/status"]
         
-        async with await self._create_session() as session:
-            for endpoint in health_endpoints:
-                try:
-                    async with session.get(f"{self.base_url}{endpoint}") as response:
-                        if response.status == 200:
-                            try:
-                                data = await response.json()
-                                logger.info(f"服务器健康检查成功: {endpoint}")
-                                return True, data
-                            except:
-                                logger.info(f"服务器响应正常但非JSON格式: {endpoint}")
-                                return True, {"status": "ok", "endpoint": endpoint}
-                except Exception as e:
-                    logger.debug(f"健康检查失败 {endpoint}: {e}")
-                    continue
+        session = self._get_session()
+        for endpoint in health_endpoints:
+            try:
+                async with session.get(f"{self.base_url}{endpoint}", timeout=get_aiohttp_timeout("health")) as response:
+                    if response.status == 200:
+                        try:
+                            data = await response.json()
+                            logger.info(f"服务器健康检查成功: {endpoint}")
+                            return True, data
+                        except:
+                            logger.info(f"服务器响应正常但非JSON格式: {endpoint}")
+                            return True, {"status": "ok", "endpoint": endpoint}
+            except Exception as e:
+                logger.debug(f"健康检查失败 {endpoint}: {e}")
+                continue
         
         logger.warning("所有健康检查端点都失败")
         return False, {}
@@ -233,7 +222,7 @@ class OptimizedMinerUVLMClient:
             logger.info(f"开始VLM解析: {filename} -> {endpoint}")
             start_time = time.time()
             
-            async with session.post(url, json=request_data) as response:
+            async with session.post(url, json=request_data, timeout=self.timeout) as response:
                 processing_time = time.time() - start_time
                 
                 logger.info(f"API响应: {response.status} (耗时: {processing_time:.2f}s)")
@@ -339,33 +328,33 @@ class OptimizedMinerUVLMClient:
             logger.error(f"远程服务器不可用: {filename}")
             return None
         
-        async with await self._create_session() as session:
-            # 发现可用的解析端点
-            endpoint = await self._discover_parse_endpoint(session)
-            if not endpoint:
-                logger.error(f"未找到可用的解析端点: {filename}")
-                return None
-            
-            # 准备请求数据
-            main_request = self._prepare_request_data(file_bytes, filename)
-            
-            # 尝试主要格式
-            result = await self._parse_with_endpoint(session, endpoint, main_request, filename)
+        session = self._get_session()
+        # 发现可用的解析端点
+        endpoint = await self._discover_parse_endpoint(session)
+        if not endpoint:
+            logger.error(f"未找到可用的解析端点: {filename}")
+            return None
+        
+        # 准备请求数据
+        main_request = self._prepare_request_data(file_bytes, filename)
+        
+        # 尝试主要格式
+        result = await self._parse_with_endpoint(session, endpoint, main_request, filename)
+        if result:
+            return result
+        
+        # 尝试备用格式
+        logger.info(f"主要格式失败，尝试备用格式: {filename}")
+        alternative_formats = self._prepare_alternative_formats(file_bytes, filename)
+        
+        for i, alt_format in enumerate(alternative_formats, 1):
+            logger.info(f"尝试备用格式 {i}/{len(alternative_formats)}: {filename}")
+            result = await self._parse_with_endpoint(session, endpoint, alt_format, filename)
             if result:
                 return result
-            
-            # 尝试备用格式
-            logger.info(f"主要格式失败，尝试备用格式: {filename}")
-            alternative_formats = self._prepare_alternative_formats(file_bytes, filename)
-            
-            for i, alt_format in enumerate(alternative_formats, 1):
-                logger.info(f"尝试备用格式 {i}/{len(alternative_formats)}: {filename}")
-                result = await self._parse_with_endpoint(session, endpoint, alt_format, filename)
-                if result:
-                    return result
-            
-            logger.error(f"所有解析尝试都失败: {filename}")
-            return None
+        
+        logger.error(f"所有解析尝试都失败: {filename}")
+        return None
 
 
 # 工厂函数，与现有系统集成
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.database import get_db
+from app.services.ingestion_scheduler import get_ingestion_scheduler
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SyncJob:
+    rag_id: int
+    rag_name: str
+    file_info: dict  # {"path": ..., "etag": ...}
+    attempt: int = 0
+    ready_at: float = 0.0
+
+
+@dataclass
+class SyncStats:
+    started: float = field(default_factory=time.monotonic)
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+    retries: int = 0
+    bytes: int = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def files_per_minute(self) -> float:
+        return (self.succeeded + self.failed) / max(self.elapsed / 60, 1e-9)
+
+
+# Processes one attempt of a job with the worker's own DB session. Returns the number
+# of bytes handled, or None if the file was skipped (e.g. unsupported type). Raises on failure.
+ProcessFn = Callable[[SyncJob, Session], Awaitable[Optional[int]]]
+# Called once a job has used up all its attempts.
+FailFn = Callable[[SyncJob, Session, Exception], None]
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter: uniform in [0, min(max, base * 2^attempt)]."""
+    ceiling = min(settings.MINIO_SYNC_RETRY_MAX_SECONDS, settings.MINIO_SYNC_RETRY_BASE_SECONDS * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+class SyncExecutor:
+    """
+    Runs sync jobs on MINIO_SYNC_CONCURRENCY workers with round-robin fairness
+    across RAG items: every RAG item with pending work gets a turn before any
+    gets a second one, so one huge subdirectory cannot starve the others.
+
+    Failed attempts are re-queued with exponential backoff and jitter instead of
+    blocking a worker while waiting. Each worker uses its own DB session.
+
+    Before each job a worker takes a slot from the IngestionScheduler, so the
+    pool runs at full width off-hours and shrinks while chat is busy. A worker
+    that has waited INGESTION_MAX_WAIT_SECONDS runs its next job anyway.
+    """
+
+    def __init__(self, process: ProcessFn, on_give_up: FailFn, concurrency: Optional[int] = None):
+        self._process = process
+        self._on_give_up = on_give_up
+        self.concurrency = max(1, concurrency or settings.MINIO_SYNC_CONCURRENCY)
+        self._queues: "OrderedDict[str, Deque[SyncJob]]" = OrderedDict()
+        self._turns: Deque[str] = deque()
+        self._in_flight = 0
+        self._scheduler = get_ingestion_scheduler()
+        self.stats = SyncStats()
+
+    @property
+    def pending(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def pending_by_rag(self) -> Dict[str, int]:
+        return {name: len(queue) for name, queue in self._queues.items() if queue}
+
+    def submit(self, rag_id: int, rag_name: str, file_info: dict) -> None:
+        self._enqueue(SyncJob(rag_id, rag_name, file_info))
+
+    def _enqueue(self, job: SyncJob) -> None:
+        queue = self._queues.setdefault(job.rag_name, deque())
+        if not queue and job.rag_name not in self._turns:
+            self._turns.append(job.rag_name)
+        queue.append(job)
+
+    def _next_job(self) -> Optional[SyncJob]:
+        """Takes the first ready job, visiting RAG items in round-robin order."""
+        now = time.monotonic()
+        for _ in range(len(self._turns)):
+            rag_name = self._turns.popleft()
+            queue = self._queues[rag_name]
+            ready = next((job for job in queue if job.ready_at <= now), None)
+            if ready is not None:
+                queue.remove(ready)
+            if queue:
+                self._turns.append(rag_name)
+            if ready is not None:
+                return ready
+        return None
+
+    def _next_ready_at(self) -> Optional[float]:
+        return min((job.ready_at for queue in self._queues.values() for job in queue), default=None)
+
+    async def _worker(self, deadline: float) -> None:
+        db: Session = next(get_db())
+        waiting_since = None  # When this worker last started waiting for a job to run
+        try:
+            while time.monotonic() < deadline:
+                if self.pending == 0 and self._in_flight == 0:
+                    return
+                if waiting_since is None:
+                    waiting_since = time.monotonic()
+                if not self._scheduler.try_acquire(self.concurrency):
+                    if time.monotonic() - waiting_since < settings.INGESTION_MAX_WAIT_SECONDS:
+                        # Throttled in favour of interactive chat
+                        await asyncio.sleep(min(settings.INGESTION_POLL_SECONDS, max(deadline - time.monotonic(), 0)))
+                        continue
+                    # Like IngestionScheduler.slot(): bulk work is slowed down, never starved
+                    logger.warning(f"No ingestion slot after {settings.INGESTION_MAX_WAIT_SECONDS}s; proceeding anyway.")
+                    self._scheduler.force_acquire()
+                job = self._next_job()
+                if job is None:
+                    self._scheduler.release()
+                    next_ready = self._next_ready_at()
+                    if next_ready is None and self._in_flight == 0:
+                        return
+                    # Wait for a backoff to expire or for a running job to finish (it may re-queue)
+                    wait = 1.0 if next_ready is None else next_ready - time.monotonic()
+                    await asyncio.sleep(min(max(wait, 0.05), 1.0, max(deadline - time.monotonic(), 0)))
+                    continue
+                waiting_since = None
+                self._in_flight += 1
+                try:
+                    await self._run_job(job, db)
+                finally:
+                    self._in_flight -= 1
+                    self._scheduler.release()
+        finally:
+            db.close()
+
+    async def _run_job(self, job: SyncJob, db: Session) -> None:
+        path = job.file_info["path"]
+        max_retries = max(settings.MINIO_SYNC_MAX_RETRIES, 1)
+        try:
+            logger.info(f"[Attempt {job.attempt + 1}/{max_retries}] Processing file: {path}")
+            size = await self._process(job, db)
+            if size is None:
+                self.stats.skipped += 1
+            else:
+                self.stats.succeeded += 1
+                self.stats.bytes += size
+        except Exception as e:
+            db.rollback()
+            job.attempt += 1
+            if job.attempt < max_retries:
+                delay = backoff_delay(job.attempt - 1)
+                logger.error(f"Failed to process file {path} on attempt {job.attempt}: {e}. Retrying in {delay:.1f}s.", exc_info=True)
+                job.ready_at = time.monotonic() + delay
+                self.stats.retries += 1
+                self._enqueue(job)
+            else:
+                logger.critical(f"All {max_retries} attempts failed for {path}. Giving up. Please check logs for details.")
+                self.stats.failed += 1
+                try:
+                    self._on_give_up(job, db, e)
+                except Exception as mark_error:
+                    logger.error(f"Could not record failure of {path}: {mark_error}", exc_info=True)
+
+    async def drain(self, deadline: float) -> bool:
+        """
+        Runs workers until every submitted job is done or the deadline passes.
+        Returns True if the queue was fully drained.
+        """
+        if self.pending:
+            await asyncio.gather(*(self._worker(deadline) for _ in range(self.concurrency)))
+        return self.pending == 0
+
+    def summary(self) -> str:
+        stats = self.stats
+        return (
+            f"{stats.succeeded} succeeded, {stats.failed} failed, {stats.skipped} skipped, {stats.retries} retries, "
+            f"{stats.bytes / (1024 * 1024):.1f} MB in {stats.elapsed:.0f}s ({stats.files_per_minute:.1f} files/min, "
+            f"{self.concurrency} workers); {self.pending} file(s) still queued"
+        )
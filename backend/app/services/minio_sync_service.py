@@ -2,39 +2,62 @@
 # mailbox: admin@de-manufacturing.cn
 
 import logging
-from minio import Minio
 from ..core.config import settings
-import asyncio
-from app.models.database import get_db
+from ..core.minio_client import get_customer_minio_client, run_minio
+import itertools
+import json
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import aiofiles
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote_plus
+from app.models.database import get_db, FileGist
 from app.services import rag_file_service
-from app.rag_knowledge.generic_knowledge import process_and_embed_pdf # Assuming PDF for now
+from app.rag_knowledge.generic_knowledge import process_and_embed_pdf, process_markdown_file, _process_image_with_paddle
+from app.services.minio_sync_executor import SyncExecutor, SyncJob
+from app.services.ingestion_scheduler import get_ingestion_scheduler
+from app.tools.word import extract_word_content_from_bytes
+from app.tools.exlsx import extract_excel_content_from_bytes
+from app.utils.redis_utils import get_redis_client_from_pool
 from sqlalchemy.orm import Session
 import os
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
-# --- Customer MinIO Client ---
-_customer_minio_client = None
+# Heuristic list of extensions to identify file-like directory names
+FILE_LIKE_EXTENSIONS = {'.js', '.docx', '.pdf', '.xls', '.xlsx', '.doc', '.pub'}
+DEFAULT_RAG_NAME = "minio_root_files" # RAG name for ungrouped files
 
-def get_customer_minio_client():
-    """Initializes and returns a Minio client for the customer's instance."""
-    global _customer_minio_client
-    if _customer_minio_client is None:
-        try:
-            endpoint = settings.CUSTOMER_MINIO_ENDPOINT.replace("http://", "").replace("https://", "")
-            _customer_minio_client = Minio(
-                endpoint,
-                access_key=settings.CUSTOMER_MINIO_ACCESS_KEY,
-                secret_key=settings.CUSTOMER_MINIO_SECRET_KEY,
-                secure=settings.CUSTOMER_MINIO_ENDPOINT.startswith("https://")
-            )
-            logger.info(f"Successfully initialized customer MinIO client for endpoint: {endpoint}")
-        except Exception as e:
-            logger.error(f"Failed to initialize customer MinIO client: {e}", exc_info=True)
-            _customer_minio_client = "failed_to_initialize"
-    
-    return _customer_minio_client if _customer_minio_client != "failed_to_initialize" else None
+# Redis keys for incremental sync state
+CHECKPOINT_KEY = "minio_sync:checkpoint:{bucket}"
+EVENT_QUEUE_KEY = "minio_sync:events:{bucket}"
+REPORT_KEY = "minio_sync:report:{night}"
+
+# File types the sync can embed
+MARKDOWN_EXTENSIONS = {'.md', '.markdown', '.txt'}
+WORD_EXTENSIONS = {'.doc', '.docx'}
+EXCEL_EXTENSIONS = {'.xls', '.xlsx'}
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.webp'}
+SUPPORTED_EXTENSIONS = {'.pdf'} | MARKDOWN_EXTENSIONS | WORD_EXTENSIONS | EXCEL_EXTENSIONS | IMAGE_EXTENSIONS
+
+
+def get_group_name(object_name: str) -> str:
+    """Returns the RAG item name for an object: its top-level directory, or the default group."""
+    parts = object_name.split('/', 1)
+    # Check if there is a top-level directory
+    if len(parts) > 1 and parts[0]:
+        potential_group = parts[0]
+        # Check if the directory name looks like a file
+        _, ext = os.path.splitext(potential_group)
+        if ext.lower() not in FILE_LIKE_EXTENSIONS:
+            return potential_group # It's a real directory
+    return DEFAULT_RAG_NAME
 
 async def list_files_from_customer_minio() -> dict:
     """
@@ -51,33 +74,16 @@ async def list_files_from_customer_minio() -> dict:
         bucket_name = settings.CUSTOMER_MINIO_BUCKET_NAME
         logger.info(f"Listing files and grouping by subdirectory from bucket: {bucket_name}")
         
-        loop = asyncio.get_running_loop()
-        objects = await loop.run_in_executor(
-            None,
-            lambda: list(client.list_objects(bucket_name, recursive=True))
-        )
+        objects = await run_minio(lambda: list(client.list_objects(bucket_name, recursive=True)))
         
         grouped_files = {}
-        # Heuristic list of extensions to identify file-like directory names
-        FILE_LIKE_EXTENSIONS = {'.js', '.docx', '.pdf', '.xls', '.xlsx', '.doc', '.pub'}
-        DEFAULT_RAG_NAME = "minio_root_files" # RAG name for ungrouped files
 
         for obj in objects:
             if obj.is_dir:
                 continue
             
             object_name = obj.object_name
-            parts = object_name.split('/', 1)
-            
-            group_name = DEFAULT_RAG_NAME
-            
-            # Check if there is a top-level directory
-            if len(parts) > 1 and parts[0]:
-                potential_group = parts[0]
-                # Check if the directory name looks like a file
-                _, ext = os.path.splitext(potential_group)
-                if ext.lower() not in FILE_LIKE_EXTENSIONS:
-                    group_name = potential_group # It's a real directory
+            group_name = get_group_name(object_name)
             
             if group_name == DEFAULT_RAG_NAME:
                  logger.info(f"File '{object_name}' is being grouped into default RAG '{DEFAULT_RAG_NAME}'.")
@@ -98,94 +104,209 @@ async def list_files_from_customer_minio() -> dict:
         logger.error(f"An error occurred while listing files from customer MinIO: {e}", exc_info=True)
         return {}
 
-async def process_single_file(file_info: dict, db: Session, rag_id: int, rag_name: str):
+def _mongo_names(rag_name: str) -> Tuple[str, str, str]:
+    """Milvus collection, Mongo database and Mongo collection names of a RAG item (same scheme as the upload path)."""
+    sanitized_rag_name = rag_name.lower().replace(" ", "_")
+    return f"rag_{sanitized_rag_name}", f"rag_db_{sanitized_rag_name}", f"documents_{sanitized_rag_name}"
+
+
+async def _embed_text_as_markdown(text: str, file_path: str, milvus_collection_name: str, mongo_db_name: str, mongo_collection_name: str) -> int:
     """
-    Downloads, processes, and embeds a single file with retry logic.
+    Embeds extracted text through the markdown pipeline. The chunks are stored under
+    the MinIO object path (not the temporary markdown copy), so purges match them and
+    re-syncing a changed object replaces them.
+    """
+    work_dir = tempfile.mkdtemp(prefix="minio_sync_")
+    try:
+        basename = os.path.basename(file_path)
+        md_path = os.path.join(work_dir, basename if basename.lower().endswith(".md") else f"{basename}.md")
+        async with aiofiles.open(md_path, "w", encoding="utf-8") as f:
+            await f.write(text)
+        image_dir = os.path.join(work_dir, "images")
+        os.makedirs(image_dir, exist_ok=True)
+        return await process_markdown_file(md_path, image_dir, milvus_collection_name, mongo_db_name, mongo_collection_name,
+                                           source_path=file_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+async def embed_file_bytes(file_bytes: bytes, file_path: str, rag_id: int, rag_name: str) -> Optional[int]:
+    """
+    Embeds a downloaded file into the RAG item's Milvus collection and Mongo database.
+    Returns the number of chunks, or None if the file type is not supported.
+    """
+    file_extension = os.path.splitext(file_path)[1].lower()
+    milvus_collection_name, mongo_db_name, mongo_collection_name = _mongo_names(rag_name)
+    logger.info(f"Embedding '{file_path}' into Milvus collection '{milvus_collection_name}' and Mongo DB '{mongo_db_name}'")
+
+    if file_extension == ".pdf":
+        return await process_and_embed_pdf(
+            file_bytes=file_bytes,
+            original_filename=file_path,
+            milvus_collection_name=milvus_collection_name,
+            mongo_db_name=mongo_db_name,
+            rag_id=rag_id,
+            mongo_collection_name=mongo_collection_name,
+        )
+
+    if file_extension in MARKDOWN_EXTENSIONS:
+        text = file_bytes.decode("utf-8", errors="replace")
+    elif file_extension in WORD_EXTENSIONS:
+        text = await extract_word_content_from_bytes(file_bytes)
+        if text and (text.startswith("错误") or text.startswith("无法")):
+            raise ValueError(text[:200])
+    elif file_extension in EXCEL_EXTENSIONS:
+        text = await extract_excel_content_from_bytes(file_bytes, os.path.basename(file_path))
+    elif file_extension in IMAGE_EXTENSIONS:
+        text = await _process_image_with_paddle(file_bytes, os.path.basename(file_path))
+    else:
+        return None
+
+    if not text or not text.strip():
+        raise ValueError(f"No text could be extracted from {file_path}.")
+    return await _embed_text_as_markdown(text, file_path, milvus_collection_name, mongo_db_name, mongo_collection_name)
+
+
+async def process_single_file(job: SyncJob, db: Session) -> Optional[int]:
+    """
+    One attempt at downloading, processing and embedding a file. Raises on
+    failure; retries and backoff are handled by the SyncExecutor.
+    Returns the file size, or None if the file type is unsupported.
     """
     client = get_customer_minio_client()
     if not client:
-        return
+        raise RuntimeError("Customer MinIO client is not available.")
 
-    file_path = file_info["path"]
-    file_etag = file_info["etag"]
-    max_retries = settings.MINIO_SYNC_MAX_RETRIES
-    
-    for attempt in range(max_retries):
+    file_path = job.file_info["path"]
+    file_etag = job.file_info["etag"]
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension not in SUPPORTED_EXTENSIONS:
+        logger.warning(f"Skipping file with unsupported extension '{file_extension}': {file_path}")
+        return None # Not an error, just unsupported type
+
+    # 1. Download file from customer MinIO
+    def _download() -> bytes:
+        response = client.get_object(settings.CUSTOMER_MINIO_BUCKET_NAME, file_path)
         try:
-            logger.info(f"[Attempt {attempt + 1}/{max_retries}] Processing file: {file_path}")
-            
-            # 1. Download file from customer MinIO
-            loop = asyncio.get_running_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: client.get_object(settings.CUSTOMER_MINIO_BUCKET_NAME, file_path)
-            )
-            file_bytes = response.read()
+            return response.read()
+        finally:
             response.close()
             response.release_conn()
-            
-            logger.info(f"Successfully downloaded {file_path} ({len(file_bytes)} bytes).")
 
-            # 2. Determine file type and call appropriate processor
-            # For now, we assume all are PDFs as per generic_knowledge structure.
-            # This can be expanded with a file type dispatcher.
-            file_extension = os.path.splitext(file_path)[1].lower()
-            
-            if file_extension == ".pdf":
-                # This is where we call the existing embedding pipeline
-                # We need to construct the dynamic collection/db names
-                sanitized_rag_name = rag_name.lower().replace(" ", "_")
-                milvus_collection_name = f"rag_{sanitized_rag_name}"
-                mongo_db_name = f"rag_db_{sanitized_rag_name}"
-
-                logger.info(f"Embedding '{file_path}' into Milvus collection '{milvus_collection_name}' and Mongo DB '{mongo_db_name}'")
-                
-                chunk_count = await process_and_embed_pdf(
-                    file_bytes=file_bytes,
-                    original_filename=file_path,
-                    milvus_collection_name=milvus_collection_name,
-                    mongo_db_name=mongo_db_name,
-                    rag_id=rag_id
-                )
-                
-                if chunk_count > 0:
-                    logger.info(f"Successfully embedded {chunk_count} chunks for {file_path}.")
-                    # 3. Create/Update file_gist record
-                    rag_file_service.create_or_update_file_gist(
-                        db=db,
-                        rag_id=rag_id,
-                        filename=file_path,
-                        file_path_in_minio=file_path, # Storing the path in customer's minio
-                        etag=file_etag,
-                        is_third_party=True # Mark as a third-party file
-                    )
-                    logger.info(f"Successfully updated file_gist for {file_path}.")
-                    return # Success, exit retry loop
-                else:
-                    raise ValueError("Embedding process returned 0 chunks, indicating a failure.")
-            else:
-                logger.warning(f"Skipping file with unsupported extension '{file_extension}': {file_path}")
-                return # Not an error, just unsupported type
+    file_bytes = await run_minio(_download)
+    logger.info(f"Successfully downloaded {file_path} ({len(file_bytes)} bytes).")
 
-        except Exception as e:
-            logger.error(f"Failed to process file {file_path} on attempt {attempt + 1}: {e}", exc_info=True)
-            if attempt < max_retries - 1:
-                logger.info(f"Retrying in 10 seconds...")
-                await asyncio.sleep(10)
-            else:
-                logger.critical(f"All {max_retries} attempts failed for {file_path}. Giving up. Please check logs for details.")
-                # Optionally update a status in the database to 'failed' for manual intervention
-                rag_file_service.create_or_update_file_gist(
-                    db=db,
-                    rag_id=rag_id,
-                    filename=file_path,
-                    file_path_in_minio=file_path,
-                    etag=f"FAILED:{file_etag}", # Mark as failed
-                    is_third_party=True
-                )
+    # 2. Process with the pipeline for its file type
+    chunk_count = await embed_file_bytes(file_bytes, file_path, job.rag_id, job.rag_name)
+    if not chunk_count:
+        raise ValueError("Embedding process returned 0 chunks, indicating a failure.")
+    logger.info(f"Successfully embedded {chunk_count} chunks for {file_path}.")
+
+    # 3. Create/Update file_gist record
+    rag_file_service.create_or_update_file_gist(
+        db=db,
+        rag_id=job.rag_id,
+        filename=file_path,
+        file_path_in_minio=file_path, # Storing the path in customer's minio
+        etag=file_etag,
+        is_third_party=True # Mark as a third-party file
+    )
+    logger.info(f"Successfully updated file_gist for {file_path}.")
+    return len(file_bytes)
+
+
+def mark_file_failed(job: SyncJob, db: Session, error: Exception):
+    """Records a file that failed every attempt so it is retried on a later run and visible for manual intervention."""
+    rag_file_service.create_or_update_file_gist(
+        db=db,
+        rag_id=job.rag_id,
+        filename=job.file_info["path"],
+        file_path_in_minio=job.file_info["path"],
+        etag=f"FAILED:{job.file_info['etag']}", # Mark as failed
+        is_third_party=True
+    )
+
+
+def new_sync_executor() -> SyncExecutor:
+    return SyncExecutor(process_single_file, mark_file_failed)
+
+
+def record_sync_report(executor: SyncExecutor, backlog: Dict[str, int]):
+    """
+    Logs a run's throughput and backlog and adds it to the night's totals in Redis
+    (hash minio_sync:report:<date the window started>), together with the
+    ingestion scheduler's estimate of whether the known backlog (queued files and
+    pending bucket events) finishes before the night window ends.
+    """
+    stats = executor.stats
+    logger.info(f"MinIO sync run: {executor.summary()}. Backlog: {backlog}.")
+    estimate = get_ingestion_scheduler().estimate_backlog(
+        backlog.get("queued", 0) + backlog.get("pending_events", 0),
+        stats.files_per_minute if stats.succeeded + stats.failed else _recent_files_per_minute(),
+    )
+    if estimate["will_finish"]:
+        logger.info(f"MinIO sync backlog estimate: {estimate}")
+    else:
+        logger.warning(f"MinIO sync backlog is not expected to finish in the current window: {estimate}")
+    redis_client = get_redis_client_from_pool()
+    night = (datetime.now(ZoneInfo(settings.TIMEZONE)) - timedelta(hours=12)).date().isoformat()
+    report_key = REPORT_KEY.format(night=night)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hincrby(report_key, "succeeded", stats.succeeded)
+        pipe.hincrby(report_key, "failed", stats.failed)
+        pipe.hincrby(report_key, "skipped", stats.skipped)
+        pipe.hincrby(report_key, "retries", stats.retries)
+        pipe.hincrby(report_key, "bytes", stats.bytes)
+        pipe.hincrbyfloat(report_key, "seconds", round(stats.elapsed, 1))
+        pipe.hset(report_key, mapping={f"backlog_{name}": value for name, value in backlog.items()})
+        pipe.hset(report_key, mapping={
+            "estimated_minutes": estimate["estimated_minutes"],
+            "window_minutes_left": estimate["window_minutes_left"],
+            "will_finish": int(estimate["will_finish"]),
+        })
+        pipe.expire(report_key, 30 * 24 * 3600)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not store MinIO sync report in Redis: {e}")
+
+
+def get_sync_reports(nights: int = 7) -> List[dict]:
+    """Returns the stored per-night sync reports, most recent first."""
+    redis_client = get_redis_client_from_pool()
+    today = (datetime.now(ZoneInfo(settings.TIMEZONE)) - timedelta(hours=12)).date()
+    reports = []
+    for offset in range(nights):
+        night = (today - timedelta(days=offset)).isoformat()
+        data = redis_client.hgetall(REPORT_KEY.format(night=night))
+        if data:
+            seconds = float(data.get("seconds", 0))
+            done = int(data.get("succeeded", 0)) + int(data.get("failed", 0))
+            reports.append({"night": night, **data, "files_per_minute": round(done / (seconds / 60), 1) if seconds else 0.0})
+    return reports
+
+
+def _recent_files_per_minute() -> float:
+    """Throughput of the most recent night with a report, for runs that processed nothing themselves."""
+    try:
+        reports = get_sync_reports(nights=7)
+    except Exception as e:
+        logger.warning(f"Could not read MinIO sync reports from Redis: {e}")
+        return 0.0
+    return next((report["files_per_minute"] for report in reports if report["files_per_minute"]), 0.0)
 
 
 async def sync_minio_bucket():
+    """
+    Entry point of the scheduled sync job. Dispatches on MINIO_SYNC_MODE.
+    """
+    if settings.MINIO_SYNC_MODE == "full":
+        await sync_minio_bucket_full()
+    else:
+        await sync_minio_bucket_incremental()
+
+
+async def sync_minio_bucket_full():
     """
     Main synchronization logic. Detects subdirectories in the customer MinIO bucket,
     ensures a corresponding RAG item exists (creating it if necessary), and syncs
@@ -193,6 +314,7 @@ async def sync_minio_bucket():
     """
     logger.info("Starting periodic MinIO bucket synchronization task...")
     db: Session = next(get_db())
+    executor = new_sync_executor()
     try:
         # 1. Get all files from MinIO, grouped by subdirectory
         grouped_remote_files = await list_files_from_customer_minio()
@@ -252,16 +374,263 @@ async def sync_minio_bucket():
             if not files_to_process:
                 logger.info(f"RAG item '{rag_item.name}' is up-to-date.")
             else:
-                logger.info(f"Found {len(files_to_process)} new/modified files to process for '{rag_item.name}'.")
+                logger.info(f"Found {len(files_to_process)} new/modified files to queue for '{rag_item.name}'.")
                 for file_info in files_to_process:
-                    await process_single_file(file_info, db, rag_item.id, rag_item.name)
-                logger.info(f"Finished processing files for '{rag_item.name}'.")
-            
-            logger.info(f"--- Completed sync for RAG Item: '{rag_item.name}' (ID: {rag_item.id}) ---")
+                    executor.submit(rag_item.id, rag_item.name, file_info)
+
+        # 3. Process all queued files concurrently, taking turns between RAG items
+        logger.info(f"Processing {executor.pending} queued file(s) with {executor.concurrency} workers: {executor.pending_by_rag()}")
+        await executor.drain(deadline=time.monotonic() + settings.MINIO_SYNC_RUN_BUDGET_SECONDS)
 
     except Exception as e:
         logger.error(f"An unexpected error occurred during the main sync task: {e}", exc_info=True)
     finally:
         db.close()
+        record_sync_report(executor, {"queued": executor.pending})
         logger.info("MinIO bucket synchronization task finished.")
 
+
+# --- Incremental sync ---
+
+def _get_or_create_rag_item(db: Session, rag_name: str, rag_items: dict):
+    """Finds or creates the RAG item for a group, memoized in `rag_items` for the run."""
+    if rag_name not in rag_items:
+        rag_item = rag_file_service.get_rag_item_by_name(db, rag_name)
+        if not rag_item:
+            logger.info(f"RAG item '{rag_name}' not found. Attempting to create it automatically.")
+            rag_item = rag_file_service.create_rag_item(
+                db,
+                name=rag_name,
+                description=f"Auto-created for MinIO sync from subdirectory '{rag_name}'"
+            )
+            if not rag_item:
+                logger.error(f"Failed to create RAG item for '{rag_name}'. Skipping its files.")
+        rag_items[rag_name] = rag_item
+    return rag_items[rag_name]
+
+
+def _list_page(client, bucket_name: str, prefix: Optional[str], start_after: Optional[str], page_size: int) -> Tuple[List[dict], Optional[str], bool]:
+    """
+    Lists up to `page_size` objects under `prefix` after `start_after` (keys are
+    returned in lexicographic order). Returns (files, last_key, exhausted). Blocking.
+    """
+    objects = list(itertools.islice(
+        client.list_objects(bucket_name, prefix=prefix or None, recursive=True, start_after=start_after or None),
+        page_size,
+    ))
+    files = [{"path": obj.object_name, "etag": obj.etag} for obj in objects if not obj.is_dir]
+    last_key = objects[-1].object_name if objects else start_after
+    return files, last_key, len(objects) < page_size
+
+
+def _list_top_level(client, bucket_name: str) -> Tuple[List[str], List[dict]]:
+    """Returns the bucket's top-level prefixes ("dir/") and the files stored at its root. Blocking."""
+    prefixes, root_files = [], []
+    for obj in client.list_objects(bucket_name, recursive=False):
+        if obj.is_dir:
+            prefixes.append(obj.object_name)
+        else:
+            root_files.append({"path": obj.object_name, "etag": obj.etag})
+    return prefixes, root_files
+
+
+def _queue_changed_files(db: Session, executor: SyncExecutor, remote_files: List[dict], rag_items: dict, queued_per_group: Dict[str, int]) -> int:
+    """
+    Compares one page of remote files with FileGist using a single query for
+    the stored ETags of all paths on the page, and queues new or modified files.
+    Returns the number of files queued.
+    """
+    if not remote_files:
+        return 0
+
+    paths = [f["path"] for f in remote_files]
+    stored_etags = {
+        (row.rag_id, row.filename): row.etag
+        for row in db.query(FileGist.rag_id, FileGist.filename, FileGist.etag).filter(
+            FileGist.is_third_party == True,
+            FileGist.filename.in_(paths),
+        )
+    }
+
+    grouped = defaultdict(list)
+    for remote_file in remote_files:
+        grouped[get_group_name(remote_file["path"])].append(remote_file)
+
+    limit = settings.MINIO_SYNC_FILES_PER_SUBDIR_LIMIT
+    queued = 0
+    for rag_name, files in grouped.items():
+        rag_item = _get_or_create_rag_item(db, rag_name, rag_items)
+        if not rag_item:
+            continue
+        changed = [f for f in files if stored_etags.get((rag_item.id, f["path"])) != f["etag"]]
+        if limit > 0:
+            remaining = max(limit - queued_per_group[rag_name], 0)
+            if len(changed) > remaining:
+                logger.info(f"Per-subdirectory limit reached for '{rag_name}': deferring {len(changed) - remaining} file(s) to a later run.")
+                changed = changed[:remaining]
+        for file_info in changed:
+            executor.submit(rag_item.id, rag_item.name, file_info)
+        queued_per_group[rag_name] += len(changed)
+        queued += len(changed)
+    return queued
+
+
+def _redis_call(redis_client, method: str, *args, **kwargs):
+    """Runs a Redis command for sync state, logging instead of raising if Redis is unavailable."""
+    if redis_client is None:
+        return None
+    try:
+        return getattr(redis_client, method)(*args, **kwargs)
+    except Exception as e:
+        logger.warning(f"Redis '{method}' failed for MinIO sync state: {e}")
+        return None
+
+
+async def _drain_event_queue(db: Session, executor: SyncExecutor, redis_client, bucket_name: str, deadline: float, rag_items: dict, queued_per_group: Dict[str, int]) -> int:
+    """Syncs objects reported by bucket notifications. Events are removed only after their files were handled."""
+    queue_key = EVENT_QUEUE_KEY.format(bucket=bucket_name)
+    page_size = settings.MINIO_SYNC_LIST_PAGE_SIZE
+    handled = 0
+    while time.monotonic() < deadline:
+        raw_events = _redis_call(redis_client, "lrange", queue_key, 0, page_size - 1)
+        if not raw_events:
+            break
+        # Several events for the same object collapse into the latest one
+        latest = {}
+        for raw in raw_events:
+            try:
+                event = json.loads(raw)
+                latest[event["path"]] = event
+            except (ValueError, KeyError):
+                logger.warning(f"Dropping malformed MinIO sync event: {raw!r}")
+        _queue_changed_files(db, executor, list(latest.values()), rag_items, queued_per_group)
+        if not await executor.drain(deadline):
+            break # Out of time; the events stay queued for the next run
+        _redis_call(redis_client, "ltrim", queue_key, len(raw_events), -1)
+        handled += len(raw_events)
+    if handled:
+        logger.info(f"Handled {handled} queued bucket event(s).")
+    return handled
+
+
+async def sync_minio_bucket_incremental():
+    """
+    Incremental synchronization that fits large buckets into the nightly window.
+
+    1. Objects reported by bucket notifications (see start_bucket_event_listener)
+       are synced first.
+    2. Each top-level directory is then listed page by page from its own
+       checkpoint (a Redis hash). Directories take turns one page at a time, and
+       the files queued from a round are processed by the SyncExecutor, which
+       also alternates between RAG items. Each page is compared against FileGist
+       with one query. Checkpoints advance once a round's files are processed.
+    3. A run stops after MINIO_SYNC_RUN_BUDGET_SECONDS and the next one resumes
+       from the checkpoints. When every directory has been listed to the end, the
+       checkpoints are cleared, so the next pass starts from the top and
+       reconciles anything the events missed.
+    """
+    logger.info("Starting incremental MinIO bucket synchronization task...")
+    client = get_customer_minio_client()
+    if not client:
+        logger.error("Cannot sync, customer MinIO client is not available.")
+        return
+
+    bucket_name = settings.CUSTOMER_MINIO_BUCKET_NAME
+    checkpoint_key = CHECKPOINT_KEY.format(bucket=bucket_name)
+    page_size = max(settings.MINIO_SYNC_LIST_PAGE_SIZE, 1)
+    deadline = time.monotonic() + settings.MINIO_SYNC_RUN_BUDGET_SECONDS
+    redis_client = get_redis_client_from_pool()
+    executor = new_sync_executor()
+    rag_items = {}
+    queued_per_group = defaultdict(int)
+    pages = scanned = 0
+    active_prefixes: List[str] = []
+
+    db: Session = next(get_db())
+    try:
+        await _drain_event_queue(db, executor, redis_client, bucket_name, deadline, rag_items, queued_per_group)
+
+        prefixes, root_files = await run_minio(_list_top_level, client, bucket_name)
+        checkpoints = _redis_call(redis_client, "hgetall", checkpoint_key) or {}
+        if checkpoints:
+            logger.info(f"Resuming listing of '{bucket_name}' from {len(checkpoints)} directory checkpoint(s).")
+        # Directories that already completed this pass have the "" marker
+        active_prefixes = [prefix for prefix in prefixes if checkpoints.get(prefix) != ""]
+        for i in range(0, len(root_files), page_size):
+            _queue_changed_files(db, executor, root_files[i:i + page_size], rag_items, queued_per_group)
+        scanned += len(root_files)
+
+        while active_prefixes and time.monotonic() < deadline:
+            round_checkpoints = {}
+            for prefix in list(active_prefixes):
+                remote_files, last_key, exhausted = await run_minio(_list_page, client, bucket_name, prefix, checkpoints.get(prefix), page_size)
+                _queue_changed_files(db, executor, remote_files, rag_items, queued_per_group)
+                pages += 1
+                scanned += len(remote_files)
+                round_checkpoints[prefix] = "" if exhausted else last_key
+            if not await executor.drain(deadline):
+                break # Checkpoints stay put, so the unfinished round is listed again next run
+            checkpoints.update(round_checkpoints)
+            active_prefixes = [prefix for prefix in active_prefixes if round_checkpoints[prefix] != ""]
+            if round_checkpoints:
+                _redis_call(redis_client, "hset", checkpoint_key, mapping=round_checkpoints)
+        await executor.drain(deadline)
+
+        if not active_prefixes and executor.pending == 0:
+            _redis_call(redis_client, "delete", checkpoint_key)
+            logger.info(f"Finished a full pass over bucket '{bucket_name}'. The next run starts a new pass.")
+        else:
+            logger.info(f"Run budget used up with {len(active_prefixes)} directory(ies) unfinished; the next run resumes from the checkpoints.")
+    except Exception as e:
+        logger.error(f"An unexpected error occurred during the incremental sync task: {e}", exc_info=True)
+    finally:
+        db.close()
+        logger.info(f"Incremental MinIO sync listed {pages} page(s) and compared {scanned} object(s).")
+        record_sync_report(executor, {
+            "queued": executor.pending,
+            "unfinished_directories": len(active_prefixes),
+            "pending_events": _redis_call(redis_client, "llen", EVENT_QUEUE_KEY.format(bucket=bucket_name)) or 0,
+        })
+
+
+# --- Bucket notifications ---
+
+_listener_thread: Optional[threading.Thread] = None
+_listener_stop = threading.Event()
+
+
+def _listen_for_bucket_events():
+    """Blocking loop that appends created objects of the customer bucket to the Redis event queue."""
+    bucket_name = settings.CUSTOMER_MINIO_BUCKET_NAME
+    queue_key = EVENT_QUEUE_KEY.format(bucket=bucket_name)
+    while not _listener_stop.is_set():
+        try:
+            client = get_customer_minio_client()
+            redis_client = get_redis_client_from_pool()
+            with client.listen_bucket_notification(bucket_name, events=("s3:ObjectCreated:*",)) as events:
+                logger.info(f"Listening for object events on customer bucket '{bucket_name}'.")
+                for event in events:
+                    if _listener_stop.is_set():
+                        return
+                    for record in event.get("Records", []):
+                        obj = record.get("s3", {}).get("object", {})
+                        if obj.get("key"):
+                            redis_client.rpush(queue_key, json.dumps({"path": unquote_plus(obj["key"]), "etag": obj.get("eTag")}))
+        except Exception as e:
+            logger.error(f"Bucket event listener failed, reconnecting in 30 seconds: {e}")
+            _listener_stop.wait(30)
+
+
+def start_bucket_event_listener():
+    """Starts the background listener if notifications are enabled. Call once at startup."""
+    global _listener_thread
+    if not settings.MINIO_SYNC_NOTIFICATIONS_ENABLED or get_customer_minio_client() is None:
+        return
+    if _listener_thread is None or not _listener_thread.is_alive():
+        _listener_stop.clear()
+        _listener_thread = threading.Thread(target=_listen_for_bucket_events, name="minio-sync-events", daemon=True)
+        _listener_thread.start()
+
+
+def stop_bucket_event_listener():
+    _listener_stop.set()
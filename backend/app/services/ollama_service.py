@@ -1,6 +1,10 @@
 import httpx
+import time
 from typing import List, Dict, Any
 from ..core.config import settings  # Global import for configuration settings
+from ..core.http_clients import get_ollama_client
+from .ingestion_scheduler import get_ingestion_scheduler
+from .llm_dispatcher import get_llm_dispatcher
 
 # Assuming OLLAMA_URL and OLLAMA_COT_MODE are available from environment variables
 OLLAMA_URL = settings.OLLAMA_SERVING_URL # Use the specific serving URL
@@ -34,16 +38,17 @@ async def get_chat_response(messages: List[Dict[str, str]]) -> str:
     }
 
     try:
-        async with httpx.AsyncClient() as client:
+        client = get_ollama_client(OLLAMA_CHAT_MODEL)
+        async with get_llm_dispatcher().slot("chat"):
             response = await client.post(api_endpoint, json=payload, timeout=60.0) # Add a timeout
-            response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-            response_data = response.json()
-            # Extract the content from the bot's message
-            if 'message' in response_data and 'content' in response_data['message']:
-                return response_data['message']['content']
-            else:
-                print(f"Unexpected response format from Ollama API: {response_data}")
-                return "Error: Received unexpected response from AI."
+        response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
+        response_data = response.json()
+        # Extract the content from the bot's message
+        if 'message' in response_data and 'content' in response_data['message']:
+            return response_data['message']['content']
+        else:
+            print(f"Unexpected response format from Ollama API: {response_data}")
+            return "Error: Received unexpected response from AI."
 
     except httpx.RequestError as e:
         print(f"HTTP request failed while calling Ollama API: {e}")
@@ -80,23 +85,32 @@ async def get_chat_response_stream(messages: List[Dict[str, str]], show_think_pr
         "options": options
     }
 
+    # Chat load signals for the ingestion scheduler: requests in flight and time to first token
+    ingestion_scheduler = get_ingestion_scheduler()
+    started = time.monotonic()
+    first_token = True
     try:
-        async with httpx.AsyncClient() as client:
-            async with client.stream("POST", api_endpoint, json=payload, timeout=300.0) as response:
-                response.raise_for_status()
-                async for chunk in response.aiter_lines():
-                    if chunk:
-                        try:
-                            import json
-                            data = json.loads(chunk)
-                            if 'message' in data and 'content' in data['message']:
-                                yield data['message']['content']
-                            elif 'done' in data and data['done']:
+        async with get_llm_dispatcher().slot("chat stream"):
+            with ingestion_scheduler.track_ollama_request():
+                client = get_ollama_client(model)
+                async with client.stream("POST", api_endpoint, json=payload, timeout=300.0) as response:
+                    response.raise_for_status()
+                    async for chunk in response.aiter_lines():
+                        if chunk:
+                            try:
+                                import json
+                                data = json.loads(chunk)
+                                if 'message' in data and 'content' in data['message']:
+                                    if first_token:
+                                        ingestion_scheduler.record_chat_latency(time.monotonic() - started)
+                                        first_token = False
+                                    yield data['message']['content']
+                                elif 'done' in data and data['done']:
+                                    pass
+                            except json.JSONDecodeError:
+                                pass
+                            except Exception:
                                 pass
-                        except json.JSONDecodeError:
-                            pass
-                        except Exception:
-                            pass
 
     except httpx.RequestError as e:
         yield f"Error: Could not connect to AI service. Details: {e}"
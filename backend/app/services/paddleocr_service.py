@@ -1,8 +1,12 @@
+import asyncio
 import httpx
+import io
 import logging
+from typing import List, Tuple
 from fastapi import UploadFile, HTTPException
 
 from app.core.config import settings
+from app.core.http_clients import PADDLEOCR, get_httpx_client, get_timeout
 
 logger = logging.getLogger(__name__)
 
@@ -31,29 +35,93 @@ async def call_paddleocr_service(file: UploadFile) -> dict | None:
     
     files = {'file': (file.filename, await file.read(), file.content_type)}
     
-    # Use a long timeout to accommodate large files and slow processing
-    timeout = httpx.Timeout(300.0) 
-    
-    async with httpx.AsyncClient(timeout=timeout) as client:
+    # Reuse the pooled client so consecutive figures share keep-alive connections.
+    client = get_httpx_client(PADDLEOCR)
+    try:
+        logger.info(f"Sending request to PaddleOCR service at {ocr_endpoint_url} for file: {file.filename}")
+        response = await client.post(ocr_endpoint_url, files=files, timeout=get_timeout("ocr"))
+        
+        # Raise an exception for 4xx (client) or 5xx (server) errors
+        response.raise_for_status()
+        
+        logger.info(f"Received successful response from PaddleOCR service for file: {file.filename}")
+        return response.json()
+        
+    except httpx.HTTPStatusError as e:
+        # Log specific HTTP errors from the service
+        logger.error(f"PaddleOCR service returned an error: {e.response.status_code} - {e.response.text}")
+        raise HTTPException(status_code=502, detail=f"Error from PaddleOCR service: {e.response.text}")
+    except httpx.RequestError as e:
+        # Handle network-level errors (connection refused, timeout, etc.)
+        logger.error(f"Could not connect to PaddleOCR service at {ocr_endpoint_url}. Error: {e}")
+        raise HTTPException(status_code=503, detail="Could not connect to PaddleOCR service.")
+    except Exception as e:
+        # Catch any other unexpected errors
+        logger.exception(f"An unexpected error occurred while calling PaddleOCR service for file {file.filename}.")
+        raise HTTPException(status_code=500, detail="An unexpected error occurred.")
+
+
+async def _call_paddleocr_batch(client: httpx.AsyncClient, url: str, batch: List[Tuple[str, bytes]]) -> List[str]:
+    """Sends one group of images to the /ocr/batch endpoint and returns their texts in order."""
+    files = [('files', (filename, image_bytes, 'image/png')) for filename, image_bytes in batch]
+    response = await client.post(url, files=files, timeout=get_timeout("ocr"))
+    response.raise_for_status()
+    results = sorted(response.json().get("results", []), key=lambda item: item.get("index", 0))
+    texts = [item.get("text") or "" for item in results]
+    # Pad defensively so the caller can always zip results with its inputs.
+    return (texts + [""] * len(batch))[:len(batch)]
+
+
+async def call_paddleocr_batch_service(images: List[Tuple[str, bytes]], concurrency: int = 1) -> List[str]:
+    """
+    Performs OCR on many images, grouping them into PADDLEOCR_BATCH_SIZE images per request
+    to the PaddleOCR service's /ocr/batch endpoint.
+
+    Args:
+        images: (filename, image bytes) pairs, e.g. all figures of one document.
+        concurrency: How many batch requests may be in flight at the same time.
+
+    Returns:
+        The recognized text for each image, in input order. An image whose batch failed
+        gets an empty string so callers can fall back to other recognizers.
+    """
+    if not images:
+        return []
+    if not settings.PADDLEOCR_API_URL:
+        logger.error("PADDLEOCR_API_URL is not configured in the environment.")
+        raise HTTPException(status_code=500, detail="PaddleOCR service is not configured.")
+
+    batch_endpoint_url = f"{settings.PADDLEOCR_API_URL}/ocr/batch"
+    batch_size = max(1, settings.PADDLEOCR_BATCH_SIZE)
+    client = get_httpx_client(PADDLEOCR)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_batch(batch: List[Tuple[str, bytes]]) -> List[str]:
+        async with semaphore:
+            try:
+                logger.info(f"Sending batch of {len(batch)} images to PaddleOCR service at {batch_endpoint_url}")
+                return await _call_paddleocr_batch(client, batch_endpoint_url, batch)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code in (404, 405):
+                    # Older service images only expose /ocr; fall back to one request per image.
+                    logger.warning("PaddleOCR service has no /ocr/batch endpoint. Falling back to per-image requests.")
+                    return await _call_paddleocr_one_by_one(batch)
+                logger.error(f"PaddleOCR batch request failed: {e.response.status_code} - {e.response.text}")
+            except httpx.RequestError as e:
+                logger.error(f"Could not connect to PaddleOCR service at {batch_endpoint_url}. Error: {e}")
+            return [""] * len(batch)
+
+    batches = [images[start:start + batch_size] for start in range(0, len(images), batch_size)]
+    results = await asyncio.gather(*(run_batch(batch) for batch in batches))
+    return [text for batch_texts in results for text in batch_texts]
+
+
+async def _call_paddleocr_one_by_one(batch: List[Tuple[str, bytes]]) -> List[str]:
+    texts = []
+    for filename, image_bytes in batch:
         try:
-            logger.info(f"Sending request to PaddleOCR service at {ocr_endpoint_url} for file: {file.filename}")
-            response = await client.post(ocr_endpoint_url, files=files)
-            
-            # Raise an exception for 4xx (client) or 5xx (server) errors
-            response.raise_for_status()
-            
-            logger.info(f"Received successful response from PaddleOCR service for file: {file.filename}")
-            return response.json()
-            
-        except httpx.HTTPStatusError as e:
-            # Log specific HTTP errors from the service
-            logger.error(f"PaddleOCR service returned an error: {e.response.status_code} - {e.response.text}")
-            raise HTTPException(status_code=502, detail=f"Error from PaddleOCR service: {e.response.text}")
-        except httpx.RequestError as e:
-            # Handle network-level errors (connection refused, timeout, etc.)
-            logger.error(f"Could not connect to PaddleOCR service at {ocr_endpoint_url}. Error: {e}")
-            raise HTTPException(status_code=503, detail="Could not connect to PaddleOCR service.")
-        except Exception as e:
-            # Catch any other unexpected errors
-            logger.exception(f"An unexpected error occurred while calling PaddleOCR service for file {file.filename}.")
-            raise HTTPException(status_code=500, detail="An unexpected error occurred.")
+            result = await call_paddleocr_service(UploadFile(filename=filename, file=io.BytesIO(image_bytes)))
+            texts.append((result or {}).get('text', '') or "")
+        except HTTPException:
+            texts.append("")
+    return texts
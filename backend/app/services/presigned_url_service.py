@@ -0,0 +1,98 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional
+
+from minio import Minio
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXPIRY = timedelta(days=7)
+
+
+class PresignedUrlService:
+    """
+    Signs GET URLs for MinIO objects and caches them.
+
+    Signing is a local HMAC computation once the client knows the bucket region
+    (MINIO_REGION, or one lookup per shared client), so a batch of URLs is signed
+    in a single pass with one timestamp. A URL is reused for
+    PRESIGNED_URL_CACHE_FRACTION of its expiry, so a client that receives it
+    always has at least the remaining fraction of validity left. The cache is
+    an LRU bounded by PRESIGNED_URL_CACHE_MAX_ENTRIES.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(PresignedUrlService, cls).__new__(cls)
+                cls._instance._cache = OrderedDict()  # key -> (url, reuse_until)
+                cls._instance._lock = threading.Lock()
+                cls._instance.hits = 0
+                cls._instance.misses = 0
+        return cls._instance
+
+    def get_urls(self, client: Minio, bucket_name: str, object_names: Iterable[str],
+                 expires: timedelta = DEFAULT_EXPIRY) -> Dict[str, str]:
+        """
+        Returns a presigned GET URL for every object name, signing only those not
+        cached. Objects that cannot be signed are left out of the result.
+        """
+        now = time.monotonic()
+        urls: Dict[str, str] = {}
+        missing = []
+        with self._lock:
+            for object_name in object_names:
+                key = (id(client), bucket_name, object_name, int(expires.total_seconds()))
+                cached = self._cache.get(key)
+                if cached and cached[1] > now:
+                    self._cache.move_to_end(key)
+                    urls[object_name] = cached[0]
+                    self.hits += 1
+                else:
+                    missing.append((key, object_name))
+            self.misses += len(missing)
+
+        if not missing:
+            return urls
+
+        request_date = datetime.now(timezone.utc)
+        reuse_until = now + expires.total_seconds() * settings.PRESIGNED_URL_CACHE_FRACTION
+        signed = []
+        for key, object_name in missing:
+            try:
+                url = client.presigned_get_object(bucket_name, object_name, expires=expires, request_date=request_date)
+            except Exception as e:
+                logger.error(f"Could not sign URL for '{bucket_name}/{object_name}': {e}")
+                continue
+            urls[object_name] = url
+            signed.append((key, url))
+
+        with self._lock:
+            for key, url in signed:
+                self._cache[key] = (url, reuse_until)
+                self._cache.move_to_end(key)
+            while len(self._cache) > settings.PRESIGNED_URL_CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+        return urls
+
+    def get_url(self, client: Minio, bucket_name: str, object_name: str,
+                expires: timedelta = DEFAULT_EXPIRY) -> Optional[str]:
+        return self.get_urls(client, bucket_name, [object_name], expires).get(object_name)
+
+    def invalidate(self, bucket_name: str, object_name: str) -> None:
+        """Drops cached URLs of an object, e.g. after it was deleted."""
+        with self._lock:
+            for key in [k for k in self._cache if k[1] == bucket_name and k[2] == object_name]:
+                del self._cache[key]
+
+
+def get_presigned_url_service() -> PresignedUrlService:
+    """Gets the singleton instance of the PresignedUrlService."""
+    return PresignedUrlService()
@@ -0,0 +1,171 @@
+"""
+Assembles LLM prompts within the MAX_CONTEXT_TOKENS budget.
+
+Tokenizers are loaded once per process (tiktoken downloads and parses its BPE
+file on first use). Messages carry their own "token_count", set when they are
+stored, so history is not re-tokenized every turn. A PromptBuilder takes the
+parts of a prompt as sections with a priority and fills the budget section by
+section: required parts (system prompt, question) first, then retrieved
+chunks, attachments and history, each according to its fill policy.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODING = "cl100k_base"
+# Role label and separators a chat message adds on top of its content.
+MESSAGE_OVERHEAD_TOKENS = 4
+# How long to wait before trying to load a tokenizer again after it failed (e.g. no network).
+TOKENIZER_RETRY_SECONDS = 600
+TRUNCATION_MARK = "\n[... truncated to fit the context window]"
+
+# Fill policies of a section
+STOP = "stop"  # Take items in order until one does not fit (history: keeps the kept messages contiguous)
+SKIP = "skip"  # Take every item that still fits (retrieved chunks: a long chunk does not block shorter ones)
+TRUNCATE = "truncate"  # Like STOP, but the first item that does not fit is cut to the remaining budget
+REQUIRED = "required"  # Always taken in full, even over budget
+
+_tokenizers: Dict[str, object] = {}
+_tokenizer_failures: Dict[str, float] = {}
+_tokenizers_lock = threading.Lock()
+
+
+def get_tokenizer(name: str = DEFAULT_ENCODING):
+    """
+    Returns the process-wide tiktoken encoding, or None if it cannot be loaded,
+    in which case counts fall back to an estimate of three characters per token.
+    """
+    tokenizer = _tokenizers.get(name)
+    if tokenizer is not None:
+        return tokenizer
+    with _tokenizers_lock:
+        if name in _tokenizers:
+            return _tokenizers[name]
+        failed_at = _tokenizer_failures.get(name)
+        if failed_at is not None and time.monotonic() - failed_at < TOKENIZER_RETRY_SECONDS:
+            return None
+        try:
+            import tiktoken
+            _tokenizers[name] = tiktoken.get_encoding(name)
+            _tokenizer_failures.pop(name, None)
+            return _tokenizers[name]
+        except Exception as e:
+            _tokenizer_failures[name] = time.monotonic()
+            logger.warning(f"Could not load tokenizer '{name}', estimating token counts instead: {e}")
+            return None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return len(text) // 3 + 1
+    return len(tokenizer.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts `text` to at most `max_tokens` tokens."""
+    if max_tokens <= 0:
+        return ""
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return text[:max_tokens * 3]
+    tokens = tokenizer.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else tokenizer.decode(tokens[:max_tokens])
+
+
+def message_token_count(message: Dict) -> int:
+    """Token count of a stored message's content; uses the stored "token_count" when the message has one."""
+    stored = message.get("token_count")
+    if isinstance(stored, int):
+        return stored
+    return count_tokens(message.get("content") or "")
+
+
+@dataclass
+class PromptSection:
+    name: str
+    items: List[str]
+    priority: int
+    policy: str = STOP
+    token_counts: Optional[List[int]] = None  # Precomputed counts of the items, if known
+    overhead_tokens: int = 0  # Tokens added per item (e.g. role labels)
+
+
+@dataclass
+class PromptBuild:
+    """The items each section got, in their given order, and how the budget was spent."""
+    selected: Dict[str, List[str]] = field(default_factory=dict)
+    tokens: Dict[str, int] = field(default_factory=dict)
+    dropped: Dict[str, int] = field(default_factory=dict)
+    truncated: List[str] = field(default_factory=list)
+    budget: int = 0
+    build_seconds: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.tokens.values())
+
+    def describe(self) -> str:
+        parts = ", ".join(f"{name} {tokens}" for name, tokens in self.tokens.items())
+        dropped = ", ".join(f"{name} {count}" for name, count in self.dropped.items() if count)
+        text = f"{self.total_tokens}/{self.budget} tokens ({parts}) in {self.build_seconds * 1000:.1f} ms"
+        if dropped:
+            text += f"; dropped: {dropped}"
+        if self.truncated:
+            text += f"; truncated: {', '.join(self.truncated)}"
+        return text
+
+
+class PromptBuilder:
+    """
+    Fills a token budget by priority. Lower priority values are filled first.
+    Items are given in order of preference (for history: newest first).
+    """
+
+    def __init__(self, budget_tokens: int):
+        self.budget_tokens = budget_tokens
+        self.sections: List[PromptSection] = []
+
+    def add(self, name: str, items: List[str], priority: int, policy: str = STOP,
+            token_counts: Optional[List[int]] = None, overhead_tokens: int = 0) -> "PromptBuilder":
+        self.sections.append(PromptSection(name, list(items), priority, policy, token_counts, overhead_tokens))
+        return self
+
+    def build(self) -> PromptBuild:
+        started = time.perf_counter()
+        result = PromptBuild(budget=self.budget_tokens)
+        remaining = self.budget_tokens
+        for section in sorted(self.sections, key=lambda s: s.priority):
+            counts = section.token_counts or [count_tokens(item) for item in section.items]
+            selected, used = [], 0
+            for item, tokens in zip(section.items, counts):
+                cost = tokens + section.overhead_tokens
+                if section.policy == REQUIRED or cost <= remaining:
+                    selected.append(item)
+                    used += cost
+                    remaining -= cost
+                    continue
+                if section.policy == SKIP:
+                    continue
+                if section.policy == TRUNCATE:
+                    room = remaining - section.overhead_tokens - count_tokens(TRUNCATION_MARK)
+                    if room > 0:
+                        cut = truncate_to_tokens(item, room) + TRUNCATION_MARK
+                        cost = count_tokens(cut) + section.overhead_tokens
+                        selected.append(cut)
+                        used += cost
+                        remaining -= cost
+                        result.truncated.append(section.name)
+                break
+            result.selected[section.name] = selected
+            result.tokens[section.name] = used
+            result.dropped[section.name] = len(section.items) - len(selected)
+        result.build_seconds = time.perf_counter() - started
+        return result
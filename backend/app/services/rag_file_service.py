@@ -1,13 +1,12 @@
 import os
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
-from minio import Minio
 from minio.error import S3Error
-from datetime import timedelta
 from pymongo import MongoClient # Import MongoClient
 from app.modules.mongodb_module import get_mongo_client # Import get_mongo_client from mongodb_module
 from app.rag_knowledge.generic_knowledge import delete_milvus_data_by_filepath, delete_mongo_data_by_filename
-from app.services.file_upload_service import get_minio_client
+from app.core.minio_client import get_minio_client, get_client_for_endpoint
+from app.services.presigned_url_service import get_presigned_url_service
 from ..core.config import settings # Global import
 from app.models.database import FileGist, RagData
 from app.models import database
@@ -79,6 +78,7 @@ async def purge_file_and_all_related_data(db: Session, file_id: int) -> bool:
         if not db_file.is_third_party:
             try:
                 minio_client.remove_object(minio_bucket_name, original_filename)
+                get_presigned_url_service().invalidate(minio_bucket_name, original_filename)
                 logger.info(f"Successfully deleted first-party source file '{original_filename}' from MinIO.")
             except S3Error as e:
                 logger.error(f"Failed to delete source file '{original_filename}' from MinIO: {e}. The database record will still be removed.")
@@ -124,11 +124,8 @@ def get_file_gist_with_download_url(db: Session, file_id: int) -> Optional[schem
             if not all([endpoint, access_key, secret_key, minio_bucket_name]):
                 raise ValueError("CUSTOMER MinIO settings are not fully configured.")
 
-            # Create a new Minio client with third-party credentials
-            # Note: endpoint might contain http/https, so we need to parse it.
-            secure = "https" in endpoint
-            clean_endpoint = endpoint.replace("https://", "").replace("http://", "")
-            minio_client = Minio(clean_endpoint, access_key=access_key, secret_key=secret_key, secure=secure)
+            # Shared client for the third-party credentials (scheme in the endpoint is handled there)
+            minio_client = get_client_for_endpoint(endpoint, access_key, secret_key)
         else:
             logger.info(f"File ID {file_id} is a first-party file. Using default MINIO settings.")
             # For internal files, use the default MinIO client
@@ -137,12 +134,8 @@ def get_file_gist_with_download_url(db: Session, file_id: int) -> Optional[schem
             if not minio_bucket_name:
                 raise ValueError("Default MINIO_BUCKET_NAME is not set.")
 
-        # Generate the pre-signed URL using the appropriate client and bucket
-        download_url = minio_client.presigned_get_object(
-            minio_bucket_name,
-            file_gist.filename,
-            expires=timedelta(days=7),  # URL valid for 7 days
-        )
+        # Generate the pre-signed URL (valid for 7 days) using the appropriate client and bucket
+        download_url = get_presigned_url_service().get_url(minio_client, minio_bucket_name, file_gist.filename)
         file_gist_schema = schemas.FileGist.from_orm(file_gist)
         file_gist_schema.download_url = download_url
         return file_gist_schema
@@ -167,24 +160,15 @@ def get_file_gists_with_download_urls(db: Session, file_ids: List[int]) -> List[
         return [schemas.FileGist.from_orm(fg) for fg in file_gists] # Return without URLs
 
     try:
-        minio_client = get_minio_client()
+        # One batch signature pass; URLs of recently listed files come from the cache
+        download_urls = get_presigned_url_service().get_urls(
+            get_minio_client(), minio_bucket_name, [fg.filename for fg in file_gists]
+        )
         result_gists = []
         for file_gist in file_gists:
-            try:
-                download_url = minio_client.presigned_get_object(
-                    minio_bucket_name,
-                    file_gist.filename,
-                    expires=timedelta(days=7),
-                )
-                file_gist_schema = schemas.FileGist.from_orm(file_gist)
-                file_gist_schema.download_url = download_url
-                result_gists.append(file_gist_schema)
-            except S3Error as e:
-                print(f"MinIO Error generating pre-signed URL for file ID {file_gist.id}: {e}")
-                result_gists.append(schemas.FileGist.from_orm(file_gist)) # Add without URL
-            except Exception as e:
-                print(f"An unexpected error occurred during MinIO URL generation for file ID {file_gist.id}: {e}")
-                result_gists.append(schemas.FileGist.from_orm(file_gist)) # Add without URL
+            file_gist_schema = schemas.FileGist.from_orm(file_gist)
+            file_gist_schema.download_url = download_urls.get(file_gist.filename)
+            result_gists.append(file_gist_schema)
         return result_gists
     except ValueError as e:
         print(f"MinIO client initialization error: {e}")
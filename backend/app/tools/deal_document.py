@@ -10,6 +10,7 @@ from langchain_core.prompts import PromptTemplate
 from pydantic import BaseModel, Field
 from fastapi import UploadFile
 from app.llm.llm import get_llm
+from app.services.llm_dispatcher import get_llm_dispatcher
 from app.tools.pdf import process_pdf_with_mineru
 from app.tools.word import extract_word_content_from_url, extract_word_content_from_bytes
 from app.tools.exlsx import download_and_parse_xlsx, extract_excel_content_from_bytes
@@ -162,10 +163,11 @@ async def summary_documents_content(docu_str: str, question: str):
     chain = prompt | llm_instance
     
     # Invoke the chain to get the raw output
-    raw_result = await chain.ainvoke(
-        {"messages": ["user", str(docu_str)], "question": str(question)},
-        config={"run_name": f"summarize_question_content_{str(question)}"}
-    )
+    async with get_llm_dispatcher().slot("summary_documents_content"):
+        raw_result = await chain.ainvoke(
+            {"messages": ["user", str(docu_str)], "question": str(question)},
+            config={"run_name": f"summarize_question_content_{str(question)}"}
+        )
     
     # Manually clean and parse the output
     raw_text_output = raw_result.content if hasattr(raw_result, 'content') else str(raw_result)
@@ -311,6 +313,16 @@ def _extract_text_with_pymupdf_fallback(file_bytes: bytes) -> str:
         return ""
 
 
+def extraction_depends_on_question(filename: str) -> bool:
+    """图片由视觉模型针对用户的问题进行解析，因此提取结果随问题变化，不能复用。"""
+    return os.path.splitext(filename)[-1].lower().strip('.') in DOCUMENT_TYPE_QWEN_VL_DEAL_IMAGE
+
+
+def is_extraction_failure(text: str) -> bool:
+    """提取失败时返回空字符串或以“错误”/“无法”开头的说明，这类结果不应被缓存。"""
+    return not text or text.startswith("错误") or text.startswith("无法")
+
+
 async def extract_text_from_file_content(file_content: bytes, filename: str, question: str = None) -> str:
     """
     从文件内容和文件名中嗅探文件类型，使用相应的解析器提取纯文本。
@@ -327,8 +339,7 @@ async def extract_text_from_file_content(file_content: bytes, filename: str, que
 
     # 检查是否为支持的图片类型
     # DOCUMENT_TYPE_QWEN_VL_DEAL_IMAGE 是一个从 settings 加载的 JSON 字符串列表
-    supported_image_types = DOCUMENT_TYPE_QWEN_VL_DEAL_IMAGE
-    if file_extension.strip('.') in supported_image_types:
+    if extraction_depends_on_question(filename):
         if not question:
             return "Cannot analyze image without a question."
         return await llm_ollama_vision_ainvoke(question, file_content)
@@ -371,7 +382,7 @@ async def extract_text_from_file_content(file_content: bytes, filename: str, que
         logger.info(f"开始处理Word文档: {filename}")
         result = await extract_word_content_from_bytes(file_content)
         
-        if result and not result.startswith("错误") and not result.startswith("无法"):
+        if not is_extraction_failure(result):
             logger.info(f"Word文档处理成功: {filename}")
         else:
             logger.error(f"Word文档处理失败: {filename}, 结果: {result[:100] if result else 'None'}...")
@@ -5,6 +5,7 @@ import asyncio
 from typing import List, AsyncGenerator, Callable
 from app.core.config import settings
 from app.llm.llm import get_llm
+from app.services.llm_dispatcher import get_llm_dispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -98,32 +99,59 @@ def get_text_splitter() -> Callable[[str, int, int], List[str]]:
 
 # --- Streaming Map-Reduce Implementation ---
 
+# Marks the end of a part's stream in the map phase of summarize_long_text.
+_PART_DONE = object()
+
 async def _recursive_summarize(summaries: List[str], llm_instance, lang: str, max_tokens: int = 3000) -> str:
     """
-    (Tool) Recursively summarizes a list of summaries until the total token count is below a threshold.
-    """
-    combined_text = "\n\n".join(summaries)
-    if len(combined_text) / 4 < max_tokens: # Simple token estimation
-        return combined_text
-
-    logger.info(f"Combined summaries length ({len(combined_text)}) exceeds threshold. Recursively summarizing...")
-    
-    mid_point = len(summaries) // 2
-    batch_1 = summaries[:mid_point]
-    batch_2 = summaries[mid_point:]
+    (Tool) Tree-reduces a list of summaries until the total token count is below a threshold.
 
+    Each level packs neighbouring summaries into groups of at most `max_tokens`
+    and summarizes all groups of the level concurrently (up to
+    SUMMARY_REDUCE_CONCURRENCY at once), keeping the document order.
+    """
     prompt_template = {
         "en": "Please summarize the following collection of summaries concisely in English:\n\n{text}",
         "zh-cn": "请用中文对以下摘要集合进行简洁的总结:\n\n{text}",
     }.get(lang, "Please summarize the following collection of summaries concisely:\n\n{text}")
+    semaphore = asyncio.Semaphore(settings.SUMMARY_REDUCE_CONCURRENCY)
 
-    summary1_task = llm_instance.ainvoke(prompt_template.format(text="\n\n".join(batch_1)))
-    summary2_task = llm_instance.ainvoke(prompt_template.format(text="\n\n".join(batch_2)))
-    
-    results = await asyncio.gather(summary1_task, summary2_task)
-    new_summaries = [res.content for res in results]
-    
-    return await _recursive_summarize(new_summaries, llm_instance, lang, max_tokens)
+    async def summarize(batch: List[str]) -> str:
+        async with semaphore, get_llm_dispatcher().slot("recursive summary"):
+            result = await llm_instance.ainvoke(prompt_template.format(text="\n\n".join(batch)))
+        return result.content
+
+    combined_text = "\n\n".join(summaries)
+    level = 0
+    while len(combined_text) / 4 >= max_tokens: # Simple token estimation
+        level += 1
+        groups = _group_by_size(summaries, max_tokens * 4)
+        logger.info(f"Combined summaries length ({len(combined_text)}) exceeds threshold. "
+                    f"Reduce level {level}: {len(summaries)} summaries in {len(groups)} groups...")
+        new_summaries = await asyncio.gather(*(summarize(group) for group in groups))
+        new_combined_text = "\n\n".join(new_summaries)
+        if len(new_combined_text) >= len(combined_text):
+            logger.warning("Summarizing did not shorten the summaries any further; using them as they are.")
+            break
+        summaries, combined_text = list(new_summaries), new_combined_text
+    return combined_text
+
+
+def _group_by_size(texts: List[str], max_chars: int) -> List[List[str]]:
+    """Packs consecutive texts into groups of at most `max_chars` (a longer text forms its own group) and at least two texts where possible."""
+    groups, current, current_size = [], [], 0
+    for text in texts:
+        if current and current_size + len(text) > max_chars and len(current) > 1:
+            groups.append(current)
+            current, current_size = [], 0
+        current.append(text)
+        current_size += len(text)
+    if current:
+        if len(current) == 1 and groups:
+            groups[-1].append(current[0])
+        else:
+            groups.append(current)
+    return groups
 
 
 def _is_structured_data(text: str) -> bool:
@@ -225,9 +253,10 @@ async def summarize_long_text(text: str, show_think_process: bool = False) -> As
         
         yield "Formatting summary...\n\n"
         final_summary = ""
-        async for stream_chunk in llm_instance.astream(format_prompt):
-            final_summary += stream_chunk.content
-            yield stream_chunk.content
+        async with get_llm_dispatcher().slot("table summary"):
+            async for stream_chunk in llm_instance.astream(format_prompt):
+                final_summary += stream_chunk.content
+                yield stream_chunk.content
         
         yield f"__FINAL_SUMMARY_COMPLETE__:{final_summary}"
         return
@@ -256,20 +285,44 @@ async def summarize_long_text(text: str, show_think_process: bool = False) -> As
     chunks = splitter(text, settings.TEXT_CHUNK_SIZE, settings.TEXT_CHUNK_OVERLAP)
     yield f"Analyzing document in '{lang}' ({len(chunks)} parts)...\n\n"
 
-    summaries = []
-    for i, chunk in enumerate(chunks):
-        yield f"**Summary of Part {i+1}/{len(chunks)}:**\n"
+    # Map phase: up to SUMMARY_MAP_CONCURRENCY parts are summarized at once. Each part streams
+    # into its own queue; the parts are relayed in order, so the current part streams live
+    # while the following ones are already being generated.
+    semaphore = asyncio.Semaphore(settings.SUMMARY_MAP_CONCURRENCY)
+    part_queues = [asyncio.Queue() for _ in chunks]
+
+    async def summarize_part(chunk: str, queue: asyncio.Queue):
         try:
             prompt = lang_prompts["chunk_summary"].format(chunk=chunk)
-            summary_content = ""
-            async for stream_chunk in llm_instance.astream(prompt):
-                summary_content += stream_chunk.content
-                yield stream_chunk.content
-            summaries.append(summary_content)
-            yield "\n\n"
+            async with semaphore, get_llm_dispatcher().slot("chunk summary"):
+                async for stream_chunk in llm_instance.astream(prompt):
+                    queue.put_nowait(stream_chunk.content)
+            queue.put_nowait(_PART_DONE)
         except Exception as e:
-            logger.error(f"Error summarizing chunk {i+1}", exc_info=True)
-            yield f"Error processing part {i+1}: {e}\n\n"
+            queue.put_nowait(e)
+
+    tasks = [asyncio.create_task(summarize_part(chunk, queue)) for chunk, queue in zip(chunks, part_queues)]
+    summaries = []
+    try:
+        for i, queue in enumerate(part_queues):
+            yield f"**Summary of Part {i+1}/{len(chunks)}:**\n"
+            summary_content = ""
+            while True:
+                item = await queue.get()
+                if item is _PART_DONE:
+                    summaries.append(summary_content)
+                    yield "\n\n"
+                    break
+                if isinstance(item, Exception):
+                    logger.error(f"Error summarizing chunk {i+1}", exc_info=item)
+                    yield f"Error processing part {i+1}: {item}\n\n"
+                    break
+                summary_content += item
+                yield item
+    finally:
+        # Only needed if the consumer stopped early
+        for task in tasks:
+            task.cancel()
 
     if not summaries:
         yield "Error: Could not generate any summaries from the document parts."
@@ -283,9 +336,10 @@ async def summarize_long_text(text: str, show_think_process: bool = False) -> As
         
         # This is the final summary, we stream it chunk by chunk
         final_summary = ""
-        async for stream_chunk in llm_instance.astream(final_prompt):
-            final_summary += stream_chunk.content
-            yield stream_chunk.content
+        async with get_llm_dispatcher().slot("final summary"):
+            async for stream_chunk in llm_instance.astream(final_prompt):
+                final_summary += stream_chunk.content
+                yield stream_chunk.content
         
         # The very last thing this generator does is yield the full final summary.
         # The caller will know the stream is over and this is the final product.
@@ -0,0 +1,147 @@
+import logging
+from typing import AsyncGenerator, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from minio import Minio
+from minio.error import S3Error
+
+from app.core.config import settings
+from app.core.minio_client import run_minio
+
+logger = logging.getLogger(__name__)
+
+
+def parse_range_header(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single-range "bytes=" header into an inclusive (start, end) pair.
+
+    Returns None if the header should be ignored (other units or multiple ranges,
+    which are answered with the full object). Raises ValueError if the range
+    cannot be satisfied for an object of `size` bytes.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if not start_text:
+            # Suffix range: the last N bytes.
+            suffix = int(end_text)
+            if suffix <= 0:
+                raise ValueError("Empty suffix range")
+            return max(size - suffix, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        raise ValueError(f"Malformed range '{range_header}'")
+    if start >= size or end < start:
+        raise ValueError(f"Range '{range_header}' not satisfiable for {size} bytes")
+    return start, min(end, size - 1)
+
+
+def _etag_matches(header_value: str, etag: str) -> bool:
+    if header_value.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in header_value.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def content_disposition(filename: str, disposition: str = "attachment") -> str:
+    """Content-Disposition value that survives non-ASCII file names (RFC 6266/5987)."""
+    ascii_name = filename.encode("ascii", "replace").decode("ascii").replace('"', "")
+    return f"{disposition}; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def _release_object(response) -> None:
+    """Closes a get_object response and returns its connection to the pool. Safe to call twice."""
+    response.close()
+    response.release_conn()
+
+
+async def _iterate_object(response, chunk_size: int) -> AsyncGenerator[bytes, None]:
+    """Yields an object's body chunk by chunk, reading on the MinIO executor."""
+    chunks = response.stream(chunk_size)
+    try:
+        while True:
+            chunk = await run_minio(next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        _release_object(response)
+
+
+async def stream_minio_object(
+    request: Request,
+    minio_client: Minio,
+    bucket_name: str,
+    object_name: str,
+    media_type: Optional[str] = None,
+    filename: Optional[str] = None,
+    disposition: str = "attachment",
+) -> Response:
+    """
+    Streams a MinIO object straight to the HTTP response without buffering it in
+    memory or on disk.
+
+    - Chunks of MINIO_DOWNLOAD_CHUNK_KB are read on the MinIO executor, so memory
+      use stays flat for objects of any size.
+    - The object's ETag is sent and If-None-Match is answered with 304, so
+      browsers can revalidate cached previews without downloading them again.
+    - A single "Range: bytes=..." is answered with 206 (honouring If-Range),
+      which lets PDF viewers and video players fetch only what they show.
+    """
+    try:
+        stat = await run_minio(minio_client.stat_object, bucket_name, object_name)
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject"):
+            raise HTTPException(status_code=404, detail="File not found in storage.")
+        raise
+
+    etag = f'"{stat.etag}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",  # Cache, but revalidate with If-None-Match
+    }
+    if stat.last_modified:
+        headers["Last-Modified"] = stat.last_modified.strftime("%a, %d %b %Y %H:%M:%S GMT")
+    if filename:
+        headers["Content-Disposition"] = content_disposition(filename, disposition)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    size = stat.size
+    status_code = 200
+    offset, length = 0, size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and size > 0 and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = parse_range_header(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range:
+            start, end = byte_range
+            offset, length = start, end - start + 1
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(length)
+
+    if length == 0:
+        return Response(status_code=status_code, headers=headers, media_type=media_type or stat.content_type)
+
+    response = await run_minio(minio_client.get_object, bucket_name, object_name, offset=offset, length=length)
+    return StreamingResponse(
+        _iterate_object(response, settings.MINIO_DOWNLOAD_CHUNK_KB * 1024),
+        status_code=status_code,
+        media_type=media_type or stat.content_type or "application/octet-stream",
+        headers=headers,
+        # Also runs when the client left before the first chunk, so the generator never started
+        background=BackgroundTask(_release_object, response),
+    )
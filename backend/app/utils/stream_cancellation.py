@@ -0,0 +1,222 @@
+"""
+Stops the work behind a request once its client has gone away.
+
+A browser that closes a chat stream used to leave the response generator
+running: searches, reranking, attachment extraction and the whole Ollama
+generation finished for nobody. `cancel_on_disconnect` runs a stream's
+generator in a task of its own and cancels that task as soon as the client
+disconnects (checked every STREAM_DISCONNECT_POLL_SECONDS, and also when the
+server tears the response down). `run_unless_disconnected` does the same for
+a plain coroutine behind a non-streaming route.
+
+Cancellation reaches every `await` in the task: the Ollama stream closes its
+HTTP connection (Ollama stops generating when the connection is closed),
+LLM calls still queued in the dispatcher leave the queue, and the producers
+cancel the sub-tasks they started (see ChatResponseService). Work already
+handed to a worker thread finishes on its own, but nothing after it starts.
+
+Producers describe their progress on the StreamWork returned by
+`current_stream_work()`; `stream_cancellation_stats` uses it to estimate
+what stopping abandoned requests saved.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import aclosing
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncGenerator, Awaitable, Dict, Optional
+
+from fastapi import HTTPException, Request
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Status answered to a client that is no longer there (nginx's "client closed request").
+CLIENT_CLOSED_REQUEST = 499
+
+
+@dataclass
+class StreamWork:
+    """Progress of one request, updated by the code doing its work."""
+    label: str
+    started: float = field(default_factory=time.monotonic)
+    stage: str = "starting"
+    llm_chunks: int = 0  # Chunks of the final answer streamed from Ollama
+    attachments_total: int = 0
+    attachments_done: int = 0
+    searches_started: int = 0
+    searches_cancelled: int = 0
+
+
+_current_work: ContextVar[Optional[StreamWork]] = ContextVar("stream_work", default=None)
+
+
+def current_stream_work() -> StreamWork:
+    """
+    The progress record of the request being served. Outside a tracked request
+    a throwaway record is returned, so callers can update it unconditionally.
+    """
+    work = _current_work.get()
+    return work if work is not None else StreamWork("untracked")
+
+
+@dataclass
+class _LabelStats:
+    completed: int = 0
+    completed_seconds: float = 0.0
+    completed_llm_chunks: int = 0
+    cancelled: int = 0
+    cancelled_seconds: float = 0.0
+    searches_cancelled: int = 0
+    attachments_skipped: int = 0
+    estimated_seconds_saved: float = 0.0
+    estimated_llm_chunks_saved: float = 0.0
+    cancelled_by_stage: Dict[str, int] = field(default_factory=dict)
+
+
+class CancellationStats:
+    """
+    Counts completed and abandoned requests per label. The work an abandoned
+    request did not do is estimated from the completed ones: the average
+    duration minus the time it ran, and the average number of answer chunks
+    minus the chunks it had already generated.
+    """
+
+    def __init__(self):
+        self._labels: Dict[str, _LabelStats] = {}
+
+    def _stats(self, label: str) -> _LabelStats:
+        return self._labels.setdefault(label, _LabelStats())
+
+    def record_completed(self, work: StreamWork) -> None:
+        stats = self._stats(work.label)
+        stats.completed += 1
+        stats.completed_seconds += time.monotonic() - work.started
+        stats.completed_llm_chunks += work.llm_chunks
+
+    def record_cancelled(self, work: StreamWork) -> Dict[str, Any]:
+        stats = self._stats(work.label)
+        elapsed = time.monotonic() - work.started
+        if stats.completed:
+            seconds_saved = max(stats.completed_seconds / stats.completed - elapsed, 0.0)
+            chunks_saved = max(stats.completed_llm_chunks / stats.completed - work.llm_chunks, 0.0)
+        else:
+            seconds_saved = chunks_saved = 0.0
+        attachments_skipped = work.attachments_total - work.attachments_done
+
+        stats.cancelled += 1
+        stats.cancelled_seconds += elapsed
+        stats.searches_cancelled += work.searches_cancelled
+        stats.attachments_skipped += attachments_skipped
+        stats.estimated_seconds_saved += seconds_saved
+        stats.estimated_llm_chunks_saved += chunks_saved
+        stats.cancelled_by_stage[work.stage] = stats.cancelled_by_stage.get(work.stage, 0) + 1
+        return {
+            "elapsed_seconds": elapsed,
+            "estimated_seconds_saved": seconds_saved,
+            "estimated_llm_chunks_saved": chunks_saved,
+            "attachments_skipped": attachments_skipped,
+        }
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {label: asdict(stats) for label, stats in self._labels.items()}
+
+
+stream_cancellation_stats = CancellationStats()
+
+
+def _log_cancelled(work: StreamWork, task: asyncio.Task = None) -> None:
+    """Records an abandoned request. Used as the done callback of its cancelled task, so the cleanup is counted too."""
+    saved = stream_cancellation_stats.record_cancelled(work)
+    logger.info(
+        f"Client of '{work.label}' disconnected after {saved['elapsed_seconds']:.1f}s during '{work.stage}'. "
+        f"Cancelled {work.searches_cancelled} search(es), skipped {saved['attachments_skipped']} attachment(s), "
+        f"stopped after {work.llm_chunks} answer chunk(s); estimated {saved['estimated_seconds_saved']:.1f}s "
+        f"and {saved['estimated_llm_chunks_saved']:.0f} chunk(s) of generation saved."
+    )
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(settings.STREAM_DISCONNECT_POLL_SECONDS)
+
+
+_END = object()
+
+
+async def cancel_on_disconnect(request: Request, generator: AsyncGenerator, label: str) -> AsyncGenerator:
+    """
+    Relays the items of `generator`, which runs in a task of its own, and
+    cancels that task if the client disconnects before the stream ends.
+    """
+    work = StreamWork(label)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+    async def produce():
+        _current_work.set(work)
+        try:
+            async with aclosing(generator):
+                async for item in generator:
+                    await queue.put((item, None))
+        except Exception as e:
+            await queue.put((_END, e))
+        else:
+            await queue.put((_END, None))
+
+    producer = asyncio.create_task(produce())
+    disconnect = asyncio.create_task(_wait_for_disconnect(request))
+    next_item = None
+    finished = False
+    try:
+        while True:
+            next_item = asyncio.create_task(queue.get())
+            await asyncio.wait({next_item, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_item.done():
+                next_item.cancel()
+                return
+            item, error = next_item.result()
+            if item is _END:
+                finished = True
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # No awaits here: this also runs while the server is cancelling the response.
+        disconnect.cancel()
+        if next_item is not None:
+            next_item.cancel()
+        if finished:
+            stream_cancellation_stats.record_completed(work)
+        else:
+            producer.add_done_callback(lambda task: _log_cancelled(work, task))
+            producer.cancel()
+
+
+async def run_unless_disconnected(request: Request, awaitable: Awaitable, label: str) -> Any:
+    """
+    Awaits `awaitable` in a task of its own and returns its result. If the client
+    disconnects first, the task is cancelled and a 499 HTTPException is raised.
+    """
+    work = StreamWork(label)
+
+    async def run():
+        _current_work.set(work)
+        return await awaitable
+
+    task = asyncio.create_task(run())
+    disconnect = asyncio.create_task(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnect.cancel()
+        if not task.done():
+            task.add_done_callback(lambda cancelled: _log_cancelled(work, cancelled))
+            task.cancel()
+    if not task.done():
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
+    stream_cancellation_stats.record_completed(work)
+    return task.result()
@@ -1,28 +1,199 @@
+"""
+Server-Sent Events formatting for the streaming chat routes.
+
+Ollama yields one event per token, and writing each as its own SSE message
+meant one JSON encode and one socket write per token and client. The
+formatter coalesces consecutive "text" (and "thought") deltas into one message:
+a message is written once it has waited SSE_FLUSH_INTERVAL_SECONDS, has reached
+SSE_MAX_FRAME_CHARS, or another event follows it. Other events are written
+as they come. Every message still carries exactly one event, so clients that
+append the deltas see the same text.
+
+The upstream generator is read in a task of its own while messages are written
+at the client's pace; while a slow client catches up, new deltas merge into the
+pending message instead of queueing up as separate writes. At most
+SSE_MAX_PENDING_CHARS of unsent text is buffered per stream, after which
+reading from upstream (and so the LLM stream) pauses. A ": ping" comment is
+sent after SSE_HEARTBEAT_SECONDS without output so proxies keep the
+connection open.
+"""
+
+import asyncio
 import json
 import logging
-from typing import AsyncGenerator, Any, Dict
+import time
+from collections import deque
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Any, Dict, List, Optional
+
+import orjson
+
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
-async def sse_stream_formatter(generator: AsyncGenerator[Dict[str, Any], None]) -> AsyncGenerator[str, None]:
+# Events whose data are text deltas that the client appends.
+COALESCED_EVENTS = frozenset({"text", "thought"})
+HEARTBEAT = b": ping\n\n"
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def encode_sse(event: str, data: Any) -> bytes:
+    """One SSE message; the data are always JSON-encoded."""
+    try:
+        data_bytes = orjson.dumps(data, option=_ORJSON_OPTIONS)
+    except TypeError:
+        # Types orjson rejects (e.g. integers beyond 64 bit) get the standard encoder.
+        data_bytes = json.dumps(data).encode("utf-8")
+    return b"event: " + event.encode("utf-8") + b"\ndata: " + data_bytes + b"\n\n"
+
+
+class SSEStats:
+    """
+    Counts events received from the generators and messages written, to
+    report how much coalescing saves, and how often streams were throttled.
+    """
+
+    def __init__(self):
+        self.streams = 0
+        self.events = 0
+        self.messages = 0
+        self.bytes = 0
+        self.heartbeats = 0
+        self.backpressure_waits = 0
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "streams": self.streams,
+            "events": self.events,
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "heartbeats": self.heartbeats,
+            "backpressure_waits": self.backpressure_waits,
+        }
+
+
+sse_stats = SSEStats()
+
+
+@dataclass
+class _Message:
+    event: str
+    data: Any
+    coalesce: bool
+    parts: List[str] = field(default_factory=list)
+    chars: int = 0
+    created: float = field(default_factory=time.monotonic)
+
+    def encode(self) -> bytes:
+        return encode_sse(self.event, "".join(self.parts) if self.coalesce else self.data)
+
+
+async def sse_stream_formatter(
+    generator: AsyncGenerator[Dict[str, Any], None],
+    flush_interval: Optional[float] = None,
+    max_frame_chars: Optional[int] = None,
+    max_pending_chars: Optional[int] = None,
+    heartbeat_seconds: Optional[float] = None,
+) -> AsyncGenerator[bytes, None]:
     """
     Formats the output of an asynchronous generator into Server-Sent Events (SSE).
     It expects the generator to yield dictionaries with 'event' and 'data' keys.
+    The limits default to the SSE_* settings.
     """
+    flush_interval = settings.SSE_FLUSH_INTERVAL_SECONDS if flush_interval is None else flush_interval
+    max_frame_chars = settings.SSE_MAX_FRAME_CHARS if max_frame_chars is None else max_frame_chars
+    max_pending_chars = settings.SSE_MAX_PENDING_CHARS if max_pending_chars is None else max_pending_chars
+    heartbeat_seconds = settings.SSE_HEARTBEAT_SECONDS if heartbeat_seconds is None else heartbeat_seconds
+
+    messages: deque = deque()
+    pending_chars = 0
+    changed = asyncio.Event()  # Set by the reader when a message was added or the generator ended
+    drained = asyncio.Event()  # Set by the writer when buffered text was written
+    finished = False
+    error: Optional[Exception] = None
+
+    async def read():
+        nonlocal pending_chars, finished, error
+        try:
+            async with aclosing(generator):
+                async for chunk in generator:
+                    if not (isinstance(chunk, dict) and 'event' in chunk and 'data' in chunk):
+                        logger.warning(f"sse_stream_formatter received chunk of unexpected format: {chunk}")
+                        continue
+                    sse_stats.events += 1
+                    event, data = chunk['event'], chunk['data']
+                    if event in COALESCED_EVENTS and isinstance(data, str):
+                        if pending_chars >= max_pending_chars:
+                            sse_stats.backpressure_waits += 1
+                            while pending_chars >= max_pending_chars:
+                                drained.clear()
+                                await drained.wait()
+                        last = messages[-1] if messages else None
+                        if last is None or last.event != event or not last.coalesce or last.chars >= max_frame_chars:
+                            last = _Message(event, None, True)
+                            messages.append(last)
+                        last.parts.append(data)
+                        last.chars += len(data)
+                        pending_chars += len(data)
+                    else:
+                        messages.append(_Message(event, data, False))
+                    changed.set()
+        except Exception as e:
+            error = e
+        finally:
+            finished = True
+            changed.set()
+
+    async def wait_for_change(timeout: float) -> None:
+        changed.clear()
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    sse_stats.streams += 1
+    reader = asyncio.create_task(read())
+    last_write = time.monotonic()
     try:
-        async for chunk in generator:
-            if isinstance(chunk, dict) and 'event' in chunk and 'data' in chunk:
-                event = chunk['event']
-                data = chunk['data']
-                
-                # ALWAYS JSON-encode the data part to handle special characters and ensure consistency
-                data_str = json.dumps(data)
-                
-                yield f"event: {event}\ndata: {data_str}\n\n"
-            else:
-                logger.warning(f"sse_stream_formatter received chunk of unexpected format: {chunk}")
+        while True:
+            if not messages:
+                if finished:
+                    break
+                idle = time.monotonic() - last_write
+                if idle >= heartbeat_seconds:
+                    sse_stats.heartbeats += 1
+                    last_write = time.monotonic()
+                    yield HEARTBEAT
+                else:
+                    await wait_for_change(heartbeat_seconds - idle)
+                continue
+
+            message = messages[0]
+            if message.coalesce and len(messages) == 1 and not finished and message.chars < max_frame_chars:
+                # Give further deltas a moment to join this message.
+                remaining = message.created + flush_interval - time.monotonic()
+                if remaining > 0:
+                    await wait_for_change(remaining)
+                    continue
+
+            messages.popleft()
+            if message.coalesce:
+                pending_chars -= message.chars
+                drained.set()
+            data = message.encode()
+            sse_stats.messages += 1
+            sse_stats.bytes += len(data)
+            last_write = time.monotonic()
+            yield data
+
+        if error is not None:
+            raise error
 
     except Exception as e:
         logger.error(f"Error in sse_stream_formatter: {e}", exc_info=True)
-        error_data = json.dumps({'error': str(e)})
-        yield f"event: error\ndata: {error_data}\n\n"
\ No newline at end of file
+        yield encode_sse("error", {'error': str(e)})
+    finally:
+        # No awaits here: this also runs while the server is cancelling the response.
+        reader.cancel()
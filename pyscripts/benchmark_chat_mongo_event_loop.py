@@ -0,0 +1,188 @@
+"""
+Measures how much chat persistence in MongoDB blocks the event loop under a
+concurrent chat load.
+
+"blocking" reproduces the old chat_data_service: a new MongoClient plus a ping
+per call, and synchronous pymongo calls made directly inside `async def`
+functions that load whole conversations with their message arrays. "async"
+uses the current chat_data_service on the shared AsyncMongoClient from
+app.core.mongo_client, with projections instead of full documents.
+
+Each simulated chat request does what opening the chat page and sending a
+message needs from MongoDB: an ownership lookup, the user's conversation list
+and the last page of messages. While the requests run, a probe task sleeps in
+short intervals and records how late it wakes up; that lateness is the time
+the loop was blocked and could not serve anything else.
+
+The script seeds its own conversations into --db and drops that database at
+the end. Point it at a disposable MongoDB.
+
+Usage:
+    python pyscripts/benchmark_chat_mongo_event_loop.py --uri mongodb://localhost:27017
+    python pyscripts/benchmark_chat_mongo_event_loop.py --requests 400 --concurrency 50 --messages 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+USER_ID = "benchmark-user"
+
+
+def seed(args):
+    from bson.objectid import ObjectId
+    from pymongo import MongoClient
+
+    client = MongoClient(args.uri)
+    collection = client[args.db]["chat_conversations"]
+    collection.drop()
+    now = datetime.utcnow()
+    message = {"sender": "user", "content": "x" * args.message_size, "timestamp": now, "attachments": []}
+    collection.insert_many([
+        {
+            "user_id": USER_ID, "title": f"Conversation {i}", "created_at": now, "updated_at": now,
+            "messages": [{**message, "_id": ObjectId()} for _ in range(args.messages)],
+        }
+        for i in range(args.conversations)
+    ])
+    ids = [str(doc["_id"]) for doc in collection.find({}, {"_id": 1})]
+    client.close()
+    return ids
+
+
+class LoopProbe:
+    """Sleeps `interval` seconds at a time and records how much later than requested it woke up."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(time.perf_counter() - start - self.interval, 0.0))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def make_blocking_requests(args):
+    """The old access pattern: one synchronous client per call, full documents."""
+    from bson.objectid import ObjectId
+    from pymongo import MongoClient
+    from pymongo.server_api import ServerApi
+
+    def collection():
+        client = MongoClient(args.uri, server_api=ServerApi('1'))
+        client.admin.command('ping')
+        return client[args.db]["chat_conversations"]
+
+    async def get_conversation_by_id(conversation_id):
+        return collection().find_one({"_id": ObjectId(conversation_id)})
+
+    async def get_conversations_by_user(user_id):
+        return list(collection().find({"user_id": user_id}).sort("updated_at", -1))
+
+    async def chat_request(conversation_id):
+        await get_conversation_by_id(conversation_id)
+        await get_conversations_by_user(USER_ID)
+        conversation = await get_conversation_by_id(conversation_id)
+        return conversation["messages"][-args.page:]
+
+    return chat_request
+
+
+def make_async_requests(args):
+    from app.services import chat_data_service
+
+    async def chat_request(conversation_id):
+        await chat_data_service.get_conversation_by_id(conversation_id, include_messages=False)
+        await chat_data_service.get_conversations_by_user(USER_ID)
+        conversation = await chat_data_service.get_conversation_messages(conversation_id, -args.page)
+        return conversation["messages"]
+
+    return chat_request
+
+
+async def run(mode: str, args, conversation_ids):
+    if mode == "async":
+        from app.core import mongo_client
+        await mongo_client.init_mongo_client()
+        chat_request = make_async_requests(args)
+    else:
+        chat_request = make_blocking_requests(args)
+
+    probe = LoopProbe(args.probe_interval_ms / 1000)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded(i: int):
+        async with semaphore:
+            await chat_request(conversation_ids[i % len(conversation_ids)])
+
+    probe.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    await probe.stop()
+
+    if mode == "async":
+        await mongo_client.close_mongo_client()
+    return elapsed, probe.lags
+
+
+def report(mode: str, args, elapsed: float, lags):
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    p99 = lags_ms[min(len(lags_ms) - 1, int(0.99 * len(lags_ms)))]
+    print(f"{mode:<10}{elapsed:>9.2f}{args.requests / elapsed:>11.1f}"
+          f"{statistics.median(lags_ms):>11.1f}{p99:>11.1f}{lags_ms[-1]:>11.1f}{sum(lags_ms) / 1000:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="benchmark_chat_mongo")
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=100, help="Messages per conversation.")
+    parser.add_argument("--message-size", type=int, default=2000, help="Characters per message.")
+    parser.add_argument("--page", type=int, default=20, help="Messages read per request.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--probe-interval-ms", type=float, default=5.0)
+    parser.add_argument("--mode", choices=["both", "blocking", "async"], default="both")
+    args = parser.parse_args()
+
+    # The async layer reads its configuration from settings.
+    os.environ.update({"MONGO_URI": args.uri, "MONGO_DB_NAME": args.db, "MONGO_MAX_POOL_SIZE": str(args.concurrency)})
+    sys.path.insert(0, BACKEND_DIR)
+
+    conversation_ids = seed(args)
+    modes = ["blocking", "async"] if args.mode == "both" else [args.mode]
+    print(f"Conversations: {args.conversations} x {args.messages} messages  requests: {args.requests}  concurrency: {args.concurrency}")
+    print(f"{'mode':<10}{'seconds':>9}{'req/s':>11}{'lag p50':>11}{'lag p99':>11}{'lag max':>11}{'blocked s':>12}")
+    try:
+        for mode in modes:
+            elapsed, lags = asyncio.run(run(mode, args, conversation_ids))
+            report(mode, args, elapsed, lags)
+    finally:
+        from pymongo import MongoClient
+        client = MongoClient(args.uri)
+        client.drop_database(args.db)
+        client.close()
+    print("Lag columns are milliseconds the event loop was late; 'blocked s' is their sum.")
+
+
+if __name__ == "__main__":
+    main()
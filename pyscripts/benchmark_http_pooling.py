@@ -0,0 +1,122 @@
+"""
+Compares per-request httpx clients with one pooled keep-alive client.
+
+Starts a tiny local OCR stand-in (it just echoes a fixed text) and sends it the
+same number of image uploads both ways, reporting wall time, connections opened
+and the connection setup time spent. Point --url at a real PaddleOCR service to
+measure against it instead.
+
+Usage:
+    python pyscripts/benchmark_http_pooling.py --images 200
+    python pyscripts/benchmark_http_pooling.py --url http://paddleocr:8080/ocr
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+from aiohttp import web
+
+FAKE_IMAGE = os.urandom(32 * 1024)
+
+
+class Counter:
+    def __init__(self):
+        self.connections = 0
+        self.connect_seconds = 0.0
+
+    def trace(self):
+        started = {}
+
+        async def _trace(event_name, info):
+            for phase in ("connection.connect_tcp", "connection.start_tls"):
+                if event_name == f"{phase}.started":
+                    started[phase] = time.perf_counter()
+                elif event_name == f"{phase}.complete" and phase in started:
+                    self.connect_seconds += time.perf_counter() - started.pop(phase)
+                    if phase == "connection.connect_tcp":
+                        self.connections += 1
+
+        return _trace
+
+
+async def _post(client, url, counter):
+    files = {"file": ("figure.png", FAKE_IMAGE, "image/png")}
+    response = await client.post(url, files=files, extensions={"trace": counter.trace()})
+    response.raise_for_status()
+
+
+async def run_per_request(url, images, concurrency):
+    counter = Counter()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            async with httpx.AsyncClient(timeout=60.0) as client:
+                await _post(client, url, counter)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(images)))
+    return time.perf_counter() - start, counter
+
+
+async def run_pooled(url, images, concurrency):
+    counter = Counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=60.0, limits=limits) as client:
+        async def one():
+            async with semaphore:
+                await _post(client, url, counter)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(images)))
+        return time.perf_counter() - start, counter
+
+
+async def _start_stand_in(port):
+    async def ocr(request):
+        await request.post()
+        return web.json_response({"filename": "figure.png", "text": "stand-in"})
+
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app.router.add_post("/ocr", ocr)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="", help="OCR endpoint to benchmark. Defaults to a local stand-in.")
+    parser.add_argument("--images", type=int, default=200, help="Number of figures per simulated document.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--port", type=int, default=18765)
+    args = parser.parse_args()
+
+    runner = None
+    url = args.url
+    if not url:
+        runner = await _start_stand_in(args.port)
+        url = f"http://127.0.0.1:{args.port}/ocr"
+
+    try:
+        per_request_time, per_request = await run_per_request(url, args.images, args.concurrency)
+        pooled_time, pooled = await run_pooled(url, args.images, args.concurrency)
+    finally:
+        if runner:
+            await runner.cleanup()
+
+    print(f"Target: {url}  images/document: {args.images}  concurrency: {args.concurrency}")
+    print(f"{'mode':<14}{'wall s':>10}{'connections':>14}{'connect s':>12}")
+    print(f"{'per-request':<14}{per_request_time:>10.3f}{per_request.connections:>14}{per_request.connect_seconds:>12.4f}")
+    print(f"{'pooled':<14}{pooled_time:>10.3f}{pooled.connections:>14}{pooled.connect_seconds:>12.4f}")
+    print(f"Connection setup saved per document: {per_request.connect_seconds - pooled.connect_seconds:.4f}s "
+          f"({per_request.connections - pooled.connections} fewer connections)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,129 @@
+"""
+Compares the old per-call MinIO client pattern with the shared client provider.
+
+"per-call" builds a new Minio(...) and calls bucket_exists() for every object,
+which is what the helpers in minio_module did. "shared" uses
+app.core.minio_client: one client with a tuned urllib3 pool, the
+bucket-existence cache and the bounded MinIO executor. Both modes upload and
+read back the same small objects with the same concurrency.
+
+Without --endpoint a local S3 stand-in (moto's threaded server) is started, so
+the numbers mostly show client/connection overhead. Point --endpoint at a real
+MinIO to measure against it.
+
+Usage:
+    pip install "moto[server]"
+    python pyscripts/benchmark_minio_client.py --objects 500 --concurrency 16
+    python pyscripts/benchmark_minio_client.py --endpoint localhost:9000 --access-key minioadmin --secret-key minioadmin
+"""
+import argparse
+import asyncio
+import io
+import logging
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+PAYLOAD = os.urandom(16 * 1024)
+
+
+def start_stand_in(port: int) -> str:
+    from moto.server import ThreadedMotoServer
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    return f"127.0.0.1:{port}"
+
+
+def round_trip(client, bucket: str, name: str):
+    client.put_object(bucket, name, io.BytesIO(PAYLOAD), length=len(PAYLOAD))
+    response = client.get_object(bucket, name)
+    try:
+        response.read()
+    finally:
+        response.close()
+        response.release_conn()
+
+
+async def run_per_call(args, bucket: str) -> float:
+    from minio import Minio
+
+    def one(i: int):
+        client = Minio(args.endpoint, access_key=args.access_key, secret_key=args.secret_key, secure=False)
+        if not client.bucket_exists(bucket):
+            client.make_bucket(bucket)
+        round_trip(client, bucket, f"per-call/{i}")
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded(i: int):
+        async with semaphore:
+            await loop.run_in_executor(None, one, i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded(i) for i in range(args.objects)))
+    return time.perf_counter() - start
+
+
+async def run_shared(args, bucket: str) -> float:
+    from app.core import minio_client
+
+    client = minio_client.get_minio_client()
+    await asyncio.to_thread(minio_client.init_minio_clients)
+
+    def one(i: int):
+        minio_client.ensure_bucket(bucket, client)
+        round_trip(client, bucket, f"shared/{i}")
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded(i: int):
+        async with semaphore:
+            await minio_client.run_minio(one, i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded(i) for i in range(args.objects)))
+    elapsed = time.perf_counter() - start
+    minio_client.close_minio_clients()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objects", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--endpoint", help="MinIO host:port. Starts a local moto server when omitted.")
+    parser.add_argument("--access-key", default="testing")
+    parser.add_argument("--secret-key", default="testing")
+    parser.add_argument("--bucket", default="benchmark-minio-client")
+    parser.add_argument("--port", type=int, default=5055, help="Port for the local stand-in.")
+    args = parser.parse_args()
+
+    if not args.endpoint:
+        args.endpoint = start_stand_in(args.port)
+
+    # The shared provider reads its configuration from settings.
+    os.environ.update({
+        "MINIO_ENDPOINT": args.endpoint,
+        "MINIO_ACCESS_KEY": args.access_key,
+        "MINIO_SECRET_KEY": args.secret_key,
+        "MINIO_BUCKET_NAME": args.bucket,
+        "MINIO_EXECUTOR_WORKERS": str(args.concurrency),
+    })
+    sys.path.insert(0, BACKEND_DIR)
+
+    per_call = asyncio.run(run_per_call(args, args.bucket))
+    shared = asyncio.run(run_shared(args, args.bucket))
+
+    print(f"Endpoint: {args.endpoint}  objects: {args.objects}  concurrency: {args.concurrency}")
+    print(f"{'mode':<10}{'seconds':>10}{'objects/s':>12}")
+    print(f"{'per-call':<10}{per_call:>10.2f}{args.objects / per_call:>12.1f}")
+    print(f"{'shared':<10}{shared:>10.2f}{args.objects / shared:>12.1f}")
+    print(f"Speed-up: {per_call / shared:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
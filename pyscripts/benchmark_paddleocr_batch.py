@@ -0,0 +1,107 @@
+"""
+Compares per-image and batched PaddleOCR throughput on synthetic images.
+
+Two modes:
+  local  - loads PaddleOCR in this process on CPU and compares one predict() call
+           per image with predict() on batches (what /ocr/batch does internally).
+  http   - sends the same images to a running PaddleOCR service, once through
+           /ocr (one request per image) and once through /ocr/batch.
+
+Usage:
+    python pyscripts/benchmark_paddleocr_batch.py local --images 64 --batch-size 8
+    python pyscripts/benchmark_paddleocr_batch.py http --url http://localhost:8081 --images 64 --batch-size 16
+"""
+import argparse
+import asyncio
+import io
+import random
+import string
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def make_synthetic_images(count: int, seed: int = 0):
+    """Renders white images with a few lines of random black text, similar to small document figures."""
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        image = Image.new("RGB", (480, 160), "white")
+        draw = ImageDraw.Draw(image)
+        for line in range(3):
+            text = "".join(rng.choice(string.ascii_letters + string.digits + " ") for _ in range(32))
+            draw.text((12, 16 + line * 44), text, fill="black")
+        images.append(image)
+    return images
+
+
+def to_png_bytes(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def run_local(images, batch_size):
+    from paddleocr import PaddleOCR
+
+    model = PaddleOCR(lang="en", device="cpu")
+    arrays = [np.array(image)[:, :, ::-1] for image in images]  # RGB -> BGR
+
+    model.predict(arrays[:1])  # Warm-up outside the measurement
+
+    start = time.perf_counter()
+    for array in arrays:
+        model.predict([array])
+    per_image = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(0, len(arrays), batch_size):
+        model.predict(arrays[i:i + batch_size])
+    batched = time.perf_counter() - start
+    return per_image, batched
+
+
+async def run_http(images, batch_size, url):
+    import httpx
+
+    payloads = [to_png_bytes(image) for image in images]
+    async with httpx.AsyncClient(timeout=600.0) as client:
+        start = time.perf_counter()
+        for i, data in enumerate(payloads):
+            response = await client.post(f"{url}/ocr", files={"file": (f"img_{i}.png", data, "image/png")})
+            response.raise_for_status()
+        per_image = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(0, len(payloads), batch_size):
+            files = [("files", (f"img_{j}.png", data, "image/png")) for j, data in enumerate(payloads[i:i + batch_size], i)]
+            response = await client.post(f"{url}/ocr/batch", files=files)
+            response.raise_for_status()
+        batched = time.perf_counter() - start
+    return per_image, batched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=["local", "http"])
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--url", default="http://localhost:8081", help="PaddleOCR service base URL (http mode).")
+    args = parser.parse_args()
+
+    images = make_synthetic_images(args.images)
+    if args.mode == "local":
+        per_image, batched = run_local(images, args.batch_size)
+    else:
+        per_image, batched = asyncio.run(run_http(images, args.batch_size, args.url.rstrip("/")))
+
+    print(f"Mode: {args.mode}  images: {args.images}  batch size: {args.batch_size}")
+    print(f"{'path':<12}{'seconds':>10}{'images/s':>12}")
+    print(f"{'per-image':<12}{per_image:>10.2f}{args.images / per_image:>12.2f}")
+    print(f"{'batched':<12}{batched:>10.2f}{args.images / batched:>12.2f}")
+    print(f"Speed-up: {per_image / batched:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Shows that markdown parsing for ingestion scales linearly with document size.
+
+Generates wiki-like documents with up to 10,000 headings (each with a paragraph,
+a short list, and every 10th section a table and an image) and times
+`parse_markdown_structure`, the single-pass token parser behind parse_markdown.
+With --legacy it also times the previous BeautifulSoup approach (without OCR),
+which re-ran soup.find_all() for every image and grows quadratically.
+
+Usage:
+    python pyscripts/benchmark_parse_markdown.py
+    python pyscripts/benchmark_parse_markdown.py --legacy --sizes 500 1000 2000
+"""
+import argparse
+import importlib.util
+import os
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+
+def load_parser():
+    # Load the parser module on its own so the benchmark does not need Milvus, Mongo, etc.
+    path = os.path.join(BACKEND_DIR, "app", "rag_knowledge", "markdown_parser.py")
+    spec = importlib.util.spec_from_file_location("markdown_parser", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.parse_markdown_structure
+
+
+def generate_document(headings: int) -> str:
+    parts = []
+    for i in range(headings):
+        level = 1 + i % 3
+        parts.append(f"{'#' * level} Section {i}\n")
+        parts.append(f"Paragraph {i} describing the procedure with some **bold** and `code` text.\n")
+        parts.append(f"- step {i}.1\n- step {i}.2\n")
+        if i % 10 == 0:
+            parts.append("| key | value |\n|-----|-------|\n" f"| row {i} | {i * 2} |\n")
+            parts.append(f"![figure {i}](images/figure_{i}.png)\n")
+    return "\n".join(parts)
+
+
+def legacy_parse(content: str):
+    """The previous HTML-based implementation without the OCR call."""
+    import markdown
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(markdown.markdown(content), "html.parser")
+    chunks = [el.text.strip() for el in soup.find_all(["p", "h1", "h2", "h3", "h4", "h5", "h6", "li", "td", "th"]) if el.text.strip()]
+    for img in soup.find_all("img"):
+        context = ""
+        img_index = soup.find_all().index(img)
+        for i in range(img_index - 1, -1, -1):
+            element = soup.find_all()[i]
+            if element.name in ["p", "h1", "h2"] and element.text.strip():
+                context += element.text.strip() + " "
+                break
+        for i in range(img_index + 1, len(soup.find_all())):
+            element = soup.find_all()[i]
+            if element.name in ["p", "h1", "h2"] and element.text.strip():
+                context += element.text.strip()
+                break
+        chunks.append(context)
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1250, 2500, 5000, 10000], help="Heading counts to test.")
+    parser.add_argument("--legacy", action="store_true", help="Also time the previous BeautifulSoup parser.")
+    args = parser.parse_args()
+
+    parse_markdown_structure = load_parser()
+    print(f"{'headings':>9}{'chars':>11}{'blocks':>9}{'images':>8}{'token s':>10}{'us/heading':>12}" + (f"{'legacy s':>10}" if args.legacy else ""))
+    for size in args.sizes:
+        document = generate_document(size)
+        start = time.perf_counter()
+        parsed = parse_markdown_structure(document)
+        elapsed = time.perf_counter() - start
+        row = f"{size:>9}{len(document):>11}{len(parsed.text_blocks):>9}{len(parsed.images):>8}{elapsed:>10.3f}{elapsed / size * 1e6:>12.1f}"
+        if args.legacy:
+            start = time.perf_counter()
+            legacy_parse(document)
+            row += f"{time.perf_counter() - start:>10.3f}"
+        print(row)
+    print("Linear scaling shows as a roughly constant us/heading column.")
+
+
+if __name__ == "__main__":
+    main()
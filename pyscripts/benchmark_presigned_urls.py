@@ -0,0 +1,92 @@
+"""
+Times download-URL generation for a RAG listing with many files.
+
+  per-file  - the previous pattern: a fresh Minio client per listing and one
+              presigned_get_object() per file. A fresh client has no cached
+              bucket region, so it first asks the server for the bucket location.
+  cold      - PresignedUrlService with the shared client, empty cache (one
+              batch signing pass).
+  warm      - the same listing again, served from the URL cache.
+
+Without --endpoint a local S3 stand-in (moto's threaded server) answers the
+bucket-location lookup. Point --endpoint at a real MinIO to measure against it.
+
+Usage:
+    pip install "moto[server]"
+    python pyscripts/benchmark_presigned_urls.py --files 5000
+    python pyscripts/benchmark_presigned_urls.py --endpoint localhost:9000 --access-key minioadmin --secret-key minioadmin
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import timedelta
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+
+def start_stand_in(port: int) -> str:
+    from moto.server import ThreadedMotoServer
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    return f"127.0.0.1:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--listings", type=int, default=3, help="How many times the listing is requested.")
+    parser.add_argument("--endpoint", help="MinIO host:port. Starts a local moto server when omitted.")
+    parser.add_argument("--access-key", default="testing")
+    parser.add_argument("--secret-key", default="testing")
+    parser.add_argument("--bucket", default="benchmark-presigned")
+    parser.add_argument("--port", type=int, default=5056, help="Port for the local stand-in.")
+    args = parser.parse_args()
+
+    if not args.endpoint:
+        args.endpoint = start_stand_in(args.port)
+    os.environ.update({
+        "MINIO_ENDPOINT": args.endpoint,
+        "MINIO_ACCESS_KEY": args.access_key,
+        "MINIO_SECRET_KEY": args.secret_key,
+        "MINIO_BUCKET_NAME": args.bucket,
+    })
+    sys.path.insert(0, BACKEND_DIR)
+
+    from minio import Minio
+    from app.core.minio_client import ensure_bucket, get_minio_client
+    from app.services.presigned_url_service import get_presigned_url_service
+
+    ensure_bucket(args.bucket)
+    names = [f"rag/document_{i:05d}.pdf" for i in range(args.files)]
+
+    start = time.perf_counter()
+    for _ in range(args.listings):
+        client = Minio(args.endpoint, access_key=args.access_key, secret_key=args.secret_key, secure=False)
+        for name in names:
+            client.presigned_get_object(args.bucket, name, expires=timedelta(days=7))
+    per_file = (time.perf_counter() - start) / args.listings
+
+    service = get_presigned_url_service()
+    client = get_minio_client()
+    start = time.perf_counter()
+    service.get_urls(client, args.bucket, names)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(args.listings):
+        urls = service.get_urls(client, args.bucket, names)
+    warm = (time.perf_counter() - start) / args.listings
+    assert len(urls) == args.files
+
+    print(f"Endpoint: {args.endpoint}  files: {args.files}  (seconds per listing)")
+    print(f"{'per-file':<10}{per_file:>10.3f}")
+    print(f"{'cold':<10}{cold:>10.3f}")
+    print(f"{'warm':<10}{warm:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Load test for the chat SSE formatter: events/s and server CPU per stream.
+
+Starts a uvicorn server (in a subprocess) that streams a fake LLM answer of
+--tokens token events per request, either through the previous formatter (one
+json.dumps and one write per token) or through the coalescing
+`sse_stream_formatter`. It then opens --streams concurrent streams with httpx
+and reports, per mode, token events delivered per second, SSE messages written,
+bytes, and the server's CPU time per stream (read from the server's /cpu
+endpoint before and after, so client-side parsing is not counted).
+
+--slow-client makes every client pause between reads to show that the
+coalescing formatter merges deltas for slow clients instead of buffering them.
+
+Usage:
+    python pyscripts/benchmark_sse_stream.py --streams 100 --tokens 2000
+    python pyscripts/benchmark_sse_stream.py --streams 50 --token-delay 0.01 --slow-client 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+
+def create_app():
+    sys.path.insert(0, BACKEND_DIR)
+    from fastapi import FastAPI
+    from fastapi.responses import StreamingResponse
+
+    from app.utils.stream_processors import sse_stats, sse_stream_formatter
+
+    app = FastAPI()
+
+    async def fake_answer(tokens: int, token_delay: float):
+        for i in range(tokens):
+            yield {"event": "text", "data": f" token{i}"}
+            # Ollama tokens arrive over time; a zero delay still yields to the event loop
+            await asyncio.sleep(token_delay)
+        yield {"event": "metadata", "data": {"source_documents": [{"filename": "report.pdf", "score": 0.87}]}}
+
+    async def legacy_formatter(generator):
+        # The formatter before coalescing
+        async for chunk in generator:
+            yield f"event: {chunk['event']}\ndata: {json.dumps(chunk['data'])}\n\n"
+
+    @app.get("/stream")
+    async def stream(mode: str = "coalesced", tokens: int = 2000, token_delay: float = 0.0):
+        generator = fake_answer(tokens, token_delay)
+        body = legacy_formatter(generator) if mode == "legacy" else sse_stream_formatter(generator)
+        return StreamingResponse(body, media_type="text/event-stream")
+
+    @app.get("/cpu")
+    async def cpu():
+        return {"cpu_seconds": time.process_time(), "sse": sse_stats.snapshot()}
+
+    return app
+
+
+def serve(port: int):
+    import uvicorn
+    uvicorn.run(create_app(), host="127.0.0.1", port=port, log_level="warning")
+
+
+async def read_stream(client, url, params, slow_client):
+    events = 0
+    messages = 0
+    size = 0
+    async with client.stream("GET", url, params=params) as response:
+        response.raise_for_status()
+        buffer = ""
+        async for text in response.aiter_text():
+            size += len(text.encode("utf-8"))
+            buffer += text
+            *frames, buffer = buffer.split("\n\n")
+            for frame in frames:
+                if frame.startswith(":"):
+                    continue
+                messages += 1
+                event, data = frame.split("\n", 1)
+                if event == "event: text":
+                    # A coalesced message carries several tokens
+                    events += json.loads(data[len("data: "):]).count(" token")
+            if slow_client:
+                await asyncio.sleep(slow_client)
+    return events, messages, size
+
+
+async def run_mode(base_url, mode, args):
+    params = {"mode": mode, "tokens": args.tokens, "token_delay": args.token_delay}
+    async with httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_connections=args.streams)) as client:
+        before = (await client.get(f"{base_url}/cpu")).json()["cpu_seconds"]
+        start = time.perf_counter()
+        results = await asyncio.gather(*(read_stream(client, f"{base_url}/stream", params, args.slow_client) for _ in range(args.streams)))
+        wall = time.perf_counter() - start
+        after = (await client.get(f"{base_url}/cpu")).json()["cpu_seconds"]
+    events = sum(r[0] for r in results)
+    messages = sum(r[1] for r in results)
+    size = sum(r[2] for r in results)
+    return {
+        "wall": wall,
+        "events_per_second": events / wall,
+        "messages": messages / args.streams,
+        "kib": size / args.streams / 1024,
+        "cpu_ms": (after - before) * 1000 / args.streams,
+        "complete": events == args.tokens * args.streams,
+    }
+
+
+async def wait_for_server(base_url):
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(f"{base_url}/cpu")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("Benchmark server did not start.")
+
+
+async def main(args):
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", "--port", str(args.port)])
+    try:
+        await wait_for_server(base_url)
+        rows = [(mode, await run_mode(base_url, mode, args)) for mode in ("legacy", "coalesced")]
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"streams: {args.streams}  tokens/stream: {args.tokens}  token delay: {args.token_delay}s  slow client: {args.slow_client}s")
+    print(f"{'mode':<11}{'wall s':>9}{'events/s':>12}{'msgs/stream':>13}{'KiB/stream':>12}{'CPU ms/stream':>15}{'complete':>10}")
+    for mode, r in rows:
+        print(f"{mode:<11}{r['wall']:>9.2f}{r['events_per_second']:>12.0f}{r['messages']:>13.0f}{r['kib']:>12.1f}{r['cpu_ms']:>15.2f}{str(r['complete']):>10}")
+    legacy, coalesced = rows[0][1], rows[1][1]
+    if coalesced["cpu_ms"]:
+        print(f"Server CPU per stream: {legacy['cpu_ms'] / coalesced['cpu_ms']:.1f}x less with coalescing")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=100, help="Concurrent client streams per mode.")
+    parser.add_argument("--tokens", type=int, default=2000, help="Token events per answer.")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between token events.")
+    parser.add_argument("--slow-client", type=float, default=0.0, help="Seconds each client pauses between reads.")
+    parser.add_argument("--port", type=int, default=18766)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.port)
+    else:
+        asyncio.run(main(args))
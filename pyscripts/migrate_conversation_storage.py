@@ -0,0 +1,37 @@
+"""
+Converts conversations stored as one JSON blob per conversation
+(conversation:<user>:<conversation>) to the split layout used with
+CONVERSATION_STORAGE_LAYOUT="split": a metadata hash plus a message list.
+
+The app converts blobs lazily on first read, so running this is optional; it
+converts everything up front. It keeps each conversation's remaining TTL, can
+run while the app is serving and is safe to run more than once.
+
+Usage:
+    python pyscripts/migrate_conversation_storage.py --dry-run
+    python pyscripts/migrate_conversation_storage.py --batch-size 500
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.utils.redis_utils import get_redis_client_from_pool
+from app.services.conversation_service import migrate_blob_conversations
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500, help="Keys scanned and converted per batch.")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the blobs that would be converted.")
+    args = parser.parse_args()
+
+    migrate_blob_conversations(get_redis_client_from_pool(), batch_size=args.batch_size, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()